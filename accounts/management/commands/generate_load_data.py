@@ -0,0 +1,325 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from accounts.models import Buyer
+from bookings.models import Booking, Payment, PaymentSource
+from expenses.models import Expense, ExpenseCategory
+from plots.models import Plot
+from reports.balances import create_snapshots
+from reports.models import ClosedPeriod, DailySourceSummary, SourceBalanceSnapshot, Transaction
+from reports.summary import rebuild_summary
+
+FIRST_NAMES = [
+    "Ahmed", "Ali", "Bilal", "Danish", "Faisal", "Hamza", "Imran", "Junaid", "Kamran", "Usman",
+    "Ayesha", "Fatima", "Hina", "Mariam", "Nadia", "Rabia", "Saba", "Sana", "Zainab", "Iqra",
+]
+LAST_NAMES = [
+    "Khan", "Malik", "Qureshi", "Butt", "Chaudhry", "Sheikh", "Mirza", "Raza", "Hussain", "Iqbal",
+    "Akhtar", "Siddiqui", "Javed", "Aslam", "Anwar", "Saleem", "Tariq", "Rafiq", "Zafar", "Nawaz",
+]
+LOCATIONS = [
+    "Main Boulevard", "Park View", "Corner Street", "Lake View", "Central Avenue",
+    "Sunset Road", "Hill View", "Green Block", "Market Road", "Riverside Lane",
+]
+DIRECTIONS = ["North", "South", "East", "West", "North-East", "South-West"]
+EXPENSE_TITLES = [
+    "Website Hosting", "Facebook Ads Campaign", "Office Electricity Bill",
+    "Land Development Contractor Payment", "Commission Paid to Agent", "Brochure Printing",
+    "Water Supply Maintenance", "Legal Documentation Fee", "Excavation Machinery Rent",
+    "Diesel for Machinery", "Plot Site Security Guard Salary", "Fuel Expense for Site Vehicles",
+]
+EXPENSE_CATEGORIES = [
+    "Development Cost", "Marketing & Ads", "Maintenance",
+    "Agent Commission", "Utility Bills", "Miscellaneous",
+]
+
+# Installments fall due every 30 days, as in bookings.schedule
+BUYERS_SQL = f"""
+    INSERT INTO {Buyer._meta.db_table}
+        (name, father_name, contact_no, cnic, address, created_at)
+    SELECT
+        (%(first)s::text[])[1 + mod(g, 20)] || ' ' || (%(last)s::text[])[1 + mod(g / 20, 20)],
+        (%(first)s::text[])[1 + mod(g / 400, 10)] || ' ' || (%(last)s::text[])[1 + mod(g / 20, 20)],
+        '03' || lpad(mod(g * 7919, 1000000000)::text, 9, '0'),
+        substr(cnic, 1, 5) || '-' || substr(cnic, 6, 7) || '-' || substr(cnic, 13, 1),
+        'House ' || mod(g, 500) + 1 || ', Street ' || mod(g, 40) + 1 || ', Lahore',
+        now()
+    FROM generate_series(1, %(buyers)s) g,
+        LATERAL (SELECT '9' || lpad(g::text, 12, '0') AS cnic) c
+"""
+
+PLOTS_SQL = f"""
+    INSERT INTO {Plot._meta.db_table}
+        (title, plot_type, location, length_ft, width_ft, size_sqft, price, price_per_sqft,
+         status, is_corner, facing_direction, block_name, created_at, updated_at)
+    SELECT
+        initcap(plot_type) || ' Plot ' || g, plot_type,
+        (%(locations)s::text[])[1 + mod(g, 10)],
+        length_ft, width_ft, length_ft * width_ft, length_ft * width_ft * rate, rate,
+        CASE WHEN g <= %(bookings)s THEN 'sold' ELSE 'available' END,
+        mod(g, 7) = 0,
+        (%(directions)s::text[])[1 + mod(g, 6)],
+        chr(65 + mod(g / 250, 26)),
+        now(), now()
+    FROM generate_series(1, %(plots)s) g,
+        LATERAL (
+            SELECT
+                CASE WHEN mod(g, 10) = 0 THEN 'commercial' ELSE 'residential' END AS plot_type,
+                (ARRAY[20, 25, 30, 30, 40])[1 + mod(g, 5)] AS length_ft,
+                (ARRAY[36, 40, 45, 50, 50])[1 + mod(g / 5, 5)] AS width_ft,
+                CASE WHEN mod(g, 10) = 0 THEN 4000 ELSE 2500 END AS rate
+        ) plot
+"""
+
+BOOKINGS_SQL = f"""
+    INSERT INTO {Booking._meta.db_table}
+        (buyer_id, plot_id, installment_months, down_payment_amount, source_id,
+         monthly_installment, commission_paid, start_date, is_completed,
+         paid_count, paid_total, outstanding_balance, next_due_date, last_paid_date, version)
+    SELECT
+        buyer.id, plot.id, months, down_payment,
+        (%(sources)s::int[])[1 + mod(plot.rn, cardinality(%(sources)s::int[]))],
+        round((plot.price - down_payment) / months, 2), NULL,
+        terms.start_date, false,
+        0, 0, 0, NULL, NULL, 1
+    FROM (
+        SELECT id, price, row_number() OVER (ORDER BY id) AS rn
+        FROM {Plot._meta.db_table} WHERE status = 'sold'
+    ) plot
+    JOIN (
+        SELECT id, row_number() OVER (ORDER BY id) AS rn FROM {Buyer._meta.db_table}
+    ) buyer ON buyer.rn = mod(plot.rn - 1, %(buyers)s) + 1,
+    LATERAL (
+        SELECT
+            %(per_booking)s + CASE WHEN plot.rn <= %(extra)s THEN 1 ELSE 0 END AS months,
+            round(plot.price * 0.2, 2) AS down_payment,
+            %(today)s::date - (random() * %(days)s)::int AS start_date
+    ) terms
+    ORDER BY terms.start_date
+"""
+
+# Bookings pay in order, one installment per due date, except that 40%
+# are one to four installments behind (so the aging report has work)
+PAYMENTS_SQL = f"""
+    INSERT INTO {Payment._meta.db_table}
+        (booking_id, amount, source_id, due_date, received_by, paid_date, is_paid)
+    SELECT
+        b.id,
+        base + CASE WHEN k < leftover_cents THEN 0.01 ELSE 0 END,
+        CASE WHEN paid THEN b.source_id END,
+        due_date,
+        CASE WHEN mod(k, 3) = 0 THEN 'tasawur' ELSE 'abdul_ghafoor' END,
+        CASE WHEN paid THEN LEAST(due_date + (mod(b.id + k, 15) - 5)::int, %(today)s::date) END,
+        paid
+    FROM (
+        SELECT
+            b.id, b.source_id, b.start_date, b.installment_months AS months,
+            trunc((plot.price - b.down_payment_amount) / b.installment_months, 2) AS base,
+            plot.price - b.down_payment_amount AS total,
+            GREATEST(mod(b.id * 7919, 10) - 5, 0) AS behind
+        FROM {Booking._meta.db_table} b
+        JOIN {Plot._meta.db_table} plot ON plot.id = b.plot_id
+    ) b,
+    LATERAL generate_series(0, b.months - 1) k,
+    LATERAL (
+        SELECT
+            b.start_date + 30 * (k + 1) AS due_date,
+            round((b.total - b.base * b.months) * 100) AS leftover_cents,
+            b.start_date + 30 * (k + 1) <= %(today)s::date
+                AND k < (%(today)s::date - b.start_date) / 30 - b.behind AS paid
+    ) installment
+    ORDER BY b.id, k
+"""
+
+EXPENSES_SQL = f"""
+    INSERT INTO {Expense._meta.db_table}
+        (title, category_id, amount, type, source_id, description, date, created_at)
+    SELECT
+        (%(titles)s::text[])[1 + mod(g, cardinality(%(titles)s::text[]))],
+        (%(categories)s::int[])[1 + mod(g, cardinality(%(categories)s::int[]))],
+        round((500 + random() * 150000)::numeric, 2),
+        CASE mod(g, 20) WHEN 0 THEN 'credit' WHEN 1 THEN 'debit' ELSE 'expense' END,
+        (%(sources)s::int[])[1 + mod(g / 7, cardinality(%(sources)s::int[]))],
+        'Generated load-test expense.',
+        %(today)s::date - (random() * %(days)s)::int,
+        now()
+    FROM generate_series(1, %(expenses)s) g
+"""
+
+# The ledger rows the signals would have written for the data above, plus
+# unlinked adjustments up to the requested count, in date order as they
+# would have accumulated
+TRANSACTIONS_SQL = f"""
+    INSERT INTO {Transaction._meta.db_table}
+        (date, type, amount, description, source_id,
+         related_payment_id, related_booking_id, related_expense_id, created_at)
+    SELECT date, type, amount, description, source_id,
+        related_payment_id, related_booking_id, related_expense_id, now()
+    FROM (
+        SELECT b.start_date AS date, 'credit' AS type, b.down_payment_amount AS amount,
+            'Down Payment from ' || buyer.name || ' (' || plot.title || ')' AS description,
+            b.source_id, NULL::bigint AS related_payment_id, b.id AS related_booking_id,
+            NULL::bigint AS related_expense_id
+        FROM {Booking._meta.db_table} b
+        JOIN {Buyer._meta.db_table} buyer ON buyer.id = b.buyer_id
+        JOIN {Plot._meta.db_table} plot ON plot.id = b.plot_id
+        WHERE b.down_payment_amount > 0
+        UNION ALL
+        SELECT p.paid_date, 'credit', p.amount, 'Installment from ' || buyer.name,
+            p.source_id, p.id, p.booking_id, NULL
+        FROM {Payment._meta.db_table} p
+        JOIN {Booking._meta.db_table} b ON b.id = p.booking_id
+        JOIN {Buyer._meta.db_table} buyer ON buyer.id = b.buyer_id
+        WHERE p.is_paid
+        UNION ALL
+        SELECT e.date, CASE WHEN e.type = 'credit' THEN 'credit' ELSE 'debit' END, e.amount,
+            e.title || ' (' || c.name || ')', e.source_id, NULL, NULL, e.id
+        FROM {Expense._meta.db_table} e
+        JOIN {ExpenseCategory._meta.db_table} c ON c.id = e.category_id
+        UNION ALL
+        SELECT %(today)s::date - (random() * %(days)s)::int,
+            CASE WHEN mod(g, 2) = 0 THEN 'credit' ELSE 'debit' END,
+            round((100 + random() * 50000)::numeric, 2), 'Adjustment #' || g,
+            (%(sources)s::int[])[1 + mod(g, cardinality(%(sources)s::int[]))], NULL, NULL, NULL
+        FROM generate_series(1, %(adjustments)s) g
+    ) ledger
+    ORDER BY date
+"""
+
+GENERATED_TABLES = [
+    ClosedPeriod, Transaction, DailySourceSummary, SourceBalanceSnapshot,
+    Payment, Booking, Plot, Buyer, Expense,
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-generate a large synthetic data set (buyers, plots, bookings, payments, "
+        "expenses and transactions) for load testing and benchmarks"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--buyers", type=int, default=100_000)
+        parser.add_argument("--bookings", type=int, default=100_000)
+        parser.add_argument(
+            "--plots",
+            type=int,
+            help="Plots to create (default: 10%% more than --bookings, the rest left available).",
+        )
+        parser.add_argument(
+            "--payments",
+            type=int,
+            default=2_000_000,
+            help="Installments in total, spread evenly over the bookings.",
+        )
+        parser.add_argument("--expenses", type=int, default=50_000)
+        parser.add_argument(
+            "--transactions",
+            type=int,
+            default=3_000_000,
+            help="Ledger rows in total: those for down payments, paid installments and "
+            "expenses, topped up with unlinked adjustments.",
+        )
+        parser.add_argument("--sources", type=int, default=4, help="Payment sources to use.")
+        parser.add_argument(
+            "--years", type=int, default=3, help="How far back booking start dates go."
+        )
+        parser.add_argument(
+            "--seed", type=float, default=0.42, help="Random seed, between -1 and 1."
+        )
+        parser.add_argument(
+            "--flush",
+            action="store_true",
+            help="Delete all existing buyers, plots, bookings, payments, expenses and "
+            "transactions first.",
+        )
+
+    def handle(self, *args, **options):
+        bookings = options["bookings"]
+        plots = options["plots"] or bookings + bookings // 10
+        if plots < bookings:
+            raise CommandError("--plots must be at least --bookings (one plot per booking).")
+        if bookings and (options["buyers"] < 1 or options["payments"] < bookings):
+            raise CommandError("Need at least one buyer and one payment per booking.")
+        if not options["flush"] and any(model.objects.exists() for model in GENERATED_TABLES):
+            raise CommandError("The database already has data; pass --flush to replace it.")
+
+        today = timezone.now().date()
+        params = {
+            "today": today,
+            "days": 365 * options["years"],
+            "buyers": options["buyers"],
+            "plots": plots,
+            "bookings": bookings,
+            "per_booking": options["payments"] // max(bookings, 1),
+            "extra": options["payments"] % max(bookings, 1),
+            "expenses": options["expenses"],
+            "first": FIRST_NAMES,
+            "last": LAST_NAMES,
+            "locations": LOCATIONS,
+            "directions": DIRECTIONS,
+            "titles": EXPENSE_TITLES,
+        }
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            if options["flush"]:
+                tables = ", ".join(model._meta.db_table for model in GENERATED_TABLES)
+                cursor.execute(f"TRUNCATE {tables} RESTART IDENTITY CASCADE")
+                self.stdout.write(self.style.WARNING("🧹 Deleted existing data."))
+
+            params["sources"] = self.payment_sources(options["sources"])
+            params["categories"] = self.expense_categories()
+            cursor.execute("SELECT setseed(%s)", [options["seed"]])
+
+            self.insert(cursor, "buyers", BUYERS_SQL, params)
+            self.insert(cursor, "plots", PLOTS_SQL, params)
+            self.insert(cursor, "bookings", BOOKINGS_SQL, params)
+            self.insert(cursor, "payments", PAYMENTS_SQL, params)
+            self.insert(cursor, "expenses", EXPENSES_SQL, params)
+
+            ledger_rows = (
+                Booking.objects.filter(down_payment_amount__gt=0).count()
+                + Payment.objects.filter(is_paid=True).count()
+                + Expense.objects.count()
+            )
+            params["adjustments"] = max(options["transactions"] - ledger_rows, 0)
+            self.insert(cursor, "transactions", TRANSACTIONS_SQL, params)
+
+            # Derived data the model signals would normally keep up to date
+            self.stdout.write("🔁 Refreshing booking ledgers...")
+            Booking.objects.refresh_ledger()
+            Booking.objects.exclude(payments__is_paid=False).update(is_completed=True)
+            self.stdout.write("🔁 Rebuilding the daily summary and balance snapshots...")
+            rebuild_summary()
+            create_snapshots(today)
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        self.stdout.write(self.style.SUCCESS("✅ Load data generated."))
+
+    def insert(self, cursor, label, sql, params):
+        started = timezone.now()
+        cursor.execute(sql, params)
+        elapsed = (timezone.now() - started).total_seconds()
+        self.stdout.write(f"💾 {cursor.rowcount:,} {label} in {elapsed:.1f}s")
+
+    def payment_sources(self, count):
+        """Ids of the first `count` active sources, creating any missing."""
+        existing = list(PaymentSource.objects.filter(is_active=True).values_list("pk", flat=True))
+        missing = [
+            PaymentSource(name=f"Load Source {n}")
+            for n in range(len(existing) + 1, count + 1)
+        ]
+        PaymentSource.objects.bulk_create(missing, ignore_conflicts=True)
+        return list(
+            PaymentSource.objects.filter(is_active=True)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:count]
+        )
+
+    def expense_categories(self):
+        ExpenseCategory.objects.bulk_create(
+            [ExpenseCategory(name=name) for name in EXPENSE_CATEGORIES], ignore_conflicts=True
+        )
+        return list(ExpenseCategory.objects.order_by("pk").values_list("pk", flat=True))
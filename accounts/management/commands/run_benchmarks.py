@@ -0,0 +1,164 @@
+import json
+import platform
+import statistics
+import subprocess
+import time
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.utils import timezone
+
+from accounts.models import Buyer, User
+from bookings.models import Booking, Payment
+from expenses.models import Expense
+from installments.benchmarks import BENCHMARKS, case_urls, fetch, fixtures, sequential_scans
+from plots.models import Plot
+from reports.models import Transaction
+
+VOLUMES = {
+    "buyers": Buyer,
+    "plots": Plot,
+    "bookings": Booking,
+    "payments": Payment,
+    "expenses": Expense,
+    "transactions": Transaction,
+}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Time every page, export and PDF endpoint and count its SQL queries; write the "
+        "results as JSON to compare between releases"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", required=True, help="JSON file to write.")
+        parser.add_argument("--label", default="", help="Free text saved with the results, e.g. a release.")
+        parser.add_argument("--repeat", type=int, default=3, help="Timed runs per endpoint.")
+        parser.add_argument(
+            "--only", action="append", help="Run only the named benchmark (may be given more than once)."
+        )
+        parser.add_argument("--host", default="localhost", help="Host header to send.")
+        parser.add_argument(
+            "--explain",
+            action="store_true",
+            help="Also record the large tables each endpoint's queries read with a sequential scan.",
+        )
+        parser.add_argument(
+            "--compare",
+            help="Earlier results file: print the change per endpoint and fail on regressions.",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=1.25,
+            help="With --compare, slowdown ratio of the median time that counts as a regression.",
+        )
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat must be at least 1.")
+        cases = BENCHMARKS
+        if options["only"]:
+            unknown = set(options["only"]) - {name for name, *_ in BENCHMARKS}
+            if unknown:
+                raise CommandError(f"Unknown benchmark(s): {', '.join(sorted(unknown))}")
+            cases = [case for case in BENCHMARKS if case[0] in options["only"]]
+
+        user, _ = User.objects.get_or_create(
+            username="benchmark", defaults={"is_staff": True, "is_superuser": True}
+        )
+        client = Client(HTTP_HOST=options["host"])
+        client.force_login(user)
+        context = fixtures()
+
+        results = []
+        for name, url in case_urls(cases, context):
+            result = self.run_case(client, name, url, options["repeat"], options["explain"])
+            results.append(result)
+            self.stdout.write(
+                f"⏱️ {name:<28} {result['median_ms']:>10.1f} ms {result['queries']:>5} queries"
+                f"  [{result['status']}]"
+                + (f"  seq scans: {', '.join(result['seq_scans'])}" if result.get("seq_scans") else "")
+            )
+
+        report = {
+            "label": options["label"],
+            "created_at": timezone.now().isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.display_name
+            + " "
+            + ".".join(str(part) for part in connection.get_database_version()),
+            "volumes": {key: model.objects.count() for key, model in VOLUMES.items()},
+            "fixtures": context,
+            "repeat": options["repeat"],
+            "results": results,
+        }
+        with open(options["output"], "w") as fp:
+            json.dump(report, fp, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"✅ Wrote {len(results)} results to {options['output']}"))
+
+        if options["compare"]:
+            self.compare(options["compare"], results, options["threshold"])
+
+    def run_case(self, client, name, url, repeat, explain=False):
+        """Request `url` once to warm up, then `repeat` timed times."""
+        timings = []
+        for run in range(repeat + 1):
+            start = time.perf_counter()
+            response, size, queries = fetch(client, url)
+            elapsed = (time.perf_counter() - start) * 1000
+            if run == 0:
+                first_ms = elapsed
+            else:
+                timings.append(elapsed)
+        result = {
+            "name": name,
+            "url": url,
+            "status": response.status_code,
+            "bytes": size,
+            "queries": len(queries),
+            "first_ms": round(first_ms, 2),
+            "min_ms": round(min(timings), 2),
+            "median_ms": round(statistics.median(timings), 2),
+            "max_ms": round(max(timings), 2),
+        }
+        if explain:
+            result["seq_scans"] = sorted({table for sql in queries for table in sequential_scans(sql)})
+        return result
+
+    def compare(self, path, results, threshold):
+        with open(path) as fp:
+            baseline = {row["name"]: row for row in json.load(fp)["results"]}
+
+        regressions = []
+        for row in results:
+            before = baseline.get(row["name"])
+            if before is None:
+                continue
+            ratio = row["median_ms"] / before["median_ms"] if before["median_ms"] else 1
+            more_queries = row["queries"] - before["queries"]
+            flag = ""
+            if ratio > threshold or more_queries > 0:
+                regressions.append(row["name"])
+                flag = " ⚠️"
+            self.stdout.write(
+                f"{row['name']:<28} {before['median_ms']:>10.1f} → {row['median_ms']:>10.1f} ms "
+                f"({ratio:.2f}x)  {before['queries']} → {row['queries']} queries{flag}"
+            )
+        if regressions:
+            raise CommandError(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        self.stdout.write(self.style.SUCCESS("✅ No regressions."))
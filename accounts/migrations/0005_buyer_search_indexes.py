@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:26
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_alter_buyer_inheritor_alter_buyer_inheritor_cnic_and_more'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='buyer',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='buyer_name_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='buyer',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('cnic'), name='gin_trgm_ops'), name='buyer_cnic_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='buyer',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('contact_no'), name='gin_trgm_ops'), name='buyer_contact_trgm'),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import Upper
 
 
 class User(AbstractUser):
@@ -41,5 +43,17 @@ class Buyer(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created At")
 
+    class Meta:
+        # Trigram indexes on UPPER(column) serve Django's `icontains` and
+        # `istartswith` lookups used by the buyer search API
+        indexes = [
+            GinIndex(OpClass(Upper("name"), name="gin_trgm_ops"), name="buyer_name_trgm"),
+            GinIndex(OpClass(Upper("cnic"), name="gin_trgm_ops"), name="buyer_cnic_trgm"),
+            GinIndex(
+                OpClass(Upper("contact_no"), name="gin_trgm_ops"),
+                name="buyer_contact_trgm",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.name} (CNIC: {self.cnic})"
@@ -1,3 +1,94 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase
+
+from bookings.models import Booking, Payment
+from reports.models import Transaction
+from reports.summary import find_drift
+
+
+class GenerateLoadDataTests(TransactionTestCase):
+    def generate(self, **options):
+        call_command(
+            "generate_load_data",
+            buyers=30,
+            bookings=40,
+            payments=410,
+            expenses=25,
+            transactions=1000,
+            stdout=StringIO(),
+            **options,
+        )
+
+    def test_generates_consistent_data(self):
+        self.generate()
+        self.assertEqual(Booking.objects.count(), 40)
+        self.assertEqual(Payment.objects.count(), 410)
+        self.assertEqual(Transaction.objects.count(), 1000)
+        self.assertEqual(find_drift(), [])
+
+        # Each schedule sums to the plot price less the down payment, and
+        # every paid installment has its ledger row
+        booking = Booking.objects.select_related("plot").first()
+        self.assertEqual(
+            sum(booking.payments.values_list("amount", flat=True)),
+            booking.plot.price - booking.down_payment_amount,
+        )
+        self.assertEqual(
+            Transaction.objects.filter(related_payment__isnull=False).count(),
+            Payment.objects.filter(is_paid=True).count(),
+        )
+        for booking in Booking.objects.with_ledger():
+            self.assertEqual(booking.paid_total, booking.ledger_paid_total)
+
+    def test_refuses_to_mix_with_existing_data(self):
+        self.generate()
+        with self.assertRaises(CommandError):
+            self.generate()
+        self.generate(flush=True)
+        self.assertEqual(Booking.objects.count(), 40)
+
+
+class RunBenchmarksTests(TestCase):
+    def test_writes_results(self):
+        call_command(
+            "generate_load_data",
+            buyers=5,
+            bookings=5,
+            payments=50,
+            expenses=5,
+            transactions=100,
+            stdout=StringIO(),
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "results.json")
+            call_command(
+                "run_benchmarks",
+                output=path,
+                only=["bookings_page", "aging"],
+                repeat=1,
+                stdout=StringIO(),
+            )
+            with open(path) as fp:
+                report = json.load(fp)
+
+            self.assertEqual(report["volumes"]["bookings"], 5)
+            self.assertEqual([row["name"] for row in report["results"]], ["bookings_page", "aging"])
+            for row in report["results"]:
+                self.assertEqual(row["status"], 200)
+                self.assertGreater(row["queries"], 0)
+
+            # Comparing against itself finds nothing to report
+            call_command(
+                "run_benchmarks",
+                output=os.path.join(directory, "again.json"),
+                only=["aging"],
+                repeat=1,
+                compare=path,
+                threshold=100,
+                stdout=StringIO(),
+            )
@@ -1,9 +1,51 @@
+from django import forms
 from django.contrib import admin
+from reports.models import ClosedPeriod
 from .models import Booking, Payment, PaymentSource
+from .schedule import regenerate_schedule
+
+
+def _ledger_date(values):
+    """Date an installment with `values` (is_paid, paid_date, due_date) is
+    entered in the ledger on, if it is paid."""
+    return values["paid_date"] or values["due_date"] if values["is_paid"] else None
+
+
+def _saved(form):
+    # Still the saved values: the form fills its instance in only after
+    # clean()
+    return {name: form.initial.get(name) for name in ("is_paid", "paid_date", "due_date")}
+
+
+class PaymentAdminForm(forms.ModelForm):
+    class Meta:
+        model = Payment
+        fields = "__all__"
+
+    # The checks the closed-period signals make on save, as form errors
+    def clean(self):
+        cleaned_data = super().clean()
+        saved = _saved(self)
+        edited = {name: cleaned_data.get(name, saved[name]) for name in saved}
+        ClosedPeriod.objects.check_open(
+            _ledger_date(edited), self.instance.pk and _ledger_date(saved)
+        )
+        return cleaned_data
+
+
+class PaymentInlineFormSet(forms.BaseInlineFormSet):
+    def clean(self):
+        super().clean()
+        # Errors on the forms of deleted rows are ignored, so check here
+        ClosedPeriod.objects.check_open(
+            *(_ledger_date(_saved(form)) for form in self.deleted_forms if form.instance.pk)
+        )
 
 
 class PaymentInline(admin.TabularInline):
     model = Payment
+    form = PaymentAdminForm
+    formset = PaymentInlineFormSet
     extra = 0
 
 
@@ -16,6 +58,8 @@ class BookingAdmin(admin.ModelAdmin):
         "down_payment_amount",
         "monthly_installment",
         "start_date",
+        "paid_count",
+        "outstanding_balance",
         "is_completed",
     )
     list_filter = ("is_completed", "installment_months")
@@ -23,8 +67,20 @@ class BookingAdmin(admin.ModelAdmin):
     readonly_fields = (
         "plot_price",
         "total_paid_amount",
+        "paid_count",
+        "paid_total",
+        "outstanding_balance",
+        "next_due_date",
+        "last_paid_date",
     )
     inlines = [PaymentInline]
+    actions = ["regenerate_unpaid_schedule"]
+
+    @admin.action(description="Regenerate unpaid installments from current terms")
+    def regenerate_unpaid_schedule(self, request, queryset):
+        for booking in queryset.filter(is_completed=False):
+            regenerate_schedule(booking)
+        self.message_user(request, "Unpaid installment schedules regenerated.")
 
 
 @admin.register(PaymentSource)
@@ -1,7 +1,9 @@
 # bookings/forms.py
 from django import forms
+from django.core.exceptions import ValidationError
 from accounts.models import Buyer
 from plots.models import Plot
+from reports.models import ClosedPeriod
 from .models import Booking, PaymentSource
 from datetime import date
 
@@ -71,3 +73,14 @@ class BookingForm(forms.ModelForm):
         initial=date.today,
         label="Start Date",
     )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # The down payment is entered in the ledger on the start date
+        start_date = cleaned_data.get("start_date")
+        if start_date and cleaned_data.get("down_payment_amount"):
+            try:
+                ClosedPeriod.objects.check_open(start_date)
+            except ValidationError as e:
+                self.add_error("start_date", e)
+        return cleaned_data
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from bookings.models import Booking
+from bookings.schedule import generate_schedule, regenerate_schedule
+
+
+class Command(BaseCommand):
+    help = "Write full installment schedules for bookings that have none, or regenerate unpaid rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--regenerate",
+            action="store_true",
+            help="Replace the unpaid installments of incomplete bookings using their current terms.",
+        )
+        parser.add_argument(
+            "--booking",
+            type=int,
+            action="append",
+            dest="booking_ids",
+            help="Limit to this booking id (may be given more than once).",
+        )
+
+    def handle(self, *args, **options):
+        bookings = Booking.objects.select_related("plot").order_by("pk")
+        if options["booking_ids"]:
+            bookings = bookings.filter(pk__in=options["booking_ids"])
+
+        if options["regenerate"]:
+            bookings = bookings.filter(is_completed=False)
+            action = regenerate_schedule
+        else:
+            bookings = bookings.filter(payments__isnull=True)
+            action = generate_schedule
+
+        booking_count = payment_count = 0
+        for booking in bookings.iterator(chunk_size=500):
+            payment_count += len(action(booking))
+            booking_count += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✅ Wrote {payment_count} installments for {booking_count} bookings."
+            )
+        )
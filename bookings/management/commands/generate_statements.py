@@ -0,0 +1,78 @@
+import os
+import time
+from argparse import ArgumentTypeError
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bookings.statements import generate_statements, month_dir, write_zip
+
+
+def month(value):
+    try:
+        return datetime.strptime(value, "%Y-%m").date()
+    except ValueError:
+        raise ArgumentTypeError(f"Expected a month as YYYY-MM, got {value!r}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the statement PDF of every booking for a month under MEDIA_ROOT, in parallel; "
+        "rerun to resume, or to refresh statements that changed while the month is open"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--month", type=month, required=True, help="Statement month (YYYY-MM).")
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Rendering processes (default: one per CPU).",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=200,
+            help="Bookings fetched and rendered per task.",
+        )
+        parser.add_argument(
+            "--zip",
+            action="store_true",
+            help="Also bundle the month's statements into a zip file.",
+        )
+
+    def handle(self, *args, **options):
+        if options["processes"] < 1 or options["chunk_size"] < 1:
+            raise CommandError("--processes and --chunk-size must be at least 1.")
+
+        start = time.perf_counter()
+        last_report = [start]
+
+        def progress(written, total):
+            now = time.perf_counter()
+            if now - last_report[0] >= 5 or written == total:
+                last_report[0] = now
+                self.stdout.write(
+                    f"⏱️ {written}/{total} statements, {written / (now - start):.1f}/s"
+                )
+
+        written, skipped = generate_statements(
+            options["month"],
+            processes=options["processes"],
+            chunk_size=options["chunk_size"],
+            progress=progress,
+        )
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✅ Wrote {written} statement(s) in {elapsed:.1f}s "
+                f"({written / elapsed:.1f}/s) to {month_dir(options['month'])}; "
+                f"{skipped} already up to date."
+            )
+        )
+        if options["zip"]:
+            try:
+                path = write_zip(options["month"])
+            except FileExistsError as e:
+                raise CommandError(f"{e}; the zip of a past month is not rewritten.")
+            self.stdout.write(self.style.SUCCESS(f"📦 {path}"))
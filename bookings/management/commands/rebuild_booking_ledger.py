@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from bookings.models import Booking
+
+
+class Command(BaseCommand):
+    help = "Rebuild the stored per-booking ledger counters and verify them against payments"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Only report bookings whose stored counters have drifted; do not write.",
+        )
+        parser.add_argument(
+            "--booking",
+            type=int,
+            action="append",
+            dest="booking_ids",
+            help="Limit to this booking id (may be given more than once).",
+        )
+
+    def handle(self, *args, **options):
+        bookings = Booking.objects.all()
+        if options["booking_ids"]:
+            bookings = bookings.filter(pk__in=options["booking_ids"])
+
+        if not options["verify"]:
+            with transaction.atomic():
+                updated = bookings.refresh_ledger()
+            self.stdout.write(self.style.SUCCESS(f"✅ Rebuilt counters for {updated} bookings."))
+
+        drifted = self.find_drift(bookings)
+        if drifted:
+            for booking_id, field, stored, computed in drifted[:20]:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"⚠️ Booking #{booking_id}: {field} stored={stored} computed={computed}"
+                    )
+                )
+            raise CommandError(f"{len(drifted)} ledger counter(s) out of sync.")
+
+        self.stdout.write(self.style.SUCCESS("✅ All booking ledger counters are in sync."))
+
+    def find_drift(self, bookings):
+        fields = Booking.LEDGER_FIELDS
+        rows = (
+            bookings.with_ledger()
+            .order_by("pk")
+            .values_list("pk", *fields, *[f"ledger_{name}" for name in fields])
+            .iterator(chunk_size=2000)
+        )
+        drifted = []
+        for row in rows:
+            stored, computed = row[1 : 1 + len(fields)], row[1 + len(fields) :]
+            for field, old, new in zip(fields, stored, computed):
+                if old != new:
+                    drifted.append((row[0], field, old, new))
+        return drifted
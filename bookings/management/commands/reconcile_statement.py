@@ -0,0 +1,67 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bookings.models import PaymentSource
+from bookings.reconciliation import StatementReconciler
+
+
+class Command(BaseCommand):
+    help = "Match a bank/wallet statement CSV to open installments and post the matches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("statement", help="Path to the statement CSV export.")
+        parser.add_argument(
+            "--source",
+            required=True,
+            help='Payment source the statement belongs to, e.g. "Meezan Bank".',
+        )
+        parser.add_argument(
+            "--window-days",
+            type=int,
+            default=10,
+            help="How far the statement date may be from the due date (default 10).",
+        )
+        parser.add_argument(
+            "--unmatched",
+            default="-",
+            help="Where to write unmatched lines as CSV (default stdout).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Match and report without posting any payment.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            source = PaymentSource.objects.get(name__iexact=options["source"])
+        except PaymentSource.DoesNotExist:
+            raise CommandError(f"Unknown payment source: {options['source']}")
+
+        reconciler = StatementReconciler(
+            source=source,
+            window_days=options["window_days"],
+            dry_run=options["dry_run"],
+        )
+        unmatched = (
+            sys.stdout
+            if options["unmatched"] == "-"
+            else open(options["unmatched"], "w", newline="", encoding="utf-8")
+        )
+        try:
+            with open(options["statement"], newline="", encoding="utf-8-sig") as statement:
+                stats = reconciler.run(statement, unmatched)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        finally:
+            if unmatched is not sys.stdout:
+                unmatched.close()
+
+        self.stderr.write(
+            self.style.SUCCESS(
+                f"✅ {stats.get('lines', 0)} lines, {stats.get('credits', 0)} credits: "
+                f"{stats.get('matched', 0)} matched, {stats.get('posted', 0)} posted, "
+                f"{stats.get('unmatched', 0)} unmatched."
+            )
+        )
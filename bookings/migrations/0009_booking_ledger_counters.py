@@ -0,0 +1,62 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:15
+
+from django.db import migrations, models
+
+
+BACKFILL_LEDGER_SQL = """
+UPDATE bookings_booking AS b SET
+    paid_count = COALESCE(
+        (SELECT COUNT(*) FROM bookings_payment p WHERE p.booking_id = b.id AND p.is_paid), 0
+    ),
+    paid_total = COALESCE(
+        (SELECT SUM(p.amount) FROM bookings_payment p WHERE p.booking_id = b.id AND p.is_paid), 0
+    ),
+    outstanding_balance = (SELECT pl.price FROM plots_plot pl WHERE pl.id = b.plot_id)
+        - b.down_payment_amount
+        - COALESCE(
+            (SELECT SUM(p.amount) FROM bookings_payment p WHERE p.booking_id = b.id AND p.is_paid), 0
+        ),
+    next_due_date = (
+        SELECT MIN(p.due_date) FROM bookings_payment p WHERE p.booking_id = b.id AND NOT p.is_paid
+    ),
+    last_paid_date = (
+        SELECT MAX(p.paid_date) FROM bookings_payment p WHERE p.booking_id = b.id AND p.is_paid
+    )
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0008_alter_booking_start_date'),
+        ('plots', '0005_delete_installmentplan_remove_plot_size_sq_yards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='last_paid_date',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='Last Paid Date'),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='next_due_date',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='Next Due Date'),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='outstanding_balance',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12, verbose_name='Outstanding Balance'),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='paid_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Paid Installments'),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='paid_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12, verbose_name='Paid Installment Amount'),
+        ),
+        migrations.RunSQL(BACKFILL_LEDGER_SQL, migrations.RunSQL.noop),
+    ]
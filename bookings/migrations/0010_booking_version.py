@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0009_booking_ledger_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0010_booking_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(condition=models.Q(('is_paid', False)), fields=['booking', 'due_date'], include=('amount',), name='payment_unpaid_due_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_buyer_search_indexes'),
+        ('bookings', '0011_payment_unpaid_due_index'),
+        ('plots', '0007_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payment',
+            name='booking',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='bookings.booking'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['-start_date', '-id'], name='booking_start_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['booking', 'is_paid', 'due_date'], name='payment_booking_paid_due_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_buyer_search_indexes'),
+        ('bookings', '0012_hot_filter_indexes'),
+        ('plots', '0007_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['version'], name='booking_version_idx'),
+        ),
+    ]
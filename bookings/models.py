@@ -1,13 +1,93 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
 
 from accounts.models import Buyer
+from jobs.models import OutboxEvent
 from plots.models import Plot
-from django.db.models import Sum
+from django.db.models import Count, DecimalField, F, Max, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 
 from datetime import date
 
 
+def _payments_subquery(aggregate, output_field, **filters):
+    """Correlated per-booking aggregate over payments, evaluated only for
+    the rows actually fetched (e.g. one page of bookings)."""
+    return Subquery(
+        Payment.objects.filter(booking=OuterRef("pk"), **filters)
+        .order_by()
+        .values("booking")
+        .annotate(value=aggregate)
+        .values("value"),
+        output_field=output_field,
+    )
+
+
+def _ledger_expressions():
+    """Expressions computing each ledger counter from the payments table,
+    keyed by the name of the `Booking` column that stores it."""
+    money = DecimalField(max_digits=12, decimal_places=2)
+    paid_total = Coalesce(
+        _payments_subquery(Sum("amount"), money, is_paid=True),
+        0,
+        output_field=money,
+    )
+    plot_price = Subquery(
+        Plot.objects.filter(pk=OuterRef("plot_id")).values("price")[:1],
+        output_field=money,
+    )
+    return {
+        "paid_count": Coalesce(
+            _payments_subquery(Count("id"), models.IntegerField(), is_paid=True), 0
+        ),
+        "paid_total": paid_total,
+        "outstanding_balance": plot_price - F("down_payment_amount") - paid_total,
+        "next_due_date": _payments_subquery(
+            Min("due_date"), models.DateField(), is_paid=False
+        ),
+        "last_paid_date": _payments_subquery(
+            Max("paid_date"), models.DateField(), is_paid=True
+        ),
+    }
+
+
+class BookingQuerySet(models.QuerySet):
+    def with_ledger(self):
+        """Annotate the ledger counters as computed from payments, prefixed
+        with `ledger_`, so they can be compared against the stored columns.
+        """
+        return self.annotate(
+            **{f"ledger_{name}": expr for name, expr in _ledger_expressions().items()}
+        )
+
+    def refresh_ledger(self, **extra):
+        """Recompute the stored ledger counters in a single UPDATE, along
+        with any `extra` field values, and bump each booking's version."""
+        return self.update(
+            **_ledger_expressions(), version=F("version") + 1, **extra
+        )
+
+    def bump_version(self):
+        return self.update(version=F("version") + 1)
+
+    def for_statement(self):
+        """Fetch everything a statement PDF shows (see
+        `render_booking_pdf`): one query for the bookings with buyer, plot
+        and source, one for their payments in due-date order."""
+        return self.select_related("buyer", "plot", "source").prefetch_related(
+            statement_payments()
+        )
+
+
 class Booking(models.Model):
+    LEDGER_FIELDS = [
+        "paid_count",
+        "paid_total",
+        "outstanding_balance",
+        "next_due_date",
+        "last_paid_date",
+    ]
+
     buyer = models.ForeignKey(Buyer, on_delete=models.CASCADE, related_name="bookings")
     plot = models.OneToOneField(Plot, on_delete=models.CASCADE)
     installment_months = models.IntegerField(default=24)
@@ -31,22 +111,71 @@ class Booking(models.Model):
     start_date = models.DateField(default=date.today)
     is_completed = models.BooleanField(default=False)
 
+    # Ledger counters, maintained from payments by `refresh_ledger()`
+    paid_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Paid Installments"
+    )
+    paid_total = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        editable=False,
+        verbose_name="Paid Installment Amount",
+    )
+    outstanding_balance = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        editable=False,
+        verbose_name="Outstanding Balance",
+    )
+    next_due_date = models.DateField(
+        blank=True, null=True, editable=False, verbose_name="Next Due Date"
+    )
+    last_paid_date = models.DateField(
+        blank=True, null=True, editable=False, verbose_name="Last Paid Date"
+    )
+    # Changes whenever the booking's payments, buyer or plot change; used
+    # to key cached statements
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    objects = BookingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Bookings list, newest first
+            models.Index(fields=["-start_date", "-id"], name="booking_start_date_idx"),
+            # Count and version sum read off the index alone, as the
+            # earnings report ETags' stand-in for the portfolio totals
+            models.Index(fields=["version"], name="booking_version_idx"),
+        ]
+
     def __str__(self):
         return f"{self.buyer.name} - {self.plot.title}"
 
     def save(self, *args, **kwargs):
         created = self.pk is None  # Check if this is a new Booking
-        super().save(*args, **kwargs)
-        if created:
-            self.plot.status = "sold"  # or Plot.STATUS_SOLD if using choices constant
-            self.plot.save()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if created:
+                self.plot.status = "sold"  # or Plot.STATUS_SOLD if using choices constant
+                self.plot.save()
+            # Terms (price, down payment) may have changed, so keep the
+            # counters in step unless only specific fields were saved.
+            if kwargs.get("update_fields") is None:
+                if settings.OUTBOX_ENABLED:
+                    # Schedule, ledger and counters are left to process_outbox
+                    OutboxEvent.objects.record("booking", self.pk, self.pk)
+                else:
+                    self.refresh_ledger()
+
+    def refresh_ledger(self):
+        Booking.objects.filter(pk=self.pk).refresh_ledger()
+        self.refresh_from_db(fields=[*self.LEDGER_FIELDS, "version"])
 
     @property
     def total_paid_amount(self):
-        total = (
-            self.payments.filter(is_paid=True).aggregate(total=Sum("amount"))["total"]
-            or 0
-        )
+        total = self.paid_total or 0
         if self.down_payment_amount:
             total += self.down_payment_amount
         return total
@@ -57,7 +186,7 @@ class Booking(models.Model):
 
     @property
     def paid_installments(self):
-        return self.payments.filter(is_paid=True).count()
+        return self.paid_count
 
     @property
     def remaining_installments(self):
@@ -83,8 +212,9 @@ class Payment(models.Model):
         ("tasawur", "Tasawur"),
         ("abdul_ghafoor", "Abdul Ghafoor"),
     ]
+    # Indexed by payment_booking_paid_due_idx, which leads with it
     booking = models.ForeignKey(
-        Booking, on_delete=models.CASCADE, related_name="payments"
+        Booking, on_delete=models.CASCADE, related_name="payments", db_index=False
     )
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     source = models.ForeignKey(
@@ -102,12 +232,57 @@ class Payment(models.Model):
     paid_date = models.DateField(blank=True, null=True)
     is_paid = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Unpaid installments only: serves the aging report (an
+            # index-only scan in booking order) and each booking's next due
+            # date, and stays small as installments get paid
+            models.Index(
+                fields=["booking", "due_date"],
+                include=["amount"],
+                condition=models.Q(is_paid=False),
+                name="payment_unpaid_due_idx",
+            ),
+            # A booking's schedule in order, and its paid/unpaid ledger
+            # counters
+            models.Index(
+                fields=["booking", "is_paid", "due_date"],
+                name="payment_booking_paid_due_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.booking.plot.title} - {self.amount} - {'Paid' if self.is_paid else 'Pending'}"
 
+    def save(self, *args, **kwargs):
+        # Payment and booking counters are written in the same transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self._changed()
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            pk = self.pk
+            result = super().delete(*args, **kwargs)
+            self._changed(pk)
+        return result
+
+    def _changed(self, pk=None):
+        if settings.OUTBOX_ENABLED:
+            OutboxEvent.objects.record("payment", pk or self.pk, self.booking_id)
+        else:
+            Booking.objects.filter(pk=self.booking_id).refresh_ledger()
+
     @property
     def is_next_due(self):
         unpaid_payments = self.booking.payments.filter(is_paid=False).order_by(
             "due_date"
         )
         return unpaid_payments.exists() and unpaid_payments.first().id == self.id
+
+
+def statement_payments():
+    """A booking's payments as its statement lists them, for prefetching."""
+    return models.Prefetch(
+        "payments", queryset=Payment.objects.select_related("source").order_by("due_date")
+    )
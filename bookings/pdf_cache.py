@@ -0,0 +1,90 @@
+import glob
+import os
+import tempfile
+
+from django.conf import settings
+
+STATEMENTS_DIR = "statements"
+
+
+def _cache_dir():
+    path = os.path.join(settings.MEDIA_ROOT, STATEMENTS_DIR)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def statement_name(booking):
+    return f"booking_{booking.pk}_v{booking.version}.pdf"
+
+
+def cached_statement(booking, render):
+    """Return the booking's statement PDF for its current version, open
+    for reading, calling `render(booking, fp)` to create it on a cache miss.
+
+    Files are written under a temporary name and renamed into place, so
+    concurrent requests never serve a half-written PDF. The file is opened
+    before anything can evict or replace it; an open file stays readable
+    after it is unlinked.
+    """
+    cache_dir = _cache_dir()
+    path = os.path.join(cache_dir, statement_name(booking))
+    try:
+        fp = open(path, "rb")
+    except FileNotFoundError:
+        pass  # cache miss
+    else:
+        try:
+            os.utime(path)  # mark as recently used for eviction
+        except FileNotFoundError:
+            pass  # evicted just now; `fp` still reads it
+        return fp
+
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            render(booking, out)
+        fp = open(tmp_path, "rb")
+        os.replace(tmp_path, path)
+    except BaseException:
+        _remove(tmp_path)
+        raise
+
+    # Older versions of this statement can never be served again
+    for stale in glob.glob(os.path.join(cache_dir, f"booking_{booking.pk}_v*.pdf")):
+        if stale != path:
+            _remove(stale)
+    evict(settings.BOOKING_PDF_CACHE_MAX_BYTES)
+    return fp
+
+
+def evict(max_bytes):
+    """Delete least recently used statements until the cache fits in
+    `max_bytes` (with some headroom, so eviction doesn't run on every miss)."""
+    entries = []
+    total = 0
+    with os.scandir(_cache_dir()) as it:
+        for entry in it:
+            if entry.is_file() and entry.name.endswith(".pdf"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+    if total <= max_bytes:
+        return 0
+
+    removed = 0
+    target = max_bytes * 0.9
+    for _, size, path in sorted(entries):
+        if total <= target:
+            break
+        if _remove(path):
+            total -= size
+            removed += 1
+    return removed
+
+
+def _remove(path):
+    try:
+        os.unlink(path)
+        return True
+    except FileNotFoundError:
+        return False
@@ -0,0 +1,229 @@
+import csv
+import re
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.utils import timezone
+
+from .models import Payment
+from .services import post_payments
+
+# Header aliases used by the bank/wallet statement exports we receive
+DATE_COLUMNS = ("date", "transaction date", "txn date", "value date", "posting date")
+AMOUNT_COLUMNS = ("credit", "credit amount", "deposit", "amount", "cr")
+TEXT_COLUMNS = (
+    "description",
+    "narration",
+    "details",
+    "remarks",
+    "reference",
+    "particulars",
+    "cnic",
+    "contact",
+    "mobile",
+    "sender",
+)
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d-%b-%Y", "%d %b %Y", "%m/%d/%Y")
+UNMATCHED_HEADER = ["line", "date", "amount", "text", "reason"]
+
+DIGIT_RUN = re.compile(r"\d[\d\- ]{8,16}\d")
+
+
+def _digits(value):
+    return re.sub(r"\D", "", value or "")
+
+
+def _phone_key(digits):
+    # 03001234567, 923001234567 and 3001234567 are the same mobile number
+    key = digits[-10:]
+    return key if len(key) == 10 and key.startswith("3") else None
+
+
+def _identifiers(text):
+    """CNICs (13 digits) and mobile numbers mentioned in a statement line."""
+    cnics, phones = set(), set()
+    for run in DIGIT_RUN.findall(text):
+        digits = _digits(run)
+        if len(digits) == 13:
+            cnics.add(digits)
+        elif 10 <= len(digits) <= 12 and _phone_key(digits):
+            phones.add(_phone_key(digits))
+    return cnics, phones
+
+
+def _cents(amount):
+    return int(amount * 100)
+
+
+def _parse_date(value):
+    value = (value or "").strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _parse_amount(value):
+    value = (value or "").replace(",", "").replace("Rs", "").strip()
+    if not value:
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        return None
+
+
+class StatementReconciler:
+    """Match statement credit lines to open installments.
+
+    Open payments are loaded once into an in-memory index keyed by amount
+    (in cents) and due date, alongside each buyer's CNIC and phone. The
+    statement is then read one line at a time, so memory is bounded by the
+    number of open installments, not by the length of the statement. Matched
+    payments are posted in batches through `post_payments`.
+
+    A line matches when the amount is exact, the due date is within
+    `window_days` of the statement date and, if the line mentions a CNIC
+    or phone number, it belongs to the booking's buyer. A line without
+    an identifier only matches if exactly one installment fits.
+    """
+
+    def __init__(self, source=None, window_days=10, batch_size=500, dry_run=False):
+        self.source_id = source.pk if source else None
+        self.window = timedelta(days=window_days)
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.stats = defaultdict(int)
+        self._pending = []
+
+    def build_index(self):
+        self.open_payments = defaultdict(list)
+        self.identifiers = {}
+        horizon = timezone.now().date() + self.window
+        rows = (
+            Payment.objects.filter(is_paid=False, due_date__lte=horizon)
+            .order_by("due_date")
+            .values_list(
+                "pk",
+                "amount",
+                "due_date",
+                "booking__buyer__cnic",
+                "booking__buyer__contact_no",
+            )
+            .iterator(chunk_size=5000)
+        )
+        for pk, amount, due_date, cnic, contact in rows:
+            self.open_payments[_cents(amount), due_date].append(pk)
+            self.identifiers[pk] = (_digits(cnic), _phone_key(_digits(contact)))
+        self.stats["open_payments"] = len(self.identifiers)
+
+    def match(self, paid_on, amount, text):
+        """Return `(payment_id, reason)`; `payment_id` is None if unmatched."""
+        cents = _cents(amount)
+        candidates = []
+        for offset in range(-self.window.days, self.window.days + 1):
+            due_date = paid_on + timedelta(days=offset)
+            candidates.extend(
+                (due_date, pk) for pk in self.open_payments.get((cents, due_date), ())
+            )
+        if not candidates:
+            return None, "no open installment with this amount near this date"
+
+        cnics, phones = _identifiers(text)
+        if cnics or phones:
+            candidates = [
+                (due_date, pk)
+                for due_date, pk in candidates
+                if self.identifiers[pk][0] in cnics or self.identifiers[pk][1] in phones
+            ]
+            if not candidates:
+                return None, "CNIC/contact does not match an open installment"
+        elif len(candidates) > 1:
+            return None, f"ambiguous: {len(candidates)} installments fit"
+
+        # Earliest due installment first
+        due_date, payment_id = min(candidates)
+        self.open_payments[cents, due_date].remove(payment_id)
+        return payment_id, None
+
+    def run(self, statement, unmatched_file):
+        """Reconcile the statement (an iterable of CSV text lines) and
+        write unmatched credit lines to `unmatched_file`. Returns stats."""
+        self.build_index()
+        reader = csv.reader(statement)
+        header = [h.strip().lower() for h in next(reader, [])]
+        date_col = next((header.index(c) for c in DATE_COLUMNS if c in header), None)
+        amount_col = next((header.index(c) for c in AMOUNT_COLUMNS if c in header), None)
+        if date_col is None or amount_col is None:
+            raise ValueError("Statement needs a date column and a credit/amount column.")
+        text_cols = [i for i, name in enumerate(header) if name in TEXT_COLUMNS]
+
+        self.unmatched = csv.writer(unmatched_file)
+        self.unmatched.writerow(UNMATCHED_HEADER)
+        for line_no, row in enumerate(reader, start=2):
+            self.stats["lines"] += 1
+            if len(row) <= max(date_col, amount_col):
+                continue
+            amount = _parse_amount(row[amount_col])
+            if amount is None or amount <= 0:
+                continue  # debits and blank credit cells
+            self.stats["credits"] += 1
+            text = " ".join(row[i] for i in text_cols if i < len(row))
+            paid_on = _parse_date(row[date_col])
+            if paid_on is None:
+                self._write_unmatched(line_no, row[date_col], amount, text, "bad date")
+                continue
+
+            payment_id, reason = self.match(paid_on, amount, text)
+            if payment_id is None:
+                self._write_unmatched(line_no, paid_on, amount, text, reason)
+                continue
+            self.stats["matched"] += 1
+            self._pending.append((line_no, paid_on, amount, text, payment_id))
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+        self._flush()
+        return dict(self.stats)
+
+    def _write_unmatched(self, line_no, paid_on, amount, text, reason):
+        self.stats["unmatched"] += 1
+        self.unmatched.writerow([line_no, paid_on, amount, text, reason])
+
+    def _flush(self):
+        pending, self._pending = self._pending, []
+        if self.dry_run:
+            return
+        # A batch is rejected whole if any line fails (e.g. a clerk posted
+        # that installment meanwhile); the lines it marks as skipped are
+        # still safe, so post those once more and report the rest.
+        for retry in (False, True):
+            if not pending:
+                return
+            posted, results = post_payments(
+                [
+                    {
+                        "payment_id": payment_id,
+                        "amount": amount,
+                        "paid_date": paid_on,
+                        "source_id": self.source_id,
+                    }
+                    for _, paid_on, amount, _, payment_id in pending
+                ]
+            )
+            self.stats["posted"] += posted
+            if posted:
+                return
+            safe = []
+            for line, result in zip(pending, results):
+                if result["status"] == "skipped" and not retry:
+                    safe.append(line)
+                    continue
+                line_no, paid_on, amount, text, _ = line
+                self.stats["matched"] -= 1
+                self._write_unmatched(
+                    line_no, paid_on, amount, text, result["error"] or "batch not posted"
+                )
+            pending = safe
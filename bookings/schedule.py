@@ -0,0 +1,96 @@
+from datetime import timedelta
+from decimal import ROUND_DOWN, Decimal
+
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from .models import Booking, Payment
+
+# Installments fall due every 30 days from the booking start date
+INSTALLMENT_INTERVAL = timedelta(days=30)
+CENT = Decimal("0.01")
+
+
+def split_amount(total, parts):
+    """Split `total` into `parts` amounts rounded to cents that sum exactly
+    to `total`. Leftover cents go one each to the earliest installments.
+    """
+    if parts <= 0:
+        return []
+    total = Decimal(total).quantize(CENT)
+    base = (total / parts).quantize(CENT, rounding=ROUND_DOWN)
+    leftover_cents = int((total - base * parts) / CENT)
+    return [base + CENT if i < leftover_cents else base for i in range(parts)]
+
+
+def due_date_for(booking, index):
+    """Due date of the `index`-th (0-based) installment of `booking`."""
+    return booking.start_date + INSTALLMENT_INTERVAL * (index + 1)
+
+
+def build_schedule(booking, amount, count, first_index=0):
+    """Return unsaved `Payment` rows for `count` installments totalling
+    `amount`, numbered from `first_index` in the booking's schedule."""
+    if amount <= 0:
+        return []
+    return [
+        Payment(
+            booking=booking,
+            amount=installment,
+            due_date=due_date_for(booking, first_index + i),
+        )
+        for i, installment in enumerate(split_amount(amount, count))
+    ]
+
+
+def generate_schedule(booking):
+    """Write the booking's full installment schedule with one bulk insert.
+
+    The schedule sums exactly to `plot.price - down_payment_amount`. Does
+    nothing if the booking already has payments.
+    """
+    if booking.payments.exists():
+        return []
+    payments = build_schedule(
+        booking,
+        booking.plot.price - booking.down_payment_amount,
+        booking.installment_months,
+    )
+    with transaction.atomic():
+        Payment.objects.bulk_create(payments)
+        Booking.objects.filter(pk=booking.pk).refresh_ledger()
+    return payments
+
+
+def regenerate_schedule(booking):
+    """Replace the booking's unpaid installments after its terms change.
+
+    Paid installments are kept; the balance still owed is spread over the
+    months that remain, continuing the booking's due-date sequence. If no
+    months remain (the term was shortened or the price raised after the
+    last installment was paid), the balance falls due as one final
+    installment.
+    """
+    with transaction.atomic():
+        booking = (
+            Booking.objects.select_for_update(of=("self",))
+            .select_related("plot")
+            .get(pk=booking.pk)
+        )
+        paid = booking.payments.filter(is_paid=True).aggregate(
+            total=Sum("amount"), count=Count("id")
+        )
+        paid_count = paid["count"]
+        paid_total = paid["total"] or 0
+
+        booking.payments.filter(is_paid=False).delete()
+        payments = build_schedule(
+            booking,
+            booking.plot.price - booking.down_payment_amount - paid_total,
+            max(booking.installment_months - paid_count, 1),
+            first_index=paid_count,
+        )
+        Payment.objects.bulk_create(payments)
+        Booking.objects.filter(pk=booking.pk).refresh_ledger()
+    return payments
+
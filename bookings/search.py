@@ -0,0 +1,84 @@
+import re
+
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from accounts.models import Buyer
+from plots.models import Plot
+
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 50
+# Below this length a substring pattern has no trigrams to look up, so
+# short queries only match prefixes
+MIN_CONTAINS_LENGTH = 3
+
+
+def _lookup(query):
+    return "icontains" if len(query) >= MIN_CONTAINS_LENGTH else "istartswith"
+
+
+def _matches(fields, query):
+    lookup = _lookup(query)
+    condition = Q()
+    for field in fields:
+        condition |= Q(**{f"{field}__{lookup}": query})
+    return condition
+
+
+def _cnic_pattern(query):
+    """'3520212345671' -> '35202-1234567-1', so CNICs typed without
+    dashes still match the stored format."""
+    digits = re.sub(r"\D", "", query)
+    if len(digits) <= 5 or len(digits) != len(query.replace("-", "")):
+        return None
+    formatted = f"{digits[:5]}-{digits[5:12]}"
+    if len(digits) > 12:
+        formatted += f"-{digits[12:]}"
+    return formatted
+
+
+def _page(queryset, fields, offset, limit):
+    rows = list(queryset.values(*fields)[offset : offset + limit + 1])
+    has_more = len(rows) > limit
+    return rows[:limit], (offset + limit if has_more else None)
+
+
+def search_buyers(query, offset=0, limit=SEARCH_DEFAULT_LIMIT):
+    """Buyers whose name, CNIC or contact number match `query`, names
+    starting with the query first. Returns `(rows, next_offset)`."""
+    condition = _matches(["name", "cnic", "contact_no"], query)
+    cnic = _cnic_pattern(query)
+    if cnic:
+        condition |= Q(cnic__istartswith=cnic)
+    buyers = (
+        Buyer.objects.filter(condition)
+        .annotate(
+            rank=Case(
+                When(name__istartswith=query, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        )
+        .order_by("rank", "name", "id")
+    )
+    return _page(buyers, ["id", "name", "cnic", "contact_no"], offset, limit)
+
+
+def search_plots(query, status="available", offset=0, limit=SEARCH_DEFAULT_LIMIT):
+    """Plots whose title or block match `query`, optionally limited to one
+    status. Returns `(rows, next_offset)`."""
+    plots = Plot.objects.filter(_matches(["title", "block_name"], query))
+    if status:
+        plots = plots.filter(status=status)
+    plots = plots.annotate(
+        rank=Case(
+            When(title__istartswith=query, then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField(),
+        )
+    ).order_by("rank", "title", "id")
+    return _page(
+        plots,
+        ["id", "title", "block_name", "location", "plot_type", "price", "status"],
+        offset,
+        limit,
+    )
@@ -0,0 +1,261 @@
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from jobs.models import OutboxEvent
+from reports.models import ClosedPeriod, Transaction
+from reports.summary import SummaryDelta
+from .models import Booking, Payment, PaymentSource
+
+PAYMENT_POST_FIELDS = [
+    "is_paid",
+    "paid_date",
+    "amount",
+    "due_date",
+    "source_id",
+    "received_by",
+]
+
+
+def _clean_amount(value):
+    if value in (None, ""):
+        return None
+    try:
+        amount = Decimal(str(value))
+    except InvalidOperation:
+        raise ValidationError(f"Invalid amount: {value!r}")
+    if amount <= 0:
+        raise ValidationError("Amount must be greater than zero.")
+    return amount
+
+
+def _clean_date(value):
+    if value in (None, ""):
+        return None
+    if isinstance(value, str):
+        parsed = parse_date(value)
+        if parsed is None:
+            raise ValidationError(f"Invalid date: {value!r}")
+        return parsed
+    return value
+
+
+def _clean_receiver(value):
+    if value and value not in dict(Payment.RECEIVER_CHOICES):
+        raise ValidationError(f"Unknown receiver: {value!r}")
+    return value or None
+
+
+def _apply_posting(payment, amount, paid_date, due_date, source_id, received_by):
+    payment.is_paid = True
+    payment.paid_date = paid_date
+    payment.amount = amount or payment.amount
+    payment.due_date = due_date or payment.due_date
+    payment.source_id = source_id or payment.source_id
+    payment.received_by = received_by or payment.received_by
+
+
+def _credit_fields(payment):
+    """Field values of the credit `Transaction` mirroring a paid payment."""
+    return {
+        "date": payment.paid_date,
+        "type": "credit",
+        "amount": payment.amount,
+        "description": f"Installment from {payment.booking.buyer.name}",
+        "related_booking_id": payment.booking_id,
+        "source_id": payment.source_id,
+    }
+
+
+def _refresh_bookings(booking_ids):
+    Booking.objects.filter(pk__in=booking_ids).refresh_ledger(
+        is_completed=~Exists(
+            Payment.objects.filter(booking=OuterRef("pk"), is_paid=False)
+        )
+    )
+
+
+def _post_credits(payments):
+    """Write the credit `Transaction`s of freshly paid `payments`, the
+    daily summary and their bookings' counters, set-based."""
+    existing = {
+        credit.related_payment_id: credit
+        for credit in Transaction.objects.filter(
+            related_payment_id__in=[payment.pk for payment in payments]
+        ).only("pk", "related_payment_id", "date", "source_id", "type", "amount")
+    }
+    new_credits, changed_credits = [], []
+    summary = SummaryDelta()
+    for payment in payments:
+        credit = Transaction(related_payment=payment, **_credit_fields(payment))
+        old = existing.get(payment.pk)
+        if old is not None:
+            credit.pk = old.pk
+            changed_credits.append(credit)
+        else:
+            new_credits.append(credit)
+        # bulk writes skip the Transaction signals
+        summary.replace(old and old.summary_entry(), credit.summary_entry())
+    Transaction.objects.bulk_create(new_credits, batch_size=500)
+    Transaction.objects.bulk_update(
+        changed_credits,
+        ["date", "type", "amount", "description", "related_booking", "source"],
+        batch_size=500,
+    )
+    summary.apply()
+
+    _refresh_bookings({payment.booking_id for payment in payments})
+
+
+def post_payment(
+    payment_id,
+    *,
+    amount=None,
+    paid_date=None,
+    due_date=None,
+    source_id=None,
+    received_by=None,
+):
+    """Mark one installment paid and apply all of its side effects.
+
+    Runs in one transaction holding row locks on the payment and its
+    booking, so two clerks posting against the same booking are applied
+    one after the other and the same installment can't be paid twice.
+    Writes the payment, its credit `Transaction` (and so the daily summary),
+    and the booking's ledger counters and completion flag directly instead
+    of going through the payment signals; with `OUTBOX_ENABLED` those are
+    left to `process_outbox`. Raises `ValidationError` if the payment can't be posted.
+    """
+    amount = _clean_amount(amount)
+    paid_date = _clean_date(paid_date) or timezone.now().date()
+    due_date = _clean_date(due_date)
+    received_by = _clean_receiver(received_by)
+
+    with transaction.atomic():
+        try:
+            payment = (
+                Payment.objects.select_related("booking__buyer")
+                .select_for_update(of=("self", "booking"))
+                .get(pk=payment_id)
+            )
+        except Payment.DoesNotExist:
+            raise ValidationError(f"Payment #{payment_id} does not exist.")
+        if payment.is_paid:
+            raise ValidationError(f"Payment #{payment_id} is already paid.")
+
+        _apply_posting(payment, amount, paid_date, due_date, source_id, received_by)
+        Payment.objects.filter(pk=payment.pk).update(
+            **{field: getattr(payment, field) for field in PAYMENT_POST_FIELDS}
+        )
+        if settings.OUTBOX_ENABLED:
+            # Transaction.save() won't run to check the date
+            ClosedPeriod.objects.check_open(payment.paid_date)
+            OutboxEvent.objects.record("payment", payment.pk, payment.booking_id)
+            return payment
+
+        # Saved through the model so the daily summary is updated too
+        credit = Transaction.objects.filter(related_payment=payment).first()
+        if credit is None:
+            credit = Transaction(related_payment=payment)
+        for field, value in _credit_fields(payment).items():
+            setattr(credit, field, value)
+        credit.save()
+
+        _refresh_bookings([payment.booking_id])
+    return payment
+
+
+def post_payments(rows):
+    """Post a batch of installments in one transaction.
+
+    `rows` is a list of dicts with `payment_id` and optional `amount`,
+    `paid_date`, `source_id` and `received_by`. The whole batch is
+    validated first; if any row is invalid nothing is written. Otherwise
+    payments, credit transactions, the daily summary and booking counters
+    are written with a handful of set-based statements regardless of
+    batch size (with `OUTBOX_ENABLED`, the payments and one outbox event
+    each).
+
+    Returns `(posted, results)` where `results` holds one
+    `{"payment_id", "status", "error"}` dict per input row, in order.
+    """
+    results = []
+    cleaned = {}
+    through = ClosedPeriod.objects.closed_through()
+    for row in rows:
+        result = {"payment_id": row.get("payment_id"), "status": "ok", "error": None}
+        results.append(result)
+        try:
+            payment_id = int(row.get("payment_id"))
+            if payment_id in cleaned:
+                raise ValidationError("Payment appears more than once in the batch.")
+            paid_date = _clean_date(row.get("paid_date")) or timezone.now().date()
+            if through:
+                ClosedPeriod.objects.check_open(paid_date, through=through)
+            cleaned[payment_id] = {
+                "amount": _clean_amount(row.get("amount")),
+                "paid_date": paid_date,
+                "due_date": None,
+                "source_id": int(row["source_id"]) if row.get("source_id") else None,
+                "received_by": _clean_receiver(row.get("received_by")),
+            }
+            result["payment_id"] = payment_id
+        except (TypeError, ValueError):
+            result.update(status="error", error="Invalid payment id or source id.")
+        except ValidationError as e:
+            result.update(status="error", error=" ".join(e.messages))
+
+    source_ids = {values["source_id"] for values in cleaned.values()} - {None}
+    known_sources = set(
+        PaymentSource.objects.filter(pk__in=source_ids).values_list("pk", flat=True)
+    )
+
+    with transaction.atomic():
+        # Lock in a fixed order so concurrent batches can't deadlock
+        payments = {
+            payment.pk: payment
+            for payment in Payment.objects.select_related("booking__buyer")
+            .select_for_update(of=("self", "booking"))
+            .filter(pk__in=cleaned)
+            .order_by("booking_id", "pk")
+        }
+
+        for result in results:
+            if result["status"] != "ok":
+                continue
+            payment = payments.get(result["payment_id"])
+            source_id = cleaned[result["payment_id"]]["source_id"]
+            if payment is None:
+                result.update(status="error", error="Payment does not exist.")
+            elif payment.is_paid:
+                result.update(status="error", error="Payment is already paid.")
+            elif source_id and source_id not in known_sources:
+                result.update(status="error", error="Unknown payment source.")
+
+        if any(result["status"] != "ok" for result in results):
+            for result in results:
+                if result["status"] == "ok":
+                    result["status"] = "skipped"
+            return 0, results
+
+        for payment_id, values in cleaned.items():
+            _apply_posting(payments[payment_id], **values)
+        Payment.objects.bulk_update(
+            payments.values(), PAYMENT_POST_FIELDS, batch_size=500
+        )
+        if settings.OUTBOX_ENABLED:
+            OutboxEvent.objects.bulk_create(
+                OutboxEvent(kind="payment", object_id=payment.pk, booking_id=payment.booking_id)
+                for payment in payments.values()
+            )
+        else:
+            _post_credits(payments.values())
+
+    for result in results:
+        result["status"] = "posted"
+    return len(payments), results
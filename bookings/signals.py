@@ -1,79 +1,70 @@
-from django.db.models.signals import post_save, pre_save
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.signals import post_save
 from django.dispatch import receiver
-from django.utils import timezone
-from datetime import timedelta
 
-from .models import Booking, Payment
-
-
-@receiver(pre_save, sender=Payment)
-def payment_pre_save(sender, instance, **kwargs):
-    """Attach previous `is_paid` state to the instance so post_save can
-    determine whether the payment transitioned from unpaid -> paid.
-    """
-    if instance.pk:
-        try:
-            old = Payment.objects.get(pk=instance.pk)
-            instance._was_paid = bool(old.is_paid)
-        except Payment.DoesNotExist:
-            instance._was_paid = False
-    else:
-        instance._was_paid = False
+from accounts.models import Buyer
+from jobs.models import OutboxEvent
+from plots.models import Plot
+from .models import Booking, Payment, PaymentSource
+from .schedule import generate_schedule
 
 
 @receiver(post_save, sender=Booking)
-def create_first_payment(sender, instance, created, **kwargs):
+def create_payment_schedule(sender, instance, created, **kwargs):
     """
-    When a Booking is created, create the first Payment if none exist.
+    When a Booking is created, write its whole installment schedule.
     """
-    if created and not instance.payments.exists():
-        first_due_date = instance.start_date + timedelta(days=30)
-        Payment.objects.create(
-            booking=instance,
-            amount=instance.monthly_installment,
-            due_date=first_due_date,
-        )
+    if created and not settings.OUTBOX_ENABLED:
+        generate_schedule(instance)
 
 
 @receiver(post_save, sender=Payment)
-def create_next_payment(sender, instance, created, **kwargs):
+def mark_booking_completed(sender, instance, created, **kwargs):
     """
-    When a Payment is saved:
-    - If it's marked as paid,
-    - And the booking still has remaining months,
-    - Then create the next Payment automatically.
-    - If all months are paid, mark booking as completed.
+    When a Payment is marked paid and no unpaid installments remain,
+    mark the booking as completed.
     """
-    booking = instance.booking
-    total_paid_count = booking.payments.filter(is_paid=True).count()
-    total_months = booking.installment_months
-    # Only create the next payment when this Payment was just marked paid
-    # Use the `_was_paid` attribute set in `pre_save` to detect the transition.
-    was_paid = getattr(instance, "_was_paid", False)
-    if instance.is_paid and not was_paid and total_paid_count < total_months:
-        # Ensure this instance is the latest payment by due_date — only the last
-        # payment becoming paid should create the next installment.
-        last_payment = booking.payments.order_by("-due_date").first()
-        if not last_payment or last_payment.id != instance.id:
-            return
+    if settings.OUTBOX_ENABLED:
+        return
+    if instance.is_paid and not Payment.objects.filter(
+        booking_id=instance.booking_id, is_paid=False
+    ).exists():
+        Booking.objects.filter(pk=instance.booking_id, is_completed=False).update(
+            is_completed=True
+        )
 
-        # If paid_date is not set on the last payment, fall back to due_date;
-        # if still missing, use today.
-        base_date = last_payment.paid_date or last_payment.due_date
-        if base_date is None:
-            base_date = timezone.now().date()
-        next_due_date = base_date + timedelta(days=30)
 
-        # Only create if there isn't already a payment with this due date
-        if not booking.payments.filter(due_date=next_due_date).exists():
-            Payment.objects.create(
-                booking=booking,
-                amount=(booking.plot_price - booking.total_paid_amount)
-                / (total_months - total_paid_count),
-                due_date=next_due_date,
-            )
+@receiver(post_save, sender=Plot)
+def refresh_plot_booking_ledger(sender, instance, created, **kwargs):
+    """Outstanding balance depends on the plot price, so keep it in step."""
+    if created:
+        return
+    if settings.OUTBOX_ENABLED:
+        OutboxEvent.objects.record_bookings(Booking.objects.filter(plot=instance))
+    else:
+        Booking.objects.filter(plot=instance).refresh_ledger()
+
+
+@receiver(post_save, sender=Buyer)
+def bump_buyer_booking_versions(sender, instance, created, **kwargs):
+    """Buyer details appear on statements, so invalidate cached ones."""
+    if created:
+        return
+    if settings.OUTBOX_ENABLED:
+        OutboxEvent.objects.record_bookings(Booking.objects.filter(buyer=instance))
+    else:
+        Booking.objects.filter(buyer=instance).bump_version()
+
 
-    # ✅ If all payments are paid → mark booking as completed
-    if total_paid_count >= total_months:
-        booking.is_completed = True
-        booking.save(update_fields=["is_completed"])
+@receiver(post_save, sender=PaymentSource)
+def bump_source_booking_versions(sender, instance, created, **kwargs):
+    """Source names appear on statements, so invalidate cached ones."""
+    if created:
+        return
+    shown_on = Booking.objects.filter(Q(source=instance) | Q(payments__source=instance))
+    bookings = Booking.objects.filter(pk__in=shown_on.values("pk"))
+    if settings.OUTBOX_ENABLED:
+        OutboxEvent.objects.record_bookings(bookings)
+    else:
+        bookings.bump_version()
@@ -0,0 +1,137 @@
+"""Month-end statements for every booking (`manage.py generate_statements`).
+
+Statements are written to `MEDIA_ROOT/monthly_statements/<YYYY-MM>/`,
+one file per booking named after its version (as in `pdf_cache`), each
+through a temporary file renamed into place. A run skips bookings whose
+current statement is already there, so an interrupted run picks up where
+it stopped and a rerun only renders the bookings that changed since.
+
+A statement shows the booking as it is when drawn, so once the month has
+ended what is there is kept: a rerun only adds the bookings still
+missing, and the month's zip is never rewritten. The files hold buyers'
+personal details and are only handed out to staff, through
+`download_monthly_statements` (nginx keeps the directory internal).
+
+Bookings are rendered in chunks by a pool of forked processes; each chunk
+is fetched with `Booking.objects.for_statement()`, two queries however
+many bookings it holds.
+"""
+
+import multiprocessing
+import os
+import tempfile
+import zipfile
+from functools import partial
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from reports.periods import month_end
+from .models import Booking
+from .pdf_cache import statement_name
+from .views import render_booking_pdf
+
+MONTHLY_DIR = "monthly_statements"
+
+
+def month_dir(month):
+    return os.path.join(settings.MEDIA_ROOT, MONTHLY_DIR, f"{month:%Y-%m}")
+
+
+def has_ended(month):
+    return month_end(month) < timezone.localdate()
+
+
+def plan(month, out_dir):
+    """Ids of the bookings started by the end of `month` whose current
+    statement is not in `out_dir` yet, and the number that are. Files in
+    `out_dir` that are no current statement (older versions, deleted
+    bookings, partial writes) are removed.
+
+    Once `month` has ended, any statement of a booking counts as its
+    statement for the month and nothing but partial writes is removed."""
+    existing = set(os.listdir(out_dir))
+    final = has_ended(month)
+    # Booking ids with a statement of any version
+    drawn = {name.split("_")[1] for name in existing if name.endswith(".pdf")}
+    current = set()
+    todo = []
+    bookings = (
+        Booking.objects.filter(start_date__lte=month_end(month))
+        .order_by("pk")
+        .only("pk", "version")
+    )
+    for booking in bookings.iterator(chunk_size=5000):
+        name = statement_name(booking)
+        current.add(name)
+        if name not in existing and not (final and str(booking.pk) in drawn):
+            todo.append(booking.pk)
+    for name in existing - current:
+        if not final or not name.endswith(".pdf"):
+            os.unlink(os.path.join(out_dir, name))
+    return todo, len(current) - len(todo)
+
+
+def render_chunk(out_dir, booking_ids):
+    """Write the statements of `booking_ids` into `out_dir`. Returns the
+    number written."""
+    written = 0
+    for booking in Booking.objects.for_statement().filter(pk__in=booking_ids):
+        fd, tmp_path = tempfile.mkstemp(dir=out_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                render_booking_pdf(booking, fp)
+            os.replace(tmp_path, os.path.join(out_dir, statement_name(booking)))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        written += 1
+    return written
+
+
+def generate_statements(month, processes=1, chunk_size=200, progress=lambda written, total: None):
+    """Write the month's missing statements with `processes` processes,
+    calling `progress(written, total)` after each chunk. Returns
+    `(written, skipped)`."""
+    out_dir = month_dir(month)
+    os.makedirs(out_dir, exist_ok=True)
+    todo, skipped = plan(month, out_dir)
+    chunks = [todo[i : i + chunk_size] for i in range(0, len(todo), chunk_size)]
+    render = partial(render_chunk, out_dir)
+
+    written = 0
+    if processes > 1 and len(chunks) > 1:
+        # Forked children must not share the parent's database socket
+        connections.close_all()
+        with multiprocessing.get_context("fork").Pool(processes) as pool:
+            for count in pool.imap_unordered(render, chunks):
+                written += count
+                progress(written, len(todo))
+    else:
+        for chunk in chunks:
+            written += render(chunk)
+            progress(written, len(todo))
+    return written, skipped
+
+
+def write_zip(month):
+    """Bundle the month's statements into `<YYYY-MM>.zip` next to their
+    directory and return its path. Raises `FileExistsError` if the month
+    has ended and its zip was written already."""
+    out_dir = month_dir(month)
+    path = f"{out_dir}.zip"
+    if has_ended(month) and os.path.exists(path):
+        raise FileExistsError(f"{path} is already archived")
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(out_dir), suffix=".tmp")
+    try:
+        # PDFs are compressed already
+        with os.fdopen(fd, "wb") as fp, zipfile.ZipFile(fp, "w", zipfile.ZIP_STORED) as archive:
+            for name in sorted(os.listdir(out_dir)):
+                if name.endswith(".pdf"):
+                    archive.write(os.path.join(out_dir, name), name)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return path
@@ -1,3 +1,618 @@
-from django.test import TestCase
+import os
+import tempfile
+import threading
+import zipfile
+from datetime import date
+from decimal import Decimal
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import Buyer, User
+from plots.models import Plot
+from reports.models import Transaction
+from . import pdf_cache
+from .models import Booking, Payment, PaymentSource
+from .views import BOOKINGS_PER_PAGE
+from .reconciliation import StatementReconciler
+from .search import SEARCH_MAX_LIMIT, search_buyers, search_plots
+from .schedule import due_date_for, regenerate_schedule, split_amount
+from .services import post_payment, post_payments
+from .statements import generate_statements, month_dir
+
+
+def make_booking(months=3, price="90000.00", down_payment="0.00", suffix="1"):
+    buyer = Buyer.objects.create(
+        name=f"Buyer {suffix}",
+        father_name="Father",
+        contact_no="03001234567",
+        cnic=f"35202-000000{suffix}",
+        address="Street 1",
+    )
+    plot = Plot.objects.create(
+        title=f"Plot {suffix}", location="Block A", price=Decimal(price)
+    )
+    return Booking.objects.create(
+        buyer=buyer,
+        plot=plot,
+        installment_months=months,
+        down_payment_amount=Decimal(down_payment),
+        monthly_installment=Decimal(price) / months,
+    )
+
+
+class ScheduleTests(TestCase):
+    def test_split_amount_sums_exactly(self):
+        self.assertEqual(
+            split_amount(Decimal("100.00"), 3),
+            [Decimal("33.34"), Decimal("33.33"), Decimal("33.33")],
+        )
+        self.assertEqual(
+            split_amount(Decimal("0.05"), 7), [Decimal("0.01")] * 5 + [Decimal("0.00")] * 2
+        )
+        self.assertEqual(split_amount(Decimal("10"), 0), [])
+        for total, parts in [("90000.00", 7), ("123456.78", 36), ("0.01", 3)]:
+            self.assertEqual(sum(split_amount(Decimal(total), parts)), Decimal(total))
+
+    def test_generated_schedule_sums_to_the_balance(self):
+        booking = make_booking(months=7, price="100000.00", down_payment="10000.01")
+        payments = list(booking.payments.order_by("due_date"))
+        self.assertEqual(len(payments), 7)
+        self.assertEqual(sum(payment.amount for payment in payments), Decimal("89999.99"))
+        self.assertEqual(
+            [payment.due_date for payment in payments],
+            [due_date_for(booking, i) for i in range(7)],
+        )
+
+    def test_regeneration_keeps_paid_rows(self):
+        booking = make_booking(months=3)
+        first = booking.payments.order_by("due_date").first()
+        post_payment(first.pk)
+        booking.installment_months = 5
+        booking.save()
+
+        regenerate_schedule(booking)
+        payments = list(booking.payments.order_by("due_date"))
+        self.assertEqual(payments[0].pk, first.pk)
+        self.assertEqual(
+            [payment.due_date for payment in payments],
+            [due_date_for(booking, i) for i in range(5)],
+        )
+        self.assertEqual([payment.amount for payment in payments[1:]], [Decimal("15000.00")] * 4)
+
+    def test_balance_after_the_last_month_becomes_one_installment(self):
+        booking = make_booking(months=2)
+        post_payments([{"payment_id": payment.pk} for payment in booking.payments.all()])
+        Plot.objects.filter(pk=booking.plot_id).update(price=Decimal("95000.00"))
+
+        payments = regenerate_schedule(booking)
+        self.assertEqual(len(payments), 1)
+        self.assertEqual(payments[0].amount, Decimal("5000.00"))
+        self.assertEqual(payments[0].due_date, due_date_for(booking, 2))
+        booking.refresh_from_db()
+        self.assertEqual(booking.outstanding_balance, Decimal("5000.00"))
+
+
+class BookingLedgerTests(TestCase):
+    def setUp(self):
+        self.booking = make_booking(price="90000.00", down_payment="9000.00")
+        self.payments = list(self.booking.payments.order_by("due_date"))
+
+    def assertLedger(self, paid_count, paid_total, outstanding, next_due, last_paid):
+        self.booking.refresh_from_db()
+        self.assertEqual(
+            [getattr(self.booking, name) for name in Booking.LEDGER_FIELDS],
+            [paid_count, Decimal(paid_total), Decimal(outstanding), next_due, last_paid],
+        )
+
+    def test_counters_follow_payment_changes(self):
+        first, second, _ = self.payments
+        self.assertLedger(0, "0", "81000.00", first.due_date, None)
+
+        first.is_paid = True
+        first.paid_date = date(2025, 1, 5)
+        first.save()
+        self.assertLedger(1, "27000.00", "54000.00", second.due_date, date(2025, 1, 5))
+
+        first.amount = Decimal("30000.00")
+        first.save()
+        self.assertLedger(1, "30000.00", "51000.00", second.due_date, date(2025, 1, 5))
+
+        extra = Payment.objects.create(
+            booking=self.booking,
+            amount=Decimal("1000.00"),
+            due_date=date(2025, 2, 1),
+            is_paid=True,
+            paid_date=date(2025, 2, 1),
+        )
+        self.assertLedger(2, "31000.00", "50000.00", second.due_date, date(2025, 2, 1))
+
+        extra.delete()
+        first.delete()
+        self.assertLedger(0, "0", "81000.00", second.due_date, None)
+
+    def test_rebuild_repairs_drifted_counters(self):
+        Booking.objects.filter(pk=self.booking.pk).update(paid_count=7, outstanding_balance=0)
+
+        out = StringIO()
+        with self.assertRaisesMessage(CommandError, "2 ledger counter(s) out of sync"):
+            call_command("rebuild_booking_ledger", "--verify", stdout=out)
+        self.assertIn(f"Booking #{self.booking.pk}: paid_count stored=7 computed=0", out.getvalue())
+        # --verify only reports
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.paid_count, 7)
+
+        out = StringIO()
+        call_command("rebuild_booking_ledger", f"--booking={self.booking.pk}", stdout=out)
+        self.assertIn("Rebuilt counters for 1 bookings", out.getvalue())
+        self.assertIn("in sync", out.getvalue())
+        self.assertLedger(0, "0", "81000.00", self.payments[0].due_date, None)
+
+
+class BookingsPageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.bookings = [make_booking(suffix=str(i)) for i in range(BOOKINGS_PER_PAGE + 1)]
+        for booking in cls.bookings[:3]:
+            post_payment(booking.payments.order_by("due_date").first().pk)
+        cls.user = User.objects.create(username="clerk")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def get_page(self, page):
+        return self.client.get(reverse("bookings_page"), {"page": page})
+
+    def test_page_boundaries(self):
+        newest_first = [
+            booking.pk
+            for booking in sorted(self.bookings, key=lambda b: (b.start_date, b.pk), reverse=True)
+        ]
+        first = self.get_page(1)
+        self.assertEqual(
+            [booking.pk for booking in first.context["bookings"]], newest_first[:BOOKINGS_PER_PAGE]
+        )
+        self.assertContains(first, "Page 1 of 2")
+        last = self.get_page(2)
+        self.assertEqual(
+            [booking.pk for booking in last.context["bookings"]], newest_first[BOOKINGS_PER_PAGE:]
+        )
+
+        # Out of range goes to the last page, anything not a number to the first
+        for page, number in [(99, 2), (-1, 2), ("abc", 1), ("", 1)]:
+            response = self.get_page(page)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context["page_obj"].number, number)
+
+    def test_totals_match_the_ledger(self):
+        ledger = {booking.pk: booking for booking in Booking.objects.with_ledger()}
+        shown = [
+            booking for page in (1, 2) for booking in self.get_page(page).context["bookings"]
+        ]
+        self.assertEqual(len(shown), len(self.bookings))
+        self.assertEqual(sum(booking.paid_installments for booking in shown), 3)
+        for booking in shown:
+            computed = ledger[booking.pk]
+            self.assertEqual(booking.paid_installments, computed.ledger_paid_count)
+            self.assertEqual(
+                booking.remaining_installments,
+                booking.installment_months - computed.ledger_paid_count,
+            )
+            self.assertEqual(booking.outstanding_balance, computed.ledger_outstanding_balance)
+            self.assertEqual(booking.next_due_date, computed.ledger_next_due_date)
+
+    def test_query_count_does_not_grow_with_the_page(self):
+        # Session, user, count and the page with its buyers and plots
+        with self.assertNumQueries(4):
+            self.get_page(1)
+        with self.assertNumQueries(4):
+            self.get_page(2)
+
+
+class PostPaymentTests(TestCase):
+    def setUp(self):
+        self.booking = make_booking()
+        self.payment = self.booking.payments.order_by("due_date").first()
+
+    def test_posts_payment_within_query_budget(self):
+        # savepoint, locking select, payment update, credit lookup,
+        # closed-period check, credit insert, daily summary upsert, booking
+        # ledger update, release
+        with self.assertNumQueries(9):
+            post_payment(self.payment.pk, received_by="tasawur")
+
+        self.payment.refresh_from_db()
+        self.booking.refresh_from_db()
+        self.assertTrue(self.payment.is_paid)
+        self.assertEqual(self.booking.paid_count, 1)
+        self.assertEqual(self.booking.outstanding_balance, Decimal("60000.00"))
+        credit = Transaction.objects.get(related_payment=self.payment)
+        self.assertEqual(credit.amount, self.payment.amount)
+        self.assertEqual(credit.related_booking_id, self.booking.pk)
+
+    def test_last_payment_completes_booking(self):
+        for payment in self.booking.payments.order_by("due_date"):
+            post_payment(payment.pk)
+        self.booking.refresh_from_db()
+        self.assertTrue(self.booking.is_completed)
+        self.assertEqual(self.booking.outstanding_balance, 0)
+        self.assertIsNone(self.booking.next_due_date)
+
+    def test_rejects_already_paid(self):
+        post_payment(self.payment.pk)
+        with self.assertRaises(ValidationError):
+            post_payment(self.payment.pk)
+        self.assertEqual(Transaction.objects.filter(related_payment=self.payment).count(), 1)
+
+
+class PostPaymentsTests(TestCase):
+    def setUp(self):
+        self.bookings = [make_booking(months=12, suffix=str(i)) for i in range(5)]
+        self.payment_ids = list(
+            Payment.objects.filter(booking__in=self.bookings).values_list("pk", flat=True)
+        )
+
+    def test_batch_query_count_does_not_grow_with_rows(self):
+        rows = [{"payment_id": pk, "received_by": "tasawur"} for pk in self.payment_ids]
+        # closed-period check, savepoint, locking select, bulk update,
+        # existing credit lookup, credit insert, daily summary upsert,
+        # booking ledger update, release
+        with self.assertNumQueries(9):
+            posted, results = post_payments(rows)
+
+        self.assertEqual(posted, 60)
+        self.assertTrue(all(r["status"] == "posted" for r in results))
+        self.assertEqual(Transaction.objects.filter(type="credit").count(), 60)
+        for booking in Booking.objects.filter(pk__in=[b.pk for b in self.bookings]):
+            self.assertEqual(booking.paid_count, 12)
+            self.assertTrue(booking.is_completed)
+
+    def test_invalid_row_rejects_whole_batch(self):
+        post_payment(self.payment_ids[1])
+        rows = [
+            {"payment_id": self.payment_ids[0]},
+            {"payment_id": self.payment_ids[1]},
+            {"payment_id": self.payment_ids[2], "amount": "abc"},
+        ]
+        posted, results = post_payments(rows)
+
+        self.assertEqual(posted, 0)
+        self.assertEqual(
+            [r["status"] for r in results], ["skipped", "error", "error"]
+        )
+        self.assertFalse(Payment.objects.get(pk=self.payment_ids[0]).is_paid)
+
+
+class ReconciliationTests(TestCase):
+    def setUp(self):
+        self.source = PaymentSource.objects.create(name="Meezan Bank")
+        self.today = date.today()
+        # First installments of 30,000 / 31,000 / 32,000 due today
+        self.payments = []
+        for suffix, price in [("1", "90000.00"), ("2", "93000.00"), ("3", "96000.00")]:
+            booking = make_booking(price=price, suffix=suffix)
+            Buyer.objects.filter(pk=booking.buyer_id).update(cnic=f"35202-000000{suffix}-1")
+            payment = booking.payments.order_by("due_date").first()
+            Payment.objects.filter(pk=payment.pk).update(due_date=self.today)
+            self.payments.append(payment)
+
+    def statement(self, *lines):
+        return StringIO("\n".join(["Date,Description,Credit", *lines]) + "\n")
+
+    def reconcile(self, reconciler, *lines):
+        unmatched = StringIO()
+        stats = reconciler.run(self.statement(*lines), unmatched)
+        rows = unmatched.getvalue().splitlines()[1:]
+        return stats, [row.rsplit(",", 1)[1] for row in rows]
+
+    def paid(self):
+        return set(Payment.objects.filter(is_paid=True).values_list("pk", flat=True))
+
+    def test_matches_by_identifier_and_amount(self):
+        stats, reasons = self.reconcile(
+            StatementReconciler(source=self.source),
+            f"{self.today:%d/%m/%Y},IBFT from CNIC 3520200000011,\"30,000.00\"",
+            f"{self.today:%Y-%m-%d},Cash deposit,31000",
+            f"{self.today:%Y-%m-%d},Profit,-500",
+        )
+        self.assertEqual(reasons, [])
+        self.assertEqual((stats["credits"], stats["matched"], stats["posted"]), (2, 2, 2))
+        self.assertEqual(self.paid(), {self.payments[0].pk, self.payments[1].pk})
+        self.assertEqual(
+            Payment.objects.get(pk=self.payments[0].pk).source_id, self.source.pk
+        )
+
+    def test_ambiguous_duplicate_and_bad_lines_are_reported(self):
+        Payment.objects.filter(pk=self.payments[1].pk).update(amount=Decimal("30000.00"))
+        stats, reasons = self.reconcile(
+            StatementReconciler(source=self.source),
+            f"{self.today},Cash deposit,30000",
+            f"{self.today},CNIC 35202-0000003-1,32000",
+            f"{self.today},CNIC 35202-0000003-1,32000",
+            "yesterday,CNIC 35202-0000001-1,30000",
+        )
+        self.assertEqual(
+            reasons,
+            [
+                "ambiguous: 2 installments fit",
+                "no open installment with this amount near this date",
+                "bad date",
+            ],
+        )
+        self.assertEqual((stats["matched"], stats["unmatched"]), (1, 3))
+        self.assertEqual(self.paid(), {self.payments[2].pk})
+
+    def test_dry_run_posts_nothing(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as fp:
+            fp.write(self.statement(f"{self.today},CNIC 35202-0000001-1,30000").getvalue())
+        self.addCleanup(os.unlink, fp.name)
+        err = StringIO()
+        call_command(
+            "reconcile_statement",
+            fp.name,
+            "--source",
+            "meezan bank",
+            "--dry-run",
+            "--unmatched",
+            os.devnull,
+            stdout=StringIO(),
+            stderr=err,
+        )
+        self.assertIn("1 matched, 0 posted, 0 unmatched", err.getvalue())
+        self.assertEqual(self.paid(), set())
+
+    def test_lines_still_open_are_posted_when_the_batch_fails(self):
+        reconciler = StatementReconciler(source=self.source)
+        build_index = reconciler.build_index
+
+        def clerk_posts_one_meanwhile():
+            build_index()
+            post_payment(self.payments[1].pk)
+
+        reconciler.build_index = clerk_posts_one_meanwhile
+        stats, reasons = self.reconcile(
+            reconciler,
+            f"{self.today},CNIC 35202-0000001-1,30000",
+            f"{self.today},CNIC 35202-0000002-1,31000",
+            f"{self.today},CNIC 35202-0000003-1,32000",
+        )
+        self.assertEqual(reasons, ["Payment is already paid."])
+        self.assertEqual((stats["matched"], stats["posted"], stats["unmatched"]), (2, 2, 1))
+        self.assertEqual(self.paid(), {payment.pk for payment in self.payments})
+
+
+class ConcurrentPostPaymentTests(TransactionTestCase):
+    def test_same_booking_posted_concurrently(self):
+        booking = make_booking()
+        payments = list(booking.payments.order_by("due_date"))
+        # Two clerks post the same installment, a third posts the next one
+        targets = [payments[0].pk, payments[0].pk, payments[1].pk]
+        errors = []
+        barrier = threading.Barrier(len(targets))
+
+        def clerk(payment_id):
+            try:
+                barrier.wait()
+                post_payment(payment_id)
+            except ValidationError as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=clerk, args=(pk,)) for pk in targets]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        booking.refresh_from_db()
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(booking.paid_count, 2)
+        self.assertEqual(Transaction.objects.filter(related_booking=booking).count(), 2)
+        self.assertEqual(
+            booking.outstanding_balance,
+            booking.plot.price - booking.paid_total,
+        )
+
+
+class StatementBatchTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.bookings = [make_booking(suffix=str(i)) for i in range(3)]
+        self.month = date.today()
+
+    def test_rerun_renders_only_changed_bookings(self):
+        # Two queries per chunk of bookings, not per booking
+        with self.assertNumQueries(1 + 2 * 2):
+            self.assertEqual(generate_statements(self.month, chunk_size=2), (3, 0))
+
+        post_payment(self.bookings[0].payments.first().pk)
+        self.assertEqual(generate_statements(self.month), (1, 2))
+        self.assertEqual(
+            sorted(os.listdir(month_dir(self.month))),
+            sorted(f"booking_{b.pk}_v{b.version}.pdf" for b in Booking.objects.all()),
+        )
+
+    def test_command_writes_zip(self):
+        out = StringIO()
+        call_command(
+            "generate_statements", f"--month={self.month:%Y-%m}", "--processes=1", "--zip", stdout=out
+        )
+        self.assertIn("Wrote 3 statement(s)", out.getvalue())
+        with zipfile.ZipFile(f"{month_dir(self.month)}.zip") as archive:
+            self.assertEqual(len(archive.namelist()), 3)
+
+    def test_ended_month_is_kept_as_written(self):
+        month = date(2025, 1, 1)
+        Booking.objects.update(start_date=date(2024, 12, 1))
+        args = ["generate_statements", "--month=2025-01", "--processes=1", "--zip"]
+        call_command(*args, stdout=StringIO())
+        before = sorted(os.listdir(month_dir(month)))
+
+        # Later changes don't replace the month's statements or its zip
+        post_payment(self.bookings[0].payments.first().pk)
+        os.unlink(os.path.join(month_dir(month), pdf_cache.statement_name(self.bookings[2])))
+        self.assertEqual(generate_statements(month), (1, 2))
+        self.assertEqual(sorted(os.listdir(month_dir(month))), before)
+        with self.assertRaisesMessage(CommandError, "not rewritten"):
+            call_command(*args, stdout=StringIO())
+
+    def test_zip_download_is_staff_only(self):
+        call_command(
+            "generate_statements", f"--month={self.month:%Y-%m}", "--processes=1", "--zip",
+            stdout=StringIO(),
+        )
+        url = reverse("download_monthly_statements", args=[f"{self.month:%Y-%m}"])
+        self.client.force_login(User.objects.create(username="clerk"))
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.force_login(User.objects.create(username="manager", is_staff=True))
+        response = self.client.get(url)
+        self.assertEqual(response["Content-Type"], "application/zip")
+        with zipfile.ZipFile(BytesIO(b"".join(response.streaming_content))) as archive:
+            self.assertEqual(len(archive.namelist()), 3)
+        bad_month = reverse("download_monthly_statements", args=["2020-13"])
+        self.assertEqual(self.client.get(bad_month).status_code, 404)
+
+        with override_settings(BOOKING_PDF_X_ACCEL=True):
+            response = self.client.get(url)
+        self.assertEqual(
+            response["X-Accel-Redirect"],
+            f"{settings.MEDIA_URL}monthly_statements/{self.month:%Y-%m}.zip",
+        )
+
+
+class StatementCacheTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.booking = make_booking()
+        self.renders = []
+
+    def render(self, booking, fp):
+        self.renders.append(booking.version)
+        fp.write(f"statement v{booking.version}".encode())
+
+    def statement(self):
+        booking = Booking.objects.get(pk=self.booking.pk)
+        with pdf_cache.cached_statement(booking, self.render) as fp:
+            return fp.read()
+
+    def cached_files(self):
+        return sorted(os.listdir(os.path.join(settings.MEDIA_ROOT, pdf_cache.STATEMENTS_DIR)))
+
+    def test_keyed_by_version(self):
+        version = self.booking.version
+        self.assertEqual(self.statement(), f"statement v{version}".encode())
+        self.assertEqual(self.statement(), f"statement v{version}".encode())
+        self.assertEqual(self.renders, [version])
+
+        post_payment(self.booking.payments.first().pk)
+        self.assertEqual(self.statement(), f"statement v{version + 1}".encode())
+        # The old version is removed once the new one is written
+        self.assertEqual(self.cached_files(), [f"booking_{self.booking.pk}_v{version + 1}.pdf"])
+
+    def test_open_statement_survives_eviction(self):
+        booking = Booking.objects.get(pk=self.booking.pk)
+        self.statement()
+        fp = pdf_cache.cached_statement(booking, self.render)
+        self.addCleanup(fp.close)
+        pdf_cache.evict(0)
+        self.assertEqual(self.cached_files(), [])
+        self.assertEqual(fp.read(), f"statement v{booking.version}".encode())
+
+        response = self.client.get(reverse("download_booking_pdf", args=[booking.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"%PDF"))
+
+    def test_evicts_least_recently_used(self):
+        cache_dir = os.path.join(settings.MEDIA_ROOT, pdf_cache.STATEMENTS_DIR)
+        os.makedirs(cache_dir)
+        for age, name in enumerate(["new.pdf", "used.pdf", "old.pdf"]):
+            path = os.path.join(cache_dir, name)
+            with open(path, "wb") as fp:
+                fp.write(b"x" * 100)
+            os.utime(path, (1000 - age, 1000 - age))
+        self.assertEqual(pdf_cache.evict(300), 0)
+        self.assertEqual(pdf_cache.evict(250), 1)
+        self.assertEqual(self.cached_files(), ["new.pdf", "used.pdf"])
+
+    def test_source_rename_invalidates_statements(self):
+        source = PaymentSource.objects.create(name="Cash")
+        post_payment(self.booking.payments.first().pk, source_id=source.pk)
+        version = Booking.objects.get(pk=self.booking.pk).version
+        other = make_booking(suffix="2")
+
+        source.name = "Cash in Hand"
+        source.save()
+        self.assertEqual(Booking.objects.get(pk=self.booking.pk).version, version + 1)
+        self.assertEqual(Booking.objects.get(pk=other.pk).version, other.version)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        for name, cnic, contact in [
+            ("Muhammad Ali", "35202-1234567-1", "03001112222"),
+            ("Alina Shah", "35202-7654321-2", "03213334444"),
+            ("Ali Khan", "61101-1111111-3", "03335556666"),
+            ("Saad Ali", "35202-1234598-4", "03451234567"),
+        ]:
+            Buyer.objects.create(
+                name=name, father_name="-", cnic=cnic, contact_no=contact, address="-"
+            )
+        for title, block, status in [
+            ("A-12", "Block A", "available"),
+            ("B-7", "Block A", "available"),
+            ("A-13", "Block B", "sold"),
+        ]:
+            Plot.objects.create(
+                title=title, block_name=block, location="-", price=Decimal("1000"), status=status
+            )
+
+    def names(self, query, **kwargs):
+        rows, _ = search_buyers(query, **kwargs)
+        return [row["name"] for row in rows]
+
+    def test_names_starting_with_the_query_rank_first(self):
+        self.assertEqual(self.names("ali"), ["Ali Khan", "Alina Shah", "Muhammad Ali", "Saad Ali"])
+        rows, _ = search_plots("a-1")
+        self.assertEqual([row["title"] for row in rows], ["A-12"])
+        rows, _ = search_plots("block a", status="")
+        self.assertEqual([row["title"] for row in rows], ["A-12", "B-7"])
+
+    def test_short_queries_match_prefixes_only(self):
+        self.assertEqual(self.names("al"), ["Ali Khan", "Alina Shah"])
+        self.assertEqual(self.names("03"), ["Ali Khan", "Alina Shah", "Muhammad Ali", "Saad Ali"])
+
+    def test_cnic_and_contact(self):
+        self.assertEqual(self.names("3520212345"), ["Muhammad Ali", "Saad Ali"])
+        self.assertEqual(self.names("35202-7654321-2"), ["Alina Shah"])
+        self.assertEqual(self.names("5556666"), ["Ali Khan"])
+
+    def test_limits_and_paging(self):
+        self.assertEqual(search_buyers("ali", limit=3)[1], 3)
+        rows, next_offset = search_buyers("ali", offset=3, limit=3)
+        self.assertEqual(([row["name"] for row in rows], next_offset), (["Saad Ali"], None))
+
+        self.client.force_login(User.objects.create(username="staff", is_staff=True))
+        url = reverse("api_search_buyers")
+        response = self.client.get(url, {"q": "ali", "limit": "2"}).json()
+        self.assertEqual((len(response["results"]), response["next_offset"]), (2, 2))
+        response = self.client.get(url, {"q": "ali", "limit": "999", "offset": "x"}).json()
+        self.assertEqual(len(response["results"]), 4)
+        empty = self.client.get(url, {"q": " "}).json()
+        self.assertEqual(empty, {"results": [], "next_offset": None})
+
+        for i in range(SEARCH_MAX_LIMIT + 5):
+            Plot.objects.create(title=f"C-{i}", location="-", price=Decimal("1000"))
+        response = self.client.get(reverse("api_search_plots"), {"q": "c-", "limit": "999"}).json()
+        self.assertEqual(len(response["results"]), SEARCH_MAX_LIMIT)
+        self.assertEqual(response["next_offset"], SEARCH_MAX_LIMIT)
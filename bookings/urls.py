@@ -9,6 +9,22 @@ urlpatterns = [
         views.mark_payment_paid,
         name="mark_payment_paid",
     ),
+    path(
+        "payments/bulk-post/",
+        views.bulk_post_payments,
+        name="bulk_post_payments",
+    ),
+    path("reconcile/", views.reconcile_statement, name="reconcile_statement"),
+    path(
+        "reconcile/reports/<str:name>/",
+        views.download_reconciliation_report,
+        name="download_reconciliation_report",
+    ),
+    path(
+        "statements/<str:month>/download/",
+        views.download_monthly_statements,
+        name="download_monthly_statements",
+    ),
     path(
         "<int:pk>/download-pdf/",
         views.download_booking_pdf,
@@ -16,5 +32,7 @@ urlpatterns = [
     ),
     path("create-booking/", views.create_booking_combined, name="create_booking_combined"),
     path("api/plot/<int:pk>/", views.api_get_plot, name="api_get_plot"),
+    path("api/plots/search/", views.api_search_plots, name="api_search_plots"),
+    path("api/buyers/search/", views.api_search_buyers, name="api_search_buyers"),
     path("api/buyer/<int:pk>/", views.api_get_buyer, name="api_get_buyer"),
 ]
@@ -1,33 +1,56 @@
+import io
+import json
+import os
+from datetime import datetime
+
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
+from django.core.exceptions import ValidationError
 from django.utils import timezone
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.core.paginator import Paginator
 from django.db import transaction
-from django.views.decorators.http import require_GET
+from django.db.models import prefetch_related_objects
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET, require_POST
 
 from .forms import BuyerForm, PlotForm, BookingForm
-from .models import Booking, Payment, PaymentSource
+from .models import Booking, Payment, PaymentSource, statement_payments
+from . import pdf_cache
+from .reconciliation import StatementReconciler
+from .search import SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT, search_buyers, search_plots
+from .services import post_payment, post_payments
 
 from accounts.models import Buyer
+from installments.metrics import pdf_render_timer
 from plots.models import Plot
 
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.units import inch
+from reports.pdf_report import Column, PDFReport, money, write_pdf
 
 
 def staff_required(view_func):
     return user_passes_test(lambda u: u.is_active and u.is_staff)(view_func)
 
 
+BOOKINGS_PER_PAGE = 25
+BULK_POST_LIMIT = 2000
+RECONCILIATION_DIR = "reconciliation"
+
+
 @login_required
 def bookings_page(request):
-    bookings = Booking.objects.select_related("buyer", "plot").prefetch_related(
-        "payments"
+    bookings = Booking.objects.select_related("buyer", "plot").order_by(
+        "-start_date", "-id"
     )
+    page_obj = Paginator(bookings, BOOKINGS_PER_PAGE).get_page(request.GET.get("page"))
 
-    return render(request, "bookings/bookings_page.html", {"bookings": bookings})
+    return render(
+        request,
+        "bookings/bookings_page.html",
+        {"bookings": page_obj.object_list, "page_obj": page_obj},
+    )
 
 
 @login_required
@@ -39,6 +62,22 @@ def booking_detail(request, booking_id):
 
     if request.method == "POST" and next_due:
         if str(next_due.id) == request.POST.get("payment_id"):
+            if "mark_paid" in request.POST:
+                try:
+                    post_payment(
+                        next_due.id,
+                        amount=request.POST.get("amount"),
+                        paid_date=request.POST.get("paid_date"),
+                        due_date=request.POST.get("due_date"),
+                        source_id=request.POST.get("payment_source"),
+                        received_by=request.POST.get("received_by"),
+                    )
+                except ValidationError as e:
+                    messages.error(request, f"❌ {' '.join(e.messages)}")
+                else:
+                    messages.success(request, "✅ Payment marked as paid successfully!")
+                return redirect("booking_detail", booking_id=booking.id)
+
             next_due.due_date = request.POST.get("due_date") or next_due.due_date
             next_due.paid_date = request.POST.get("paid_date") or next_due.paid_date
             next_due.amount = request.POST.get("amount") or next_due.amount
@@ -50,13 +89,8 @@ def booking_detail(request, booking_id):
             if source_id:
                 next_due.source_id = source_id
 
-            if "mark_paid" in request.POST:
-                next_due.is_paid = True
-                messages.success(request, "✅ Payment marked as paid successfully!")
-            else:
-                messages.success(request, "✅ Payment updated successfully!")
-
             next_due.save()
+            messages.success(request, "✅ Payment updated successfully!")
             return redirect("booking_detail", booking_id=booking.id)
 
     return render(
@@ -74,154 +108,255 @@ def booking_detail(request, booking_id):
 @login_required
 def mark_payment_paid(request, payment_id):
     payment = get_object_or_404(Payment, id=payment_id)
-    booking = payment.booking
 
     if request.method == "POST":
-        received_by = request.POST.get("received_by")
-        payment.is_paid = True
-        payment.paid_date = timezone.now().date()
-        payment.received_by = received_by
-        payment.save()
+        try:
+            post_payment(payment.id, received_by=request.POST.get("received_by"))
+        except ValidationError as e:
+            messages.error(request, f"❌ {' '.join(e.messages)}")
+        else:
+            messages.success(
+                request, f"✅ Payment for {payment.due_date} marked as PAID."
+            )
 
-        messages.success(request, f"✅ Payment for {payment.due_date} marked as PAID.")
+    return redirect("booking_detail", booking_id=payment.booking_id)
 
-    return redirect("booking_detail", booking_id=booking.id)
 
+@require_POST
+@staff_required
+def bulk_post_payments(request):
+    """Post many installments at once.
+
+    Expects a JSON body like ``{"payments": [{"payment_id": 1, "amount":
+    "9000", "paid_date": "2025-01-05", "source_id": 2, "received_by":
+    "tasawur"}, ...]}`` and returns one result per row.
+    """
+    try:
+        rows = json.loads(request.body)["payments"]
+        if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+            raise ValueError
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse(
+            {"error": 'Expected a JSON object with a "payments" list.'}, status=400
+        )
+    if len(rows) > BULK_POST_LIMIT:
+        return JsonResponse(
+            {"error": f"At most {BULK_POST_LIMIT} payments per request."}, status=400
+        )
+
+    posted, results = post_payments(rows)
+    return JsonResponse(
+        {"posted": posted, "results": results}, status=200 if posted == len(rows) else 400
+    )
 
-def download_booking_pdf(request, pk):
-    booking = Booking.objects.select_related("buyer", "plot").get(id=pk)
-    payments = booking.payments.select_related("source").all().order_by("due_date")
-
-    response = HttpResponse(content_type="application/pdf")
-    response["Content-Disposition"] = f"attachment; filename=Booking_{booking.id}.pdf"
-
-    p = canvas.Canvas(response, pagesize=A4)
-    width, height = A4
-    y = height - inch
-
-    # -------- HEADER --------
-    p.setFont("Helvetica-Bold", 16)
-    p.drawCentredString(width / 2, y, "Abrar Green City - Booking Report")
-    y -= 20
-    p.setFont("Helvetica", 10)
-    p.drawCentredString(
-        width / 2, y, f"Generated on {timezone.now().strftime('%b %d, %Y, %I:%M %p')}"
+
+@staff_required
+def reconcile_statement(request):
+    payment_sources = PaymentSource.objects.filter(is_active=True)
+    context = {"payment_sources": payment_sources}
+
+    if request.method == "POST" and request.FILES.get("statement"):
+        source = PaymentSource.objects.filter(
+            id=request.POST.get("payment_source") or 0
+        ).first()
+        window = request.POST.get("window_days", "")
+        reconciler = StatementReconciler(
+            source=source,
+            window_days=int(window) if window.isdigit() else 10,
+            dry_run="dry_run" in request.POST,
+        )
+
+        report_dir = os.path.join(settings.MEDIA_ROOT, RECONCILIATION_DIR)
+        os.makedirs(report_dir, exist_ok=True)
+        report_name = f"unmatched_{timezone.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        statement = io.TextIOWrapper(
+            request.FILES["statement"].file, encoding="utf-8-sig", newline=""
+        )
+        try:
+            with open(
+                os.path.join(report_dir, report_name), "w", newline="", encoding="utf-8"
+            ) as unmatched:
+                stats = reconciler.run(statement, unmatched)
+        except ValueError as e:
+            messages.error(request, f"❌ {e}")
+        else:
+            messages.success(
+                request,
+                f"✅ {stats.get('matched', 0)} of {stats.get('credits', 0)} credits "
+                f"matched, {stats.get('posted', 0)} payments posted.",
+            )
+            context.update(stats=stats, report_name=report_name)
+
+    return render(request, "bookings/reconcile_statement.html", context)
+
+
+@staff_required
+def download_reconciliation_report(request, name):
+    path = os.path.join(settings.MEDIA_ROOT, RECONCILIATION_DIR, os.path.basename(name))
+    if not os.path.isfile(path):
+        raise Http404("Report not found")
+    return FileResponse(open(path, "rb"), as_attachment=True, filename=name)
+
+
+@staff_required
+def download_monthly_statements(request, month):
+    # Lazy import: the statements module renders through this one
+    from .statements import MONTHLY_DIR, month_dir
+
+    try:
+        month = datetime.strptime(month, "%Y-%m").date()
+    except ValueError:
+        raise Http404("Unknown month")
+    path = f"{month_dir(month)}.zip"
+    if not os.path.isfile(path):
+        raise Http404("No statements archived for that month")
+    filename = f"Statements_{month:%Y-%m}.zip"
+
+    if settings.BOOKING_PDF_X_ACCEL:
+        response = HttpResponse(content_type="application/zip")
+        response["X-Accel-Redirect"] = f"{settings.MEDIA_URL}{MONTHLY_DIR}/{month:%Y-%m}.zip"
+        response["Content-Disposition"] = f"attachment; filename={filename}"
+        return response
+    return FileResponse(
+        open(path, "rb"), as_attachment=True, filename=filename, content_type="application/zip"
+    )
+
+
+PAYMENT_COLUMNS = [
+    Column("Due Date", 65),
+    Column("Amount", 85, align="right", format=money, total=True),
+    Column("Status", 60),
+    Column("Paid Date", 65),
+    Column("Received By"),
+    Column("Source"),
+]
+
+
+@pdf_render_timer("booking_pdf")
+def render_booking_pdf(booking, fp):
+    """Draw the booking statement PDF into the file-like object `fp`."""
+    write_pdf(booking_statement(booking), fp)
+
+
+def booking_statement(booking):
+    """Yield the booking statement PDF in chunks."""
+    # No query when fetched with Booking.objects.for_statement()
+    prefetch_related_objects([booking], statement_payments())
+    buyer, plot = booking.buyer, booking.plot
+
+    # Statements are cached per booking version (see pdf_cache), so they
+    # show only what the version determines, not when they were drawn
+    paid_dates = [pay.paid_date for pay in booking.payments.all() if pay.paid_date]
+    last_paid = max(paid_dates).strftime("%b %d, %Y") if paid_dates else "-"
+    report = PDFReport(f"Booking {booking.id}")
+    report.title(
+        "Abrar Green City - Booking Report",
+        f"Statement version {booking.version} | Last payment: {last_paid}",
     )
-    y -= 40
 
     # -------- BOOKING SUMMARY --------
-    p.setFont("Helvetica-Bold", 13)
-    p.drawString(50, y, f"📄 Booking Summary (ID: {booking.id})")
-    y -= 20
-    p.setFont("Helvetica", 10)
-    p.drawString(60, y, f"Installment Months: {booking.installment_months}")
-    y -= 15
-    p.drawString(60, y, f"Monthly Installment: Rs {booking.monthly_installment}")
-    y -= 15
-    p.drawString(60, y, f"Down Payment: Rs {booking.down_payment_amount}")
-    y -= 15
-    p.drawString(60, y, f"Total Paid: Rs {booking.total_paid_amount}")
-    y -= 15
-    p.drawString(60, y, f"Source: {booking.source.name if booking.source else '-'}")
-    y -= 15
-    remaining = float(booking.plot.price or 0) - float(booking.total_paid_amount or 0)
-    p.drawString(60, y, f"Remaining Balance: Rs {remaining:.2f}")
-    y -= 25
+    report.heading(f"Booking Summary (ID: {booking.id})")
+    remaining = float(plot.price or 0) - float(booking.total_paid_amount or 0)
+    report.fields(
+        [
+            ("Installment Months", booking.installment_months),
+            ("Monthly Installment", money(booking.monthly_installment)),
+            ("Down Payment", money(booking.down_payment_amount)),
+            ("Total Paid", money(booking.total_paid_amount)),
+            ("Source", booking.source.name if booking.source else "-"),
+            ("Remaining Balance", f"Rs {remaining:.2f}"),
+        ]
+    )
+    report.space(10)
 
     # -------- BUYER INFO --------
-    p.setFont("Helvetica-Bold", 13)
-    p.drawString(50, y, "👤 Buyer Details")
-    y -= 20
-    p.setFont("Helvetica", 10)
-    p.drawString(60, y, f"Name: {booking.buyer.name}")
-    y -= 15
-    p.drawString(60, y, f"Father's Name: {booking.buyer.father_name}")
-    y -= 15
-    p.drawString(60, y, f"CNIC: {booking.buyer.cnic}")
-    y -= 15
-    p.drawString(60, y, f"Contact: {booking.buyer.contact_no}")
-    y -= 15
-    p.drawString(60, y, f"Address: {booking.buyer.address}")
-    y -= 15
-    p.drawString(60, y, f"Inheritor: {booking.buyer.inheritor}")
-    y -= 15
-    p.drawString(60, y, f"Inheritor CNIC: {booking.buyer.inheritor_cnic}")
-    y -= 15
-    p.drawString(60, y, f"Relation: {booking.buyer.inheritor_relation}")
-    y -= 25
+    report.heading("Buyer Details")
+    report.fields(
+        [
+            ("Name", buyer.name),
+            ("Father's Name", buyer.father_name),
+            ("CNIC", buyer.cnic),
+            ("Contact", buyer.contact_no),
+            ("Address", buyer.address),
+            ("Inheritor", buyer.inheritor),
+            ("Inheritor CNIC", buyer.inheritor_cnic),
+            ("Relation", buyer.inheritor_relation),
+        ]
+    )
+    report.space(10)
 
     # -------- PLOT INFO --------
-    p.setFont("Helvetica-Bold", 13)
-    p.drawString(50, y, "🏡 Plot Details")
-    y -= 20
-    p.setFont("Helvetica", 10)
-    p.drawString(60, y, f"Title: {booking.plot.title}")
-    y -= 15
-    p.drawString(60, y, f"Location: {booking.plot.location}")
-    y -= 15
-    p.drawString(60, y, f"Type: {booking.plot.plot_type.title()}")
-    y -= 15
-    p.drawString(60, y, f"Block: {booking.plot.block_name}")
-    y -= 15
-    p.drawString(60, y, f"Size: {booking.plot.size_sqft} sqft")
-    y -= 15
-    p.drawString(60, y, f"Facing Direction: {booking.plot.facing_direction}")
-    y -= 15
-    p.drawString(60, y, f"Corner Plot: {'Yes' if booking.plot.is_corner else 'No'}")
-    y -= 15
-    p.drawString(60, y, f"Price per Sqft: Rs {booking.plot.price_per_sqft}")
-    y -= 15
-    p.drawString(60, y, f"Total Price: Rs {booking.plot.price}")
-    y -= 25
+    report.heading("Plot Details")
+    report.fields(
+        [
+            ("Title", plot.title),
+            ("Location", plot.location),
+            ("Type", plot.plot_type.title()),
+            ("Block", plot.block_name),
+            ("Size", f"{plot.size_sqft} sqft"),
+            ("Facing Direction", plot.facing_direction),
+            ("Corner Plot", "Yes" if plot.is_corner else "No"),
+            ("Price per Sqft", money(plot.price_per_sqft)),
+            ("Total Price", money(plot.price)),
+        ]
+    )
+    report.space(10)
 
     # -------- PAYMENT SCHEDULE --------
-    p.setFont("Helvetica-Bold", 13)
-    p.drawString(50, y, "💳 Payment Schedule")
-    y -= 20
-
-    # Table Header
-    p.setFont("Helvetica-Bold", 10)
-    p.drawString(50, y, "Due Date")
-    p.drawString(120, y, "Amount")
-    p.drawString(190, y, "Status")
-    p.drawString(250, y, "Paid Date")
-    p.drawString(320, y, "Received By")
-    p.drawString(420, y, "Source")
-    y -= 15
-    p.line(50, y, 550, y)
-    y -= 10
-
-    # Table Rows
-    p.setFont("Helvetica", 9)
-    for pay in payments:
-        if y < 60:
-            p.showPage()
-            y = height - 60
-            p.setFont("Helvetica", 9)
-
-        status = "✅ PAID" if pay.is_paid else "⏳ Pending"
-        paid_date = pay.paid_date.strftime("%Y-%m-%d") if pay.paid_date else "-"
-        receiver = pay.get_received_by_display() if pay.received_by else "-"
-        source = pay.source.name if getattr(pay, "source", None) else "-"
-
-        p.drawString(50, y, str(pay.due_date))
-        p.drawString(120, y, f"Rs {pay.amount}")
-        p.drawString(190, y, status)
-        p.drawString(250, y, paid_date)
-        p.drawString(320, y, receiver[:15])
-        p.drawString(420, y, source[:20])
-        y -= 15
-
-    p.showPage()
-    p.save()
-    return response
+    report.heading("Payment Schedule")
+    rows = (
+        (
+            str(pay.due_date),
+            pay.amount,
+            "PAID" if pay.is_paid else "Pending",
+            pay.paid_date.strftime("%Y-%m-%d") if pay.paid_date else "-",
+            pay.get_received_by_display() if pay.received_by else "-",
+            pay.source.name if pay.source else "-",
+        )
+        for pay in booking.payments.all()
+    )
+    yield from report.table(PAYMENT_COLUMNS, rows, size=9)
+    yield report.finish()
+
+
+def booking_pdf_etag(request, pk):
+    # The statement only changes with the booking's version (see pdf_cache)
+    version = Booking.objects.filter(pk=pk).values_list("version", flat=True).first()
+    return None if version is None else f"booking-{pk}-v{version}"
+
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=booking_pdf_etag)
+def download_booking_pdf(request, pk):
+    booking = get_object_or_404(
+        Booking.objects.select_related("buyer", "plot", "source"), id=pk
+    )
+    fp = pdf_cache.cached_statement(booking, render_booking_pdf)
+    filename = f"Booking_{booking.id}.pdf"
+
+    if settings.BOOKING_PDF_X_ACCEL:
+        # Let nginx send the file from the shared media volume
+        fp.close()
+        response = HttpResponse(content_type="application/pdf")
+        response["X-Accel-Redirect"] = (
+            f"{settings.MEDIA_URL}{pdf_cache.STATEMENTS_DIR}/{pdf_cache.statement_name(booking)}"
+        )
+        response["Content-Disposition"] = f"attachment; filename={filename}"
+        return response
+    return FileResponse(
+        fp,
+        as_attachment=True,
+        filename=filename,
+        content_type="application/pdf",
+    )
 
 
 @staff_required
 @staff_required
 def create_booking_combined(request):
-    buyers = Buyer.objects.order_by("name")[:200]
-    plots = Plot.objects.filter(status="available").order_by("title")[:500]
+    # Buyers and plots are picked through the search APIs; only a choice
+    # carried over from a failed POST needs to be rendered
+    selected_buyer = selected_plot = None
     payment_sources = PaymentSource.objects.filter(is_active=True)
 
     buyer_form = BuyerForm(prefix="buyer")
@@ -233,7 +368,7 @@ def create_booking_combined(request):
             # ---------------- Buyer ----------------
             buyer_choice = request.POST.get("buyer_select")
             if buyer_choice and buyer_choice != "new":
-                buyer = get_object_or_404(Buyer, id=int(buyer_choice))
+                buyer = selected_buyer = get_object_or_404(Buyer, id=int(buyer_choice))
                 buyer_form = BuyerForm(request.POST, instance=buyer, prefix="buyer")
                 if buyer_form.is_valid():
                     buyer = buyer_form.save()
@@ -249,7 +384,7 @@ def create_booking_combined(request):
             # ---------------- Plot ----------------
             plot_choice = request.POST.get("plot_select")
             if plot_choice and plot_choice != "new":
-                plot = get_object_or_404(Plot, id=int(plot_choice))
+                plot = selected_plot = get_object_or_404(Plot, id=int(plot_choice))
                 plot_form = PlotForm(request.POST, instance=plot, prefix="plot")
                 if plot_form.is_valid():
                     plot = plot_form.save()
@@ -286,8 +421,8 @@ def create_booking_combined(request):
         "buyer_form": buyer_form,
         "plot_form": plot_form,
         "booking_form": booking_form,
-        "buyers": buyers,
-        "plots": plots,
+        "selected_buyer": selected_buyer,
+        "selected_plot": selected_plot,
         "payment_sources": payment_sources,
     }
     return render(request, "bookings/booking_create_combined.html", context)
@@ -333,3 +468,46 @@ def api_get_buyer(request, pk):
         "inheritor_relation": buyer.inheritor_relation,
     }
     return JsonResponse(data)
+
+
+def _search_window(request):
+    try:
+        offset = max(int(request.GET.get("offset", 0)), 0)
+        limit = int(request.GET.get("limit", SEARCH_DEFAULT_LIMIT))
+    except ValueError:
+        offset, limit = 0, SEARCH_DEFAULT_LIMIT
+    return offset, min(max(limit, 1), SEARCH_MAX_LIMIT)
+
+
+@require_GET
+@staff_required
+def api_search_buyers(request):
+    """Typeahead search over buyer name, CNIC and contact number.
+
+    ``?q=ali&limit=20&offset=0`` returns ``{"results": [...],
+    "next_offset": 20}``; ``next_offset`` is null on the last page.
+    """
+    query = request.GET.get("q", "").strip()
+    if not query:
+        return JsonResponse({"results": [], "next_offset": None})
+    offset, limit = _search_window(request)
+    results, next_offset = search_buyers(query, offset=offset, limit=limit)
+    return JsonResponse({"results": results, "next_offset": next_offset})
+
+
+@require_GET
+@staff_required
+def api_search_plots(request):
+    """Typeahead search over plot title and block. Only available plots
+    are returned unless ``status`` is given (``status=`` for any)."""
+    query = request.GET.get("q", "").strip()
+    if not query:
+        return JsonResponse({"results": [], "next_offset": None})
+    offset, limit = _search_window(request)
+    status = request.GET.get("status", "available")
+    results, next_offset = search_plots(
+        query, status=status, offset=offset, limit=limit
+    )
+    for row in results:
+        row["price"] = str(row["price"])
+    return JsonResponse({"results": results, "next_offset": next_offset})
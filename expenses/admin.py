@@ -1,8 +1,31 @@
+from django import forms
 from django.contrib import admin
+from reports.models import ClosedPeriod, PeriodClosed
+from .forms import ExpenseForm
 from .models import Expense
 
+
+class ExpenseAdminForm(forms.ModelForm):
+    class Meta:
+        model = Expense
+        fields = "__all__"
+
+    clean_date = ExpenseForm.clean_date
+
+
 @admin.register(Expense)
 class ExpenseAdmin(admin.ModelAdmin):
+    form = ExpenseAdminForm
     list_display = ("title", "category", "amount", "date", "created_at")
     list_filter = ("category", "date")
     search_fields = ("title", "description")
+
+    def has_delete_permission(self, request, obj=None):
+        # Expenses in closed months can't be deleted (also checked for
+        # each row of a bulk delete)
+        if obj is not None:
+            try:
+                ClosedPeriod.objects.check_open(obj.date)
+            except PeriodClosed:
+                return False
+        return super().has_delete_permission(request, obj)
@@ -1,6 +1,7 @@
 from django import forms
 from .models import Expense, ExpenseCategory
 from bookings.models import PaymentSource
+from reports.models import ClosedPeriod
 
 
 class ExpenseForm(forms.ModelForm):
@@ -29,6 +30,11 @@ class ExpenseForm(forms.ModelForm):
             ),
         }
 
+    def clean_date(self):
+        date = self.cleaned_data["date"]
+        ClosedPeriod.objects.check_open(date, self.instance.pk and self.initial.get("date"))
+        return date
+
 
 class ExpenseCategoryForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0012_hot_filter_indexes'),
+        ('expenses', '0004_expense_type'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['date', 'category', 'source'], name='expense_date_cat_source_idx'),
+        ),
+    ]
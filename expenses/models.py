@@ -1,7 +1,9 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
 from django.utils import timezone
 from decimal import Decimal
 from bookings.models import PaymentSource
+from jobs.models import OutboxEvent
 
 
 class ExpenseCategory(models.Model):
@@ -38,9 +40,22 @@ class Expense(models.Model):
     date = models.DateField(default=timezone.now)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["date", "category", "source"], name="expense_date_cat_source_idx"),
+        ]
+
     def __str__(self):
         return f"{self.title} - {self.amount}"
 
+    def save(self, *args, **kwargs):
+        # The ledger row is written by the post_save signal, or by
+        # process_outbox from an event written in the same transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if settings.OUTBOX_ENABLED:
+                OutboxEvent.objects.record("expense", self.pk)
+
     @property
     def signed_amount(self):
         """Return amount with sign according to `type`.
@@ -1,5 +1,4 @@
 from django.shortcuts import render, redirect
-from django.db.models import Sum
 from django.forms import modelformset_factory
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
@@ -11,10 +10,12 @@ from .models import Expense, ExpenseCategory
 from .forms import ExpenseForm, ExpenseCategoryForm
 
 from bookings.models import PaymentSource
+from installments.metrics import pdf_render_timer
+from reports.pdf_report import Column, PDFReport, money, write_pdf
+from reports.periods import expense_totals
 
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
 from datetime import datetime
+from decimal import Decimal
 
 
 @login_required
@@ -41,25 +42,21 @@ def expense_list(request):
         expenses = expenses.filter(source_id=source_id)
 
     # Use parse_date to safely parse incoming date strings and ignore invalid values
+    start_date = end_date = None
     if date_from and isinstance(date_from, str) and date_from.lower() != "none":
-        parsed = parse_date(date_from)
-        if parsed:
-            expenses = expenses.filter(date__gte=parsed)
+        start_date = parse_date(date_from)
+        if start_date:
+            expenses = expenses.filter(date__gte=start_date)
 
     if date_to and isinstance(date_to, str) and date_to.lower() != "none":
-        parsed = parse_date(date_to)
-        if parsed:
-            expenses = expenses.filter(date__lte=parsed)
+        end_date = parse_date(date_to)
+        if end_date:
+            expenses = expenses.filter(date__lte=end_date)
     # Compute totals by type: treat 'expense' and 'debit' as debits, 'credit' as credits
-    debit_total = (
-        expenses.filter(type__in=["expense", "debit"]).aggregate(total=Sum("amount"))[
-            "total"
-        ]
-        or 0
-    )
-    credit_total = (
-        expenses.filter(type="credit").aggregate(total=Sum("amount"))["total"] or 0
-    )
+    # (closed months are read from their stored totals)
+    totals = expense_totals(start_date, end_date, category_id=category_id, source_id=source_id)
+    debit_total = totals["expense"] + totals["debit"]
+    credit_total = totals["credit"]
     total_expense = debit_total - credit_total
 
     context = {
@@ -77,13 +74,33 @@ def expense_list(request):
 
 
 def download_expenses_pdf(request):
+    response = HttpResponse(content_type="application/pdf")
+    filename = render_expenses_pdf(request.GET, response)
+    response["Content-Disposition"] = f"attachment; filename={filename}"
+    return response
+
+
+EXPENSE_COLUMNS = [
+    Column("Date", 60),
+    Column("Title"),
+    Column("Category", 85),
+    Column("Type", 55),
+    Column("Source", 85),
+    Column("Amount", 85, align="right", format=money),
+]
+
+
+@pdf_render_timer("expenses_pdf")
+def render_expenses_pdf(params, fp):
+    """Draw the expense report for the GET-style `params` into `fp`.
+    Returns the suggested filename."""
     expenses = Expense.objects.select_related("category", "source").order_by("-date")
 
     # Apply filters safely
-    category_id = request.GET.get("category")
-    source_id = request.GET.get("source")
-    date_from = request.GET.get("date_from")
-    date_to = request.GET.get("date_to")
+    category_id = params.get("category")
+    source_id = params.get("source")
+    date_from = params.get("date_from")
+    date_to = params.get("date_to")
 
     # ✅ Filter: Category
     if category_id and category_id.isdigit():
@@ -103,26 +120,7 @@ def download_expenses_pdf(request):
         if parsed:
             expenses = expenses.filter(date__lte=parsed)
 
-    # ---------- PDF GENERATION ----------
-    response = HttpResponse(content_type="application/pdf")
-    response["Content-Disposition"] = "attachment; filename=Expenses_Report.pdf"
-
-    p = canvas.Canvas(response, pagesize=A4)
-    width, height = A4
-    y = height - 60
-
-    # Header
-    p.setFont("Helvetica-Bold", 16)
-    p.drawCentredString(width / 2, y, "💸 Expense Report")
-    y -= 25
-    p.setFont("Helvetica", 10)
-    p.drawCentredString(width / 2, y, "Abrar Green City — Generated Report")
-    y -= 30
-
     # Filters summary
-    p.setFont("Helvetica-Bold", 11)
-    p.drawString(50, y, "Filters Applied:")
-    p.setFont("Helvetica", 9)
     filters = []
 
     if category_id and category_id.isdigit():
@@ -137,57 +135,38 @@ def download_expenses_pdf(request):
     if date_to:
         filters.append(f"To: {date_to}")
 
-    p.drawString(140, y, ", ".join(filters) if filters else "None")
-    y -= 30
-
-    # Table Header
-    p.setFont("Helvetica-Bold", 10)
-    p.drawString(50, y, "Date")
-    p.drawString(110, y, "Title")
-    p.drawString(250, y, "Category")
-    p.drawString(320, y, "Type")
-    p.drawString(400, y, "Source")
-    p.drawString(470, y, "Amount")
-    y -= 15
-    p.line(50, y, 550, y)
-    y -= 10
-
-    # Table Rows
-    p.setFont("Helvetica", 9)
-    total_amount = 0
-
-    for exp in expenses:
-        if y < 60:
-            p.showPage()
-            y = height - 60
-            p.setFont("Helvetica", 9)
-
-        category_name = exp.category.name if exp.category else "—"
-        source_name = exp.source.name if getattr(exp, "source", None) else "—"
-        p.drawString(50, y, str(exp.date))
-        p.drawString(110, y, exp.title[:25])
-        p.drawString(250, y, category_name[:15])
-        p.drawString(320, y, exp.get_type_display()[:8])
-        p.drawString(400, y, source_name[:15])
-        # Show amount and adjust total based on type
-        display_amount = f"Rs {exp.amount}"
-        p.drawRightString(540, y, display_amount)
-        y -= 15
-        if exp.type in ("expense", "debit"):
-            total_amount += exp.amount or 0
-        else:
-            total_amount -= exp.amount or 0
-
-    # Total
-    y -= 15
-    p.line(50, y, 550, y)
-    y -= 20
-    p.setFont("Helvetica-Bold", 11)
-    p.drawRightString(540, y, f"Total: Rs {total_amount:.2f}")
-
-    p.showPage()
-    p.save()
-    return response
+    # ---------- PDF GENERATION ----------
+    total_amount = [Decimal("0")]
+
+    def rows():
+        for exp in expenses.iterator(chunk_size=2000):
+            # Expenses and debits add to the total, credits subtract
+            if exp.type in ("expense", "debit"):
+                total_amount[0] += exp.amount or 0
+            else:
+                total_amount[0] -= exp.amount or 0
+            yield (
+                str(exp.date),
+                exp.title,
+                exp.category.name if exp.category else "—",
+                exp.get_type_display(),
+                exp.source.name if exp.source else "—",
+                exp.amount,
+            )
+
+    report = PDFReport("Expense Report")
+    report.title("Expense Report", "Abrar Green City — Generated Report")
+    report.line(
+        f"Filters Applied: {', '.join(filters) if filters else 'None'}", size=9, indent=0, space=25
+    )
+    table = report.table(
+        EXPENSE_COLUMNS,
+        rows(),
+        size=9,
+        footer=lambda: ["Total", None, None, None, None, money(total_amount[0])],
+    )
+    write_pdf([*table, report.finish()], fp)
+    return "Expenses_Report.pdf"
 
 
 def manage_expenses(request):
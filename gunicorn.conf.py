@@ -0,0 +1,15 @@
+# Gunicorn settings for production (see Dockerfile.prod)
+import os
+
+from installments.metrics import mark_process_dead
+
+
+def on_starting(server):
+    # ✅ Per-process Prometheus metric files live here (see installments.metrics)
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    mark_process_dead(worker.pid)
@@ -0,0 +1,132 @@
+"""Endpoint cases shared by the `run_benchmarks` command and the query
+plan tests, and the `EXPLAIN` check both use.
+
+Each case is `(name, url name, url kwargs, query params)`; "{...}"
+placeholders are filled from `fixtures()`, so the cases work against any
+data set (see `generate_load_data`).
+"""
+
+from urllib.parse import urlencode
+
+from django.db import connection
+from django.db.models import Max
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import Buyer
+from bookings.models import Booking, Payment
+from expenses.models import Expense
+from plots.models import Plot
+from reports.models import Transaction
+
+MONTH = {"start_date": "{month_start}", "end_date": "{day}"}
+
+BENCHMARKS = [
+    ("home", "home", {}, {}),
+    ("plot_list", "plot_list", {}, {}),
+    (
+        "plot_list_filtered",
+        "plot_list",
+        {},
+        {"status": "available", "plot_type": "residential", "min_size": "1000", "max_price": "5000000"},
+    ),
+    ("bookings_page", "bookings_page", {}, {}),
+    ("booking_detail", "booking_detail", {"booking_id": "{booking}"}, {}),
+    ("booking_pdf", "download_booking_pdf", {"pk": "{booking}"}, {}),
+    ("buyer_search", "api_search_buyers", {}, {"q": "ali"}),
+    ("plot_search", "api_search_plots", {}, {"q": "A"}),
+    ("earnings_page", "earnings_page", {}, {}),
+    ("earnings_page_month", "earnings_page", {}, MONTH),
+    ("earnings_page_source", "earnings_page", {}, {**MONTH, "source": "{source}"}),
+    ("earnings_pdf_month", "download_earnings_pdf", {}, MONTH),
+    ("earnings_csv_month", "export_earnings_csv", {}, MONTH),
+    ("earnings_ledger_pdf_month", "export_earnings_pdf", {}, MONTH),
+    ("daily_report", "daily_report", {}, {"date": "{day}"}),
+    ("daily_report_pdf", "download_daily_report_pdf", {}, {"date": "{day}"}),
+    ("daily_reports_pdf_month", "download_daily_report_pdf", {}, MONTH),
+    ("daily_reports_zip_month", "download_daily_report_pdf", {}, {**MONTH, "format": "zip"}),
+    ("aging", "receivables_aging", {}, {}),
+    ("aging_by_block", "receivables_aging", {}, {"group_by": "block"}),
+    ("aging_block_filter", "receivables_aging", {}, {"block": "A"}),
+    ("aging_csv", "export_aging_csv", {}, {}),
+    ("aging_pdf", "download_aging_pdf", {}, {"group_by": "block"}),
+    ("forecast", "cash_flow_forecast", {}, {}),
+    ("expense_list", "expense_list", {}, {}),
+    ("expense_list_category", "expense_list", {}, {"category": "{category}", "date_from": "{month_start}"}),
+    ("expenses_pdf_month", "download_expenses_pdf", {}, {"date_from": "{month_start}", "date_to": "{day}"}),
+    ("manage_expenses", "manage_expenses", {}, {}),
+]
+
+# Tables that grow with the business; a sequential scan of one of these
+# in a request is a page that gets slower every month
+LARGE_TABLES = [Buyer, Plot, Booking, Payment, Expense, Transaction]
+
+
+def fixtures():
+    """Values for the placeholders in `BENCHMARKS`, picked from the data:
+    an open booking, a source and category in use, and the latest day with
+    transactions."""
+    today = timezone.now().date()
+    day = (
+        Transaction.objects.filter(date__lte=today).aggregate(day=Max("date"))["day"] or today
+    )
+    booking = (
+        Booking.objects.filter(is_completed=False).order_by("pk").values_list("pk", flat=True).first()
+        or Booking.objects.order_by("pk").values_list("pk", flat=True).first()
+    )
+    return {
+        "booking": booking,
+        "source": Transaction.objects.filter(source__isnull=False)
+        .values_list("source_id", flat=True)
+        .first(),
+        "category": Expense.objects.values_list("category_id", flat=True).first(),
+        "day": day.isoformat(),
+        "month_start": day.replace(day=1).isoformat(),
+    }
+
+
+def case_urls(cases, context):
+    """`(name, url)` for each case, placeholders filled from `context`."""
+    for name, url_name, kwargs, params in cases:
+        url = reverse(url_name, kwargs={key: str(value).format(**context) for key, value in kwargs.items()})
+        if params:
+            url += "?" + urlencode({key: value.format(**context) for key, value in params.items()})
+        yield name, url
+
+
+def fetch(client, url):
+    """GET `url`, reading a streamed body to the end. Returns the response,
+    its size in bytes and the SQL it ran."""
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+        if response.streaming:
+            size = sum(len(chunk) for chunk in response.streaming_content)
+        else:
+            size = len(response.content)
+    return response, size, [query["sql"] for query in queries.captured_queries]
+
+
+def _plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def sequential_scans(sql, tables=None):
+    """Large tables (`LARGE_TABLES` unless given) that the plan for `sql`
+    reads with a sequential scan. Statements other than queries are
+    skipped."""
+    if not sql.lstrip().upper().startswith(("SELECT", "WITH")):
+        return []
+    tables = {model._meta.db_table for model in (tables or LARGE_TABLES)}
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+        plan = cursor.fetchone()[0][0]["Plan"]
+    return sorted(
+        {
+            node["Relation Name"]
+            for node in _plan_nodes(plan)
+            if node["Node Type"] == "Seq Scan" and node["Relation Name"] in tables
+        }
+    )
@@ -0,0 +1,112 @@
+"""Prometheus metrics, served at /metrics.
+
+Gunicorn runs several worker processes, and the job workers run in
+others, so each process records into files under
+`PROMETHEUS_MULTIPROC_DIR` and /metrics adds them all up at scrape time
+(prometheus_client's multiprocess mode). Without that variable, as under
+runserver, the metrics simply live in the one process.
+"""
+
+import os
+
+from django.db.models import Count, Min
+from django.utils import timezone
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+REQUEST_LATENCY = Histogram(
+    "django_request_duration_seconds",
+    "Time to produce a response, by URL name",
+    ["view", "method"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+REQUEST_QUERIES = Histogram(
+    "django_request_db_queries",
+    "SQL queries run per request, by URL name",
+    ["view"],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+DB_QUERIES = Counter(
+    "django_db_queries",
+    "SQL queries run, by URL name",
+    ["view"],
+)
+PDF_RENDER_SECONDS = Histogram(
+    "pdf_render_duration_seconds",
+    "Time to render a PDF, by report kind",
+    ["kind"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+
+
+def pdf_render_timer(kind):
+    """Decorator (or context manager) recording a PDF render of `kind`."""
+    return PDF_RENDER_SECONDS.labels(kind=kind).time()
+
+
+class JobQueueCollector:
+    """Job queue depth, read from the jobs table at scrape time so every
+    process reports the same numbers."""
+
+    def collect(self):
+        from jobs.models import Job
+
+        counts = dict(
+            Job.objects.filter(status__in=["queued", "running"])
+            .values_list("status")
+            .annotate(Count("id"))
+            .order_by()
+        )
+        depth = GaugeMetricFamily(
+            "jobs_queue_depth", "Report jobs queued or running", labels=["status"]
+        )
+        for status in ["queued", "running"]:
+            depth.add_metric([status], counts.get(status, 0))
+        yield depth
+
+        oldest = Job.objects.filter(status="queued").aggregate(oldest=Min("created_at"))
+        age = (timezone.now() - oldest["oldest"]).total_seconds() if oldest["oldest"] else 0
+        yield GaugeMetricFamily(
+            "jobs_oldest_queued_age_seconds",
+            "How long the oldest queued job has been waiting",
+            value=age,
+        )
+
+
+def mark_process_dead(pid):
+    """Drop a finished process's live gauges (called by gunicorn and
+    run_workers when a child exits)."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(pid)
+
+
+def render_metrics():
+    """`(body, content_type)` of the Prometheus text exposition."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        process_registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(process_registry)
+    else:
+        process_registry = REGISTRY
+    queue_registry = CollectorRegistry()
+    queue_registry.register(JobQueueCollector())
+    body = generate_latest(process_registry) + generate_latest(queue_registry)
+    return body, CONTENT_TYPE_LATEST
+
+
+class RequestMetrics:
+    """`connection.execute_wrapper` hook counting a request's queries."""
+
+    def __init__(self):
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
@@ -0,0 +1,185 @@
+"""Request instrumentation.
+
+`RequestTimingMiddleware`: per-request SQL queries, DB time, template time
+and view time.
+
+Enable with `REQUEST_TIMING_ENABLED`; when it is off the middleware
+removes itself at startup, so it costs nothing. When on, a share
+`REQUEST_TIMING_SAMPLE_RATE` of requests is measured. Each measured
+request gets a `Server-Timing` header (shown in the browser's network
+panel) and one JSON line on the `installments.timing` logger.
+
+The same SQL run again with the same parameters is reported as a
+duplicate, and the same SQL run `REQUEST_TIMING_REPEAT_THRESHOLD` or more
+times with different parameters as repeated: the signature of a query
+issued once per row of a list (N+1). Either makes the log line a warning.
+
+`MetricsMiddleware`: latency and query counts per URL name for the
+Prometheus /metrics endpoint (see `installments.metrics`).
+"""
+
+import contextvars
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import Template as DjangoTemplate
+
+from .metrics import DB_QUERIES, REQUEST_LATENCY, REQUEST_QUERIES, RequestMetrics
+
+logger = logging.getLogger("installments.timing")
+
+# Timings of the request being measured in this thread/task, if any
+_current = contextvars.ContextVar("request_timings", default=None)
+
+# Longest SQL kept in the log line for a flagged query
+SQL_PREVIEW_LENGTH = 200
+
+
+class RequestTimings:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.statements = Counter()
+        self.executions = Counter()
+        self._rendering = False
+
+    def __call__(self, execute, sql, params, many, context):
+        """`connection.execute_wrapper` hook."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            self.statements[sql] += 1
+            self.executions[sql, repr(params)] += 1
+
+    def duplicates(self):
+        return {sql: count - 1 for (sql, _), count in self.executions.items() if count > 1}
+
+    def repeated(self, threshold):
+        return {sql: count for sql, count in self.statements.items() if count >= threshold}
+
+
+def _timed_render(render):
+    def wrapper(self, *args, **kwargs):
+        timings = _current.get()
+        # Only the outermost render: included templates are part of it
+        if timings is None or timings._rendering:
+            return render(self, *args, **kwargs)
+        timings._rendering = True
+        start = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            timings.template_time += time.perf_counter() - start
+            timings._rendering = False
+
+    wrapper.timed = True
+    return wrapper
+
+
+def _instrument_templates():
+    if not getattr(DjangoTemplate.render, "timed", False):
+        DjangoTemplate.render = _timed_render(DjangoTemplate.render)
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+class RequestTimingMiddleware:
+    def __init__(self, get_response):
+        if not settings.REQUEST_TIMING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.REQUEST_TIMING_SAMPLE_RATE
+        self.repeat_threshold = settings.REQUEST_TIMING_REPEAT_THRESHOLD
+        _instrument_templates()
+
+    def __call__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+                response = self.get_response(request)
+        finally:
+            total = time.perf_counter() - start
+            _current.reset(token)
+
+        view_time = max(total - timings.db_time - timings.template_time, 0)
+        response["Server-Timing"] = ", ".join(
+            [
+                f'db;dur={_ms(timings.db_time)};desc="{timings.queries} queries"',
+                f"tpl;dur={_ms(timings.template_time)}",
+                f"view;dur={_ms(view_time)}",
+                f"total;dur={_ms(total)}",
+            ]
+        )
+        self.log(request, response, timings, total, view_time)
+        return response
+
+    def log(self, request, response, timings, total, view_time):
+        duplicates = timings.duplicates()
+        repeated = timings.repeated(self.repeat_threshold)
+        match = getattr(request, "resolver_match", None)
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "queries": timings.queries,
+            "db_ms": _ms(timings.db_time),
+            "template_ms": _ms(timings.template_time),
+            "view_ms": _ms(view_time),
+            "total_ms": _ms(total),
+            "duplicate_queries": sum(duplicates.values()),
+        }
+        if repeated:
+            record["repeated_queries"] = [
+                {"sql": sql[:SQL_PREVIEW_LENGTH], "count": count}
+                for sql, count in sorted(repeated.items(), key=lambda item: -item[1])
+            ]
+        level = logging.WARNING if duplicates or repeated else logging.INFO
+        logger.log(level, json.dumps(record))
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = RequestMetrics()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        match = getattr(request, "resolver_match", None)
+        # Unnamed and unmatched URLs are lumped together so a scan of
+        # random paths can't create unbounded label values
+        view = (match.url_name or "unnamed") if match else "unmatched"
+        if view == "metrics":
+            return response
+        REQUEST_LATENCY.labels(view=view, method=request.method).observe(elapsed)
+        REQUEST_QUERIES.labels(view=view).observe(counter.queries)
+        DB_QUERIES.labels(view=view).inc(counter.queries)
+        return response
@@ -50,11 +50,13 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "accounts",
     "bookings",
     "plots",
     "expenses",
     "reports",
+    "jobs",
     "tailwind",
     "theme",
 ]
@@ -63,6 +65,9 @@ TAILWIND_APP_NAME = "theme"
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    # Outermost, so session/auth queries are counted too
+    "installments.middleware.RequestTimingMiddleware",
+    "installments.middleware.MetricsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -152,6 +157,56 @@ MEDIA_URL = "/media/"
 STATIC_ROOT = "/var/www/data/static"
 MEDIA_ROOT = "/var/www/data/media"
 
+# Cached booking statement PDFs (under MEDIA_ROOT/statements)
+BOOKING_PDF_CACHE_MAX_BYTES = int(
+    os.environ.get("BOOKING_PDF_CACHE_MAX_BYTES", 512 * 1024 * 1024)
+)
+# Hand cached PDFs and finished job results to nginx via X-Accel-Redirect
+# instead of streaming them
+BOOKING_PDF_X_ACCEL = os.environ.get("BOOKING_PDF_X_ACCEL", "0") == "1"
+
+# Background report jobs (manage.py run_workers)
+JOB_WORKER_PROCESSES = int(os.environ.get("JOB_WORKER_PROCESSES", 2))
+JOB_TIMEOUT_SECONDS = int(os.environ.get("JOB_TIMEOUT_SECONDS", 15 * 60))
+JOB_MAX_ATTEMPTS = 3
+
+# Leave the ledger, daily summary, booking counters and statement cache
+# to `manage.py process_outbox` instead of updating them while saving a
+# payment, booking or expense; they lag behind until it has run
+OUTBOX_ENABLED = os.environ.get("OUTBOX_ENABLED", "0") == "1"
+
+# Cash-flow forecast (reports/forecast.py): share of an unpaid installment
+# expected to be collected in a month, by its aging bucket in that month
+FORECAST_COLLECTION_RATES = {
+    "current": 0.80,
+    "days_1_30": 0.50,
+    "days_31_60": 0.35,
+    "days_61_90": 0.20,
+    "days_over_90": 0.05,
+}
+FORECAST_MONTHS = 12
+
+# Per-request query/DB/template timings (installments/middleware.py):
+# Server-Timing header plus a JSON line on the installments.timing logger
+REQUEST_TIMING_ENABLED = os.environ.get("REQUEST_TIMING_ENABLED", "0") == "1"
+REQUEST_TIMING_SAMPLE_RATE = float(os.environ.get("REQUEST_TIMING_SAMPLE_RATE", 1.0))
+# Same SQL this many times in one request is flagged as an N+1
+REQUEST_TIMING_REPEAT_THRESHOLD = 5
+
+# Prometheus metrics at /metrics (installments/metrics.py), off unless
+# enabled. Set PROMETHEUS_MULTIPROC_DIR to a directory shared by all
+# worker processes so the endpoint reports every process, not just the
+# one it hits.
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "0") == "1"
+# A scrape must send "Authorization: Bearer <METRICS_TOKEN>" or come from
+# one of METRICS_ALLOWED_IPS (comma-separated addresses or networks, e.g.
+# "127.0.0.1,10.0.0.0/8"). Behind nginx the address seen is the proxy's,
+# so prefer the token there.
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+METRICS_ALLOWED_IPS = [
+    ip.strip() for ip in os.environ.get("METRICS_ALLOWED_IPS", "").split(",") if ip.strip()
+]
+
 if DEBUG:
     STATICFILES_DIRS = [BASE_DIR / "static"]  # only during development
 else:
@@ -186,12 +241,21 @@ if not DEBUG:
         "version": 1,
         "disable_existing_loggers": False,
         "root": {"level": "INFO", "handlers": ["console"]},
-        "handlers": {"console": {"class": "logging.StreamHandler"}},
+        "formatters": {"message": {"format": "%(message)s"}},
+        "handlers": {
+            "console": {"class": "logging.StreamHandler"},
+            "json": {"class": "logging.StreamHandler", "formatter": "message"},
+        },
         "loggers": {
             "django.request": {
                 "handlers": ["console"],
                 "level": "ERROR",
                 "propagate": False,
-            }
+            },
+            "installments.timing": {
+                "handlers": ["json"],
+                "level": "INFO",
+                "propagate": False,
+            },
         },
     }
@@ -0,0 +1,161 @@
+import json
+from io import StringIO
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from jobs.models import Job
+
+from accounts.models import Buyer, User
+from bookings.models import PaymentSource
+from bookings.search import search_buyers
+from .benchmarks import BENCHMARKS, case_urls, fetch, fixtures, sequential_scans
+from .metrics import REQUEST_LATENCY
+from .middleware import RequestTimingMiddleware
+
+
+@override_settings(
+    REQUEST_TIMING_ENABLED=True,
+    REQUEST_TIMING_SAMPLE_RATE=1.0,
+    REQUEST_TIMING_REPEAT_THRESHOLD=3,
+)
+class RequestTimingMiddlewareTests(TestCase):
+    def setUp(self):
+        self.sources = [PaymentSource.objects.create(name=f"Source {n}") for n in range(4)]
+
+    def run_view(self, view):
+        middleware = RequestTimingMiddleware(lambda request: view())
+        return middleware(RequestFactory().get("/"))
+
+    def test_reports_timings(self):
+        def view():
+            list(PaymentSource.objects.all())
+            return HttpResponse()
+
+        with self.assertLogs("installments.timing", "INFO") as logs:
+            response = self.run_view(view)
+        self.assertIn('desc="1 queries"', response["Server-Timing"])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["queries"], 1)
+        self.assertEqual(record["duplicate_queries"], 0)
+        self.assertEqual(logs.records[0].levelname, "INFO")
+
+    def test_flags_repeated_and_duplicate_queries(self):
+        def view():
+            for source in self.sources:
+                PaymentSource.objects.get(pk=source.pk)
+            PaymentSource.objects.get(pk=self.sources[0].pk)
+            return HttpResponse()
+
+        with self.assertLogs("installments.timing", "WARNING") as logs:
+            self.run_view(view)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["queries"], 5)
+        self.assertEqual(record["duplicate_queries"], 1)
+        self.assertEqual(record["repeated_queries"][0]["count"], 5)
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_are_untouched(self):
+        response = self.run_view(HttpResponse)
+        self.assertNotIn("Server-Timing", response)
+
+    @override_settings(REQUEST_TIMING_ENABLED=False)
+    def test_disabled_by_default(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            RequestTimingMiddleware(HttpResponse)
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_TOKEN="s3cret", METRICS_ALLOWED_IPS=[])
+class MetricsTests(TestCase):
+    def scrape(self):
+        response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_requires_the_token_or_an_allowed_address(self):
+        url = reverse("metrics")
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+        with override_settings(METRICS_ALLOWED_IPS=["10.0.0.0/8"]):
+            self.assertEqual(self.client.get(url, REMOTE_ADDR="10.1.2.3").status_code, 200)
+            self.assertEqual(self.client.get(url, REMOTE_ADDR="203.0.113.9").status_code, 403)
+        # A forwarded address is not trusted
+        with override_settings(METRICS_ALLOWED_IPS=["127.0.0.1"]):
+            response = self.client.get(
+                url, REMOTE_ADDR="203.0.113.9", HTTP_X_FORWARDED_FOR="127.0.0.1"
+            )
+            self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled_by_default(self):
+        response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.status_code, 404)
+
+    def test_request_latency_by_url_name(self):
+        before = REQUEST_LATENCY.labels(view="contact", method="GET")._sum.get()
+        self.client.get(reverse("contact"))
+        self.assertGreater(REQUEST_LATENCY.labels(view="contact", method="GET")._sum.get(), before)
+        body = self.scrape()
+        self.assertIn('django_request_duration_seconds_count{method="GET",view="contact"}', body)
+        self.assertIn('django_db_queries_total{view="contact"}', body)
+
+    def test_pdf_render_duration(self):
+        self.client.get(reverse("download_expenses_pdf"))
+        self.assertIn('pdf_render_duration_seconds_count{kind="expenses_pdf"}', self.scrape())
+
+    def test_job_queue_depth(self):
+        Job.objects.create(kind="aging_pdf", params={})
+        Job.objects.create(kind="aging_pdf", params={}, status="running")
+        body = self.scrape()
+        self.assertIn('jobs_queue_depth{status="queued"} 1.0', body)
+        self.assertIn('jobs_queue_depth{status="running"} 1.0', body)
+        self.assertNotIn('view="metrics"', body)
+
+
+class QueryPlanTests(TestCase):
+    """Every query the benchmarked pages run must be able to use an index
+    on the large tables. With sequential scans disabled the planner picks
+    an index whenever one fits, so a sequential scan left in a plan means
+    no index serves that query: add one, or change the query."""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            "generate_load_data",
+            buyers=40,
+            bookings=50,
+            payments=600,
+            expenses=60,
+            transactions=1500,
+            stdout=StringIO(),
+        )
+        cls.user = User.objects.create(username="planner", is_staff=True, is_superuser=True)
+
+    def test_no_sequential_scans_on_large_tables(self):
+        self.client.force_login(self.user)
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+        for name, url in case_urls(BENCHMARKS, fixtures()):
+            with self.subTest(name):
+                response, _, queries = fetch(self.client, url)
+                self.assertEqual(response.status_code, 200)
+                for sql in queries:
+                    self.assertEqual(sequential_scans(sql), [], sql)
+
+
+    def test_cnic_and_phone_prefix_search_uses_the_trigram_indexes(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+        # Digits typed without dashes, a formatted CNIC, short and long phone prefixes
+        for query in ["3520212345", "35202-1234567-1", "03", "0300123"]:
+            with self.subTest(query), CaptureQueriesContext(connection) as queries:
+                search_buyers(query)
+                for sql in [captured["sql"] for captured in queries.captured_queries]:
+                    self.assertEqual(sequential_scans(sql, [Buyer]), [], sql)
@@ -24,10 +24,12 @@ from django.contrib.auth.views import LoginView, LogoutView
 urlpatterns = [
     path("", views.home, name="home"),
     path("contact/", views.contact, name="contact"),
+    path("metrics", views.metrics, name="metrics"),
     path("admin/", admin.site.urls),
     path("plots/", include("plots.urls")),
     path("bookings/", include("bookings.urls")),
     path("expenses/", include("expenses.urls")),
+    path("jobs/", include("jobs.urls")),
     path("", include("reports.urls")),
     path(
         "login/",
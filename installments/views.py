@@ -1,7 +1,14 @@
+from hmac import compare_digest
+from ipaddress import ip_address, ip_network
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden
 from django.shortcuts import render
 from plots.models import Plot
 from django.contrib.auth.decorators import login_required
 
+from .metrics import render_metrics
+
 
 @login_required
 def home(request):
@@ -24,3 +31,30 @@ def home(request):
 
 def contact(request):
     return render(request, "contact.html")
+
+
+def _metrics_allowed(request):
+    """A bearer token matching METRICS_TOKEN, or a client address inside
+    METRICS_ALLOWED_IPS."""
+    token = settings.METRICS_TOKEN
+    scheme, _, credentials = request.META.get("HTTP_AUTHORIZATION", "").partition(" ")
+    if token and scheme.lower() == "bearer" and compare_digest(credentials.strip(), token):
+        return True
+    try:
+        address = ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        return False
+    return any(
+        address in ip_network(allowed, strict=False) for allowed in settings.METRICS_ALLOWED_IPS
+    )
+
+
+def metrics(request):
+    # Scraped by Prometheus, so no login: the scraper authenticates with
+    # the token or its address instead
+    if not settings.METRICS_ENABLED:
+        raise Http404("Metrics are disabled")
+    if not _metrics_allowed(request):
+        return HttpResponseForbidden()
+    body, content_type = render_metrics()
+    return HttpResponse(body, content_type=content_type)
@@ -0,0 +1,15 @@
+from django.contrib import admin
+from .models import Job, OutboxEvent
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "status", "requested_by", "attempts", "created_at", "finished_at")
+    list_filter = ("kind", "status")
+    readonly_fields = ("started_at", "finished_at", "created_at")
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "object_id", "booking_id", "created_at")
+    list_filter = ("kind",)
@@ -0,0 +1,27 @@
+from django.utils.module_loading import import_string
+
+# Job kind -> renderer taking `(params, fp)` and returning the file name.
+# Dotted paths keep this module importable before the report apps load.
+HANDLERS = {
+    "booking_pdf": "jobs.handlers.render_booking_statement",
+    "earnings_pdf": "reports.views.render_earnings_pdf",
+    "daily_report_pdf": "reports.views.render_daily_report_pdf",
+    "expenses_pdf": "expenses.views.render_expenses_pdf",
+    "aging_pdf": "reports.views.render_aging_pdf",
+}
+
+
+def get_handler(kind):
+    try:
+        return import_string(HANDLERS[kind])
+    except KeyError:
+        raise ValueError(f"Unknown job kind: {kind!r}")
+
+
+def render_booking_statement(params, fp):
+    from bookings.models import Booking
+    from bookings.views import render_booking_pdf
+
+    booking = Booking.objects.for_statement().get(pk=params["booking_id"])
+    render_booking_pdf(booking, fp)
+    return f"Booking_{booking.pk}.pdf"
@@ -0,0 +1,51 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+
+from jobs.models import OutboxEvent
+from jobs.outbox import process
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply the ledger, daily summary, booking counter and statement cache updates "
+        "queued while OUTBOX_ENABLED is set, in batches"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Events applied per transaction.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait before checking for new events when none are left.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once no events are left instead of waiting for new ones.",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+
+        stopping = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+        signal.signal(signal.SIGINT, lambda *_: stopping.set())
+        applied = process(
+            batch_size=options["batch_size"],
+            poll_interval=options["poll_interval"],
+            once=options["once"],
+            should_stop=stopping.is_set,
+        )
+        self.stdout.write(self.style.SUCCESS(f"✅ Applied {applied} outbox event(s)."))
+        pending = OutboxEvent.objects.count()
+        if pending:
+            self.stdout.write(f"{pending} event(s) still queued.")
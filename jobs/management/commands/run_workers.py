@@ -0,0 +1,93 @@
+import multiprocessing
+import signal
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from installments.metrics import mark_process_dead
+from jobs.worker import requeue_stale, work
+
+
+def _worker_main(poll_interval, once):
+    # Each process opens its own database connection on first use
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    signal.signal(signal.SIGINT, lambda *_: stopping.set())
+    try:
+        work(poll_interval=poll_interval, once=once, should_stop=stopping.is_set)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Run background report jobs (PDF rendering) with a pool of worker processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=settings.JOB_WORKER_PROCESSES,
+            help="Number of worker processes (default: JOB_WORKER_PROCESSES).",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=2.0,
+            help="Seconds an idle worker waits before checking the queue again.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is empty instead of waiting for new jobs.",
+        )
+
+    def handle(self, *args, **options):
+        timeout = timedelta(seconds=settings.JOB_TIMEOUT_SECONDS)
+        requeued = requeue_stale(timeout)
+        if requeued:
+            self.stdout.write(f"♻️ Requeued {requeued} interrupted job(s)")
+
+        # Forked children must not share the parent's database socket
+        connections.close_all()
+        ctx = multiprocessing.get_context("fork")
+        args = (options["poll_interval"], options["once"])
+        workers = [self._start(ctx, args) for _ in range(options["processes"])]
+        self.stdout.write(
+            self.style.SUCCESS(f"✅ Started {len(workers)} worker process(es)")
+        )
+
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+        signal.signal(signal.SIGINT, lambda *_: stopping.append(True))
+        last_sweep = time.monotonic()
+        while not stopping and any(w.is_alive() for w in workers):
+            time.sleep(1)
+            if options["once"]:
+                continue
+            # Replace workers that crashed, and rescue their jobs
+            for i, worker in enumerate(workers):
+                if not worker.is_alive():
+                    self.stderr.write(f"⚠️ Worker {worker.pid} exited, restarting")
+                    mark_process_dead(worker.pid)
+                    workers[i] = self._start(ctx, args)
+            if time.monotonic() - last_sweep > timeout.total_seconds():
+                requeue_stale(timeout)
+                connections.close_all()
+                last_sweep = time.monotonic()
+
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()  # workers finish their current job first
+        for worker in workers:
+            worker.join()
+            mark_process_dead(worker.pid)
+        self.stdout.write(self.style.SUCCESS("✅ Workers stopped"))
+
+    def _start(self, ctx, args):
+        worker = ctx.Process(target=_worker_main, args=args, daemon=False)
+        worker.start()
+        return worker
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='job',
+            name='kind',
+            field=models.CharField(choices=[('booking_pdf', 'Booking statement PDF'), ('earnings_pdf', 'Earnings report PDF'), ('daily_report_pdf', 'Daily report PDF'), ('expenses_pdf', 'Expenses report PDF'), ('aging_pdf', 'Receivables aging PDF')], max_length=30),
+        ),
+    ]
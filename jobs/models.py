@@ -0,0 +1,112 @@
+import os
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+JOBS_DIR = "jobs"
+
+
+class Job(models.Model):
+    """A report to be rendered by `manage.py run_workers`.
+
+    `params` holds the same GET parameters the matching download view
+    accepts, so a queued job renders exactly what the page would have.
+    """
+
+    KIND_CHOICES = [
+        ("booking_pdf", "Booking statement PDF"),
+        ("earnings_pdf", "Earnings report PDF"),
+        ("daily_report_pdf", "Daily report PDF"),
+        ("expenses_pdf", "Expenses report PDF"),
+        ("aging_pdf", "Receivables aging PDF"),
+    ]
+    STATUS_CHOICES = [
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="queued")
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="jobs",
+    )
+    result = models.FileField(upload_to=JOBS_DIR, blank=True)
+    filename = models.CharField(max_length=200, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["status", "created_at"])]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in ("done", "failed")
+
+    def result_path(self):
+        """Absolute path the worker writes this job's file to."""
+        return os.path.join(settings.MEDIA_ROOT, JOBS_DIR, str(self.pk), self.filename)
+
+    def mark_failed(self, error):
+        self.status = "failed"
+        self.error = error
+        self.finished_at = timezone.now()
+        self.save(update_fields=["status", "error", "finished_at"])
+
+
+class OutboxEventQuerySet(models.QuerySet):
+    def record(self, kind, object_id, booking_id=None):
+        return self.create(kind=kind, object_id=object_id, booking_id=booking_id)
+
+    def record_bookings(self, bookings):
+        """One `booking` event per booking in the `bookings` queryset."""
+        return self.bulk_create(
+            self.model(kind="booking", object_id=pk, booking_id=pk)
+            for pk in bookings.values_list("pk", flat=True)
+        )
+
+
+class OutboxEvent(models.Model):
+    """A payment, booking or expense changed while `OUTBOX_ENABLED` is set.
+
+    Written in the same database transaction as the change, instead of
+    the work the signals would have done: the ledger rows, the daily
+    summary, the booking's counters and its statement cache version.
+    `manage.py process_outbox` applies that work in batches and deletes
+    the events. Ids are plain integers because the row may be gone by
+    then.
+    """
+
+    KIND_CHOICES = [
+        ("payment", "Payment"),
+        ("booking", "Booking"),
+        ("expense", "Expense"),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    # Booking whose counters and statement change with the object
+    booking_id = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = OutboxEventQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["id"]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.object_id} (event {self.pk})"
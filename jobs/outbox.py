@@ -0,0 +1,112 @@
+"""Consumer for `OutboxEvent`s (`manage.py process_outbox`).
+
+An event only says which payment, booking or expense changed; the work is
+derived from the rows as they are when the event is applied, so applying
+an event twice, or several events for the same row at once, leaves the
+same result. Each batch is claimed, applied and deleted in one
+transaction: a failed batch is rolled back and retried whole.
+
+Only one consumer runs at a time (a Postgres advisory lock; others wait
+as standbys), and it takes events in id order, so the changes to a
+booking are applied in the order they were made.
+"""
+
+import logging
+import time
+
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+
+from bookings.models import Booking, Payment
+from bookings.schedule import build_schedule
+from reports.ledger import sync_ledger
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+# pg_advisory_lock key held by the running consumer
+OUTBOX_LOCK_ID = 7_302_224_312
+
+CLAIM_SQL = f"""
+    DELETE FROM {OutboxEvent._meta.db_table}
+    WHERE id IN (
+        SELECT id FROM {OutboxEvent._meta.db_table} ORDER BY id LIMIT %s FOR UPDATE
+    )
+    RETURNING kind, object_id, booking_id
+"""
+
+
+def _generate_schedules(booking_ids):
+    """Write the installment schedule of new bookings, in one insert."""
+    bookings = (
+        Booking.objects.filter(pk__in=booking_ids)
+        .exclude(Exists(Payment.objects.filter(booking=OuterRef("pk"))))
+        .select_related("plot")
+    )
+    Payment.objects.bulk_create(
+        [
+            payment
+            for booking in bookings
+            for payment in build_schedule(
+                booking,
+                booking.plot.price - booking.down_payment_amount,
+                booking.installment_months,
+            )
+        ],
+        batch_size=500,
+    )
+
+
+def apply_batch(batch_size=500):
+    """Claim up to `batch_size` of the oldest events and apply them:
+    schedules of new bookings, then the ledger rows (and daily summary),
+    then the booking counters, completion flag and statement version.
+    Returns the number of events applied."""
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(CLAIM_SQL, [batch_size])
+            events = cursor.fetchall()
+        if not events:
+            return 0
+
+        changed = {"payment": set(), "booking": set(), "expense": set()}
+        booking_ids = set()
+        for kind, object_id, booking_id in events:
+            changed[kind].add(object_id)
+            if booking_id:
+                booking_ids.add(booking_id)
+
+        _generate_schedules(changed["booking"])
+        repaired, skipped = sync_ledger(
+            payments=changed["payment"],
+            bookings=changed["booking"],
+            expenses=changed["expense"],
+        )
+        if skipped:
+            logger.warning("Left %s ledger change(s) in closed months", skipped)
+        Booking.objects.filter(pk__in=booking_ids).refresh_ledger(
+            is_completed=~Exists(Payment.objects.filter(booking=OuterRef("pk"), is_paid=False))
+        )
+    logger.info("Applied %s outbox event(s), %s ledger row(s)", len(events), sum(repaired.values()))
+    return len(events)
+
+
+def process(batch_size=500, poll_interval=1.0, once=False, should_stop=lambda: False):
+    """Apply batches until `should_stop()` is true (or no events are left
+    when `once` is set). Returns the number of events applied."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(%s)", [OUTBOX_LOCK_ID])
+    applied = 0
+    try:
+        while not should_stop():
+            count = apply_batch(batch_size)
+            applied += count
+            if count:
+                continue
+            if once:
+                break
+            time.sleep(poll_interval)
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", [OUTBOX_LOCK_ID])
+    return applied
@@ -0,0 +1,307 @@
+import os
+import tempfile
+import threading
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+
+from bookings.models import Booking
+from bookings.services import post_payment, post_payments
+from bookings.tests import make_booking
+from expenses.models import Expense, ExpenseCategory
+from reports.ledger import find_ledger_drift
+from reports.models import PeriodTotal, Transaction
+from reports.periods import close_through
+from reports.summary import find_drift
+from .models import Job, OutboxEvent
+from .outbox import apply_batch
+from .views import FAILED_MESSAGE
+from .worker import _job_lock, claim_job, requeue_stale, run_job
+
+
+@override_settings(OUTBOX_ENABLED=True)
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.category = ExpenseCategory.objects.create(name="Fuel")
+
+    def process(self):
+        call_command("process_outbox", "--once", "--batch-size", "2", stdout=StringIO())
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def assertDerivedDataCurrent(self, booking):
+        self.assertEqual(find_ledger_drift(), ({}, []))
+        self.assertEqual(find_drift(), [])
+        booking = Booking.objects.with_ledger().get(pk=booking.pk)
+        for field in Booking.LEDGER_FIELDS:
+            self.assertEqual(getattr(booking, field), getattr(booking, f"ledger_{field}"), field)
+        return booking
+
+    def test_side_effects_wait_for_the_consumer(self):
+        booking = make_booking(months=3, down_payment="10000.00")
+        self.assertFalse(booking.payments.exists())
+        self.assertFalse(Transaction.objects.exists())
+
+        self.process()
+        payments = list(booking.payments.order_by("due_date"))
+        self.assertEqual(len(payments), 3)
+        self.assertDerivedDataCurrent(booking)
+
+        post_payment(payments[0].pk, paid_date="2025-01-10")
+        post_payments([{"payment_id": payment.pk} for payment in payments[1:]])
+        Expense.objects.create(
+            title="Diesel", category=self.category, amount=Decimal("700.00"), date=date(2025, 1, 20)
+        )
+        booking.buyer.name = "Renamed"
+        booking.buyer.save()
+        self.assertEqual(Transaction.objects.count(), 1)
+        version = Booking.objects.get(pk=booking.pk).version
+
+        self.process()
+        booking = self.assertDerivedDataCurrent(booking)
+        self.assertEqual(Transaction.objects.count(), 5)
+        self.assertEqual(booking.paid_count, 3)
+        self.assertTrue(booking.is_completed)
+        self.assertGreater(booking.version, version)
+        self.assertTrue(
+            Transaction.objects.get(related_payment=payments[0]).description.endswith("Renamed")
+        )
+
+    def test_applying_events_again_changes_nothing(self):
+        booking = make_booking(months=3)
+        self.process()
+        payment, later, _ = booking.payments.order_by("due_date")
+        post_payment(payment.pk, paid_date="2025-01-10")
+        post_payment(later.pk, paid_date="2025-01-11")
+        self.process()
+        ledger = list(Transaction.objects.values_list("pk", "date", "amount", "related_payment"))
+
+        OutboxEvent.objects.record("payment", payment.pk, booking.pk)
+        OutboxEvent.objects.record_bookings(Booking.objects.filter(pk=booking.pk))
+        self.assertEqual(apply_batch(), 2)
+        self.assertEqual(
+            list(Transaction.objects.values_list("pk", "date", "amount", "related_payment")),
+            ledger,
+        )
+        self.assertDerivedDataCurrent(booking)
+
+    def test_closing_applies_queued_events_first(self):
+        Expense.objects.create(
+            title="Diesel", category=self.category, amount=Decimal("700.00"), date=date(2025, 1, 20)
+        )
+        close_through(date(2025, 1, 31))
+        self.assertFalse(OutboxEvent.objects.exists())
+        self.assertEqual(PeriodTotal.objects.get(type="debit").total, Decimal("700.00"))
+
+
+class JobMediaMixin:
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+
+
+class JobWorkerTests(JobMediaMixin, TestCase):
+    def test_run_renders_the_report(self):
+        job = Job.objects.create(kind="aging_pdf")
+        claimed = claim_job()
+        self.assertEqual((claimed.pk, claimed.status, claimed.attempts), (job.pk, "running", 1))
+        self.assertTrue(run_job(claimed))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, "done")
+        with open(job.result_path(), "rb") as fp:
+            self.assertTrue(fp.read().startswith(b"%PDF"))
+        self.assertIsNone(claim_job())
+
+    def test_failed_run_records_error_and_attempts(self):
+        job = Job.objects.create(kind="booking_pdf", params={"booking_id": 0})
+        with self.assertLogs("jobs.worker", "ERROR"):
+            self.assertFalse(run_job(claim_job()))
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("failed", 1))
+        self.assertIn("DoesNotExist", job.error)
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(os.listdir(os.path.join(settings.MEDIA_ROOT, "jobs", str(job.pk))), [])
+
+    def test_requeue_abandoned_jobs_until_attempts_run_out(self):
+        timeout = timedelta(seconds=settings.JOB_TIMEOUT_SECONDS)
+        long_ago = timezone.now() - timeout * 2
+        retry = Job.objects.create(
+            kind="aging_pdf", status="running", attempts=1, started_at=long_ago
+        )
+        give_up = Job.objects.create(
+            kind="aging_pdf",
+            status="running",
+            attempts=settings.JOB_MAX_ATTEMPTS,
+            started_at=long_ago,
+        )
+        recent = Job.objects.create(kind="aging_pdf", status="running", started_at=timezone.now())
+
+        self.assertEqual(requeue_stale(timeout), 2)
+        retry.refresh_from_db()
+        give_up.refresh_from_db()
+        recent.refresh_from_db()
+        self.assertEqual((retry.status, retry.started_at), ("queued", None))
+        self.assertEqual(give_up.status, "failed")
+        self.assertEqual(give_up.error, "Worker stopped before the job finished.")
+        self.assertEqual(recent.status, "running")
+
+        self.assertEqual(claim_job().pk, retry.pk)
+        retry.refresh_from_db()
+        self.assertEqual(retry.attempts, 2)
+        _job_lock("pg_advisory_unlock", retry.pk)
+
+    def test_live_worker_keeps_its_job(self):
+        timeout = timedelta(seconds=settings.JOB_TIMEOUT_SECONDS)
+        job = Job.objects.create(
+            kind="aging_pdf", status="running", attempts=1, started_at=timezone.now() - timeout * 2
+        )
+        locked, done = threading.Event(), threading.Event()
+
+        def worker():
+            # A worker still rendering past the timeout, in its own session
+            try:
+                _job_lock("pg_advisory_lock", job.pk)
+                locked.set()
+                done.wait()
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        locked.wait()
+        try:
+            self.assertEqual(requeue_stale(timeout), 0)
+        finally:
+            done.set()
+            thread.join()
+        self.assertEqual(requeue_stale(timeout), 1)
+
+
+class JobClaimTests(JobMediaMixin, TransactionTestCase):
+    def test_concurrent_claims_get_different_jobs(self):
+        first = Job.objects.create(kind="aging_pdf")
+        second = Job.objects.create(kind="aging_pdf")
+        claimed, mid_claim, finish = [], threading.Event(), threading.Event()
+
+        def slow_claimer():
+            # Holds the first job's row lock until told to commit
+            try:
+                with transaction.atomic():
+                    claimed.append(claim_job())
+                    mid_claim.set()
+                    finish.wait()
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=slow_claimer)
+        thread.start()
+        mid_claim.wait()
+        try:
+            other = claim_job()
+        finally:
+            finish.set()
+            thread.join()
+        _job_lock("pg_advisory_unlock", other.pk)
+
+        self.assertEqual((claimed[0].pk, other.pk), (first.pk, second.pk))
+        self.assertEqual(Job.objects.filter(status="running").count(), 2)
+        self.assertIsNone(claim_job())
+
+    def test_run_workers_once(self):
+        jobs = [Job.objects.create(kind="aging_pdf") for _ in range(2)]
+        out = StringIO()
+        call_command("run_workers", "--once", "--processes", "2", stdout=out)
+        self.assertIn("Workers stopped", out.getvalue())
+        for job in jobs:
+            job.refresh_from_db()
+            self.assertEqual(job.status, "done")
+
+
+class JobViewTests(JobMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.clerk = User.objects.create(username="clerk")
+        self.staff = User.objects.create(username="admin", is_staff=True)
+        self.job = Job.objects.create(
+            kind="aging_pdf",
+            requested_by=self.clerk,
+            status="failed",
+            error="Traceback (most recent call last): ...",
+        )
+
+    def test_enqueue_reuses_a_pending_job(self):
+        self.client.force_login(self.clerk)
+        url = reverse("enqueue_job", args=["earnings_pdf"]) + "?start_date=2025-01-01"
+        first = self.client.post(url, HTTP_ACCEPT="application/json").json()
+        second = self.client.post(url, HTTP_ACCEPT="application/json").json()
+        self.assertEqual(first["id"], second["id"])
+        self.assertEqual(Job.objects.get(pk=first["id"]).params, {"start_date": "2025-01-01"})
+        self.assertEqual(self.client.post(reverse("enqueue_job", args=["nope"])).status_code, 404)
+
+    def test_tracebacks_are_shown_to_staff_only(self):
+        status_url = reverse("job_status_json", args=[self.job.pk])
+        detail_url = reverse("job_detail", args=[self.job.pk])
+
+        self.client.force_login(self.clerk)
+        self.assertEqual(self.client.get(status_url).json()["error"], FAILED_MESSAGE)
+        self.assertNotContains(self.client.get(detail_url), "Traceback")
+
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(status_url).json()["error"], self.job.error)
+        self.assertContains(self.client.get(detail_url), "Traceback")
+
+    def test_results_are_handed_to_nginx(self):
+        self.job.status = "done"
+        self.job.filename = "Receivables_Aging.pdf"
+        self.job.save()
+        url = reverse("download_job_result", args=[self.job.pk])
+        self.client.force_login(self.clerk)
+        with override_settings(BOOKING_PDF_X_ACCEL=True):
+            self.assertEqual(self.client.get(url).status_code, 404)
+            os.makedirs(os.path.dirname(self.job.result_path()))
+            with open(self.job.result_path(), "wb") as fp:
+                fp.write(b"%PDF-1.4")
+            response = self.client.get(url)
+        self.assertEqual(
+            response["X-Accel-Redirect"],
+            f"{settings.MEDIA_URL}jobs/{self.job.pk}/Receivables_Aging.pdf",
+        )
+        self.assertEqual(response.content, b"")
+
+    def test_zip_results_are_served_as_zip(self):
+        job = Job.objects.create(
+            kind="daily_report_pdf",
+            requested_by=self.clerk,
+            params={"start_date": "2025-01-01", "end_date": "2025-01-03", "format": "zip"},
+        )
+        self.assertTrue(run_job(claim_job()))
+        self.client.force_login(self.clerk)
+        response = self.client.get(reverse("download_job_result", args=[job.pk]))
+        self.assertEqual(response["Content-Type"], "application/zip")
+        self.assertIn(
+            'filename="Daily_Reports_2025-01-01_2025-01-03.zip"', response["Content-Disposition"]
+        )
+        with zipfile.ZipFile(BytesIO(b"".join(response.streaming_content))) as archive:
+            # One PDF per day plus the summary
+            self.assertEqual(len(archive.namelist()), 4)
+
+    def test_other_users_jobs_are_hidden(self):
+        self.client.force_login(User.objects.create(username="other"))
+        self.assertEqual(
+            self.client.get(reverse("job_status_json", args=[self.job.pk])).status_code, 404
+        )
+        self.assertEqual(
+            self.client.get(reverse("download_job_result", args=[self.job.pk])).status_code, 404
+        )
@@ -0,0 +1,9 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path("enqueue/<str:kind>/", views.enqueue_job, name="enqueue_job"),
+    path("<int:job_id>/", views.job_detail, name="job_detail"),
+    path("<int:job_id>/status/", views.job_status_json, name="job_status_json"),
+    path("<int:job_id>/download/", views.download_job_result, name="download_job_result"),
+]
@@ -0,0 +1,115 @@
+import mimetypes
+import os
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
+from django.views.decorators.http import require_GET, require_POST
+
+from .models import JOBS_DIR, Job
+
+
+def _visible_jobs(user):
+    jobs = Job.objects.all()
+    return jobs if user.is_staff else jobs.filter(requested_by=user)
+
+
+# Tracebacks can expose paths, queries and data; only staff see them
+FAILED_MESSAGE = "The report could not be generated. Please try again or contact an administrator."
+
+
+def _job_error(job, user):
+    if job.status != "failed":
+        return ""
+    return job.error if user.is_staff else FAILED_MESSAGE
+
+
+def _job_json(job, user):
+    return {
+        "id": job.pk,
+        "kind": job.kind,
+        "status": job.status,
+        "error": _job_error(job, user),
+        "created_at": job.created_at.isoformat(),
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "status_url": reverse("job_status_json", args=[job.pk]),
+        "download_url": (
+            reverse("download_job_result", args=[job.pk])
+            if job.status == "done"
+            else None
+        ),
+    }
+
+
+@require_POST
+@login_required
+def enqueue_job(request, kind):
+    """Queue a report for background rendering.
+
+    The report filters come from the query string, exactly as they would
+    be passed to the synchronous download view. An identical job that is
+    still pending for the same user is reused instead of queueing another.
+    """
+    if kind not in dict(Job.KIND_CHOICES):
+        raise Http404("Unknown report type")
+    params = request.GET.dict()
+
+    job = Job.objects.filter(
+        kind=kind,
+        params=params,
+        requested_by=request.user,
+        status__in=["queued", "running"],
+    ).first()
+    if job is None:
+        job = Job.objects.create(kind=kind, params=params, requested_by=request.user)
+
+    if request.headers.get("Accept", "").startswith("application/json"):
+        return JsonResponse(_job_json(job, request.user), status=202)
+    return redirect("job_detail", job_id=job.pk)
+
+
+@require_GET
+@login_required
+def job_detail(request, job_id):
+    job = get_object_or_404(_visible_jobs(request.user), pk=job_id)
+    return render(
+        request, "jobs/job_status.html", {"job": job, "error": _job_error(job, request.user)}
+    )
+
+
+@require_GET
+@login_required
+def job_status_json(request, job_id):
+    job = get_object_or_404(_visible_jobs(request.user), pk=job_id)
+    return JsonResponse(_job_json(job, request.user))
+
+
+@require_GET
+@login_required
+def download_job_result(request, job_id):
+    job = get_object_or_404(_visible_jobs(request.user), pk=job_id)
+    if job.status != "done":
+        return HttpResponse("Report is not ready yet.", status=409)
+    # Most kinds are PDFs, but a range of daily reports may be a zip
+    content_type = mimetypes.guess_type(job.filename)[0] or "application/octet-stream"
+    if settings.BOOKING_PDF_X_ACCEL:
+        # Let nginx send the file; /media/jobs/ is internal there, so this
+        # view's ownership check is the only way in
+        if not os.path.isfile(job.result_path()):
+            raise Http404("Report file has been removed")
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = f"{settings.MEDIA_URL}{JOBS_DIR}/{job.pk}/{job.filename}"
+        response["Content-Disposition"] = f"attachment; filename={job.filename}"
+        return response
+    try:
+        fp = open(job.result_path(), "rb")
+    except FileNotFoundError:
+        raise Http404("Report file has been removed")
+    return FileResponse(
+        fp,
+        as_attachment=True,
+        filename=job.filename,
+        content_type=content_type,
+    )
@@ -0,0 +1,121 @@
+import logging
+import os
+import tempfile
+import time
+import traceback
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .handlers import get_handler
+from .models import JOBS_DIR, Job
+
+logger = logging.getLogger(__name__)
+
+# A worker holds the session advisory lock (JOB_LOCK_CLASS, job id) while
+# it runs a job; the lock goes away with the worker's connection if it dies
+JOB_LOCK_CLASS = 7_302_225
+
+
+def _job_lock(function, job_id):
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT {function}(%s, %s)", [JOB_LOCK_CLASS, job_id])
+        return cursor.fetchone()[0]
+
+
+def claim_job():
+    """Atomically move the oldest queued job to `running` and return it.
+
+    `SKIP LOCKED` lets any number of workers poll the same table without
+    blocking on, or double-claiming, a job another worker is taking.
+    """
+    with transaction.atomic():
+        job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status="queued")
+            .order_by("created_at", "id")
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = "running"
+        job.started_at = timezone.now()
+        job.attempts += 1
+        job.save(update_fields=["status", "started_at", "attempts"])
+        # Taken before the claim commits, so a running job is never unlocked
+        # while its worker is alive (session locks outlast the transaction)
+        _job_lock("pg_advisory_lock", job.pk)
+    return job
+
+
+def run_job(job):
+    """Render the job's file and record the outcome on the job row, then
+    release the job's lock taken by `claim_job()`."""
+    try:
+        return _run_job(job)
+    finally:
+        _job_lock("pg_advisory_unlock", job.pk)
+
+
+def _run_job(job):
+    job_dir = os.path.join(settings.MEDIA_ROOT, JOBS_DIR, str(job.pk))
+    os.makedirs(job_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=job_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            filename = get_handler(job.kind)(job.params, fp)
+        job.filename = os.path.basename(filename)
+        os.replace(tmp_path, job.result_path())
+    except Exception:
+        os.unlink(tmp_path)
+        logger.exception("Job %s failed", job.pk)
+        job.mark_failed(traceback.format_exc(limit=5))
+        return False
+
+    job.result.name = f"{JOBS_DIR}/{job.pk}/{job.filename}"
+    job.status = "done"
+    job.finished_at = timezone.now()
+    job.save(update_fields=["result", "filename", "status", "finished_at"])
+    return True
+
+
+def requeue_stale(timeout):
+    """Requeue jobs left `running` by a worker that died, giving up on
+    jobs that have already used all their attempts. Returns the count.
+
+    A job counts as abandoned once it has run longer than `timeout` and no
+    worker holds its lock; a live worker still rendering a big report keeps
+    its job. Call this outside the worker processes, whose own locks would
+    not block it."""
+    cutoff = timezone.now() - timeout
+    dead = []
+    for job_id in Job.objects.filter(status="running", started_at__lt=cutoff).values_list(
+        "pk", flat=True
+    ):
+        if _job_lock("pg_try_advisory_lock", job_id):
+            _job_lock("pg_advisory_unlock", job_id)
+            dead.append(job_id)
+    stale = Job.objects.filter(pk__in=dead, status="running")
+    failed = stale.filter(attempts__gte=settings.JOB_MAX_ATTEMPTS).update(
+        status="failed",
+        error="Worker stopped before the job finished.",
+        finished_at=timezone.now(),
+    )
+    return failed + stale.update(status="queued", started_at=None)
+
+
+def work(poll_interval=2.0, once=False, should_stop=lambda: False):
+    """Run jobs until `should_stop()` is true (or the queue is empty when
+    `once` is set). Returns the number of jobs processed."""
+    processed = 0
+    while not should_stop():
+        job = claim_job()
+        if job is None:
+            if once:
+                break
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
+        processed += 1
+    return processed
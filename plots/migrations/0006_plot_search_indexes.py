@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:26
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_buyer_search_indexes'),
+        ('plots', '0005_delete_installmentplan_remove_plot_size_sq_yards'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='plot',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('title'), name='gin_trgm_ops'), name='plot_title_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='plot',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('block_name'), name='gin_trgm_ops'), name='plot_block_trgm'),
+        ),
+    ]
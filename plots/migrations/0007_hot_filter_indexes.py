@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plots', '0006_plot_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='plot',
+            index=models.Index(fields=['status', 'plot_type', 'size_sqft'], include=('price',), name='plot_status_type_size_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='plot',
+            index=models.Index(condition=models.Q(('status', 'available')), fields=['plot_type', 'price'], name='plot_available_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='plot',
+            index=models.Index(fields=['block_name'], name='plot_block_idx'),
+        ),
+    ]
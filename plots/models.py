@@ -1,4 +1,6 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import Upper
 
 
 class Plot(models.Model):
@@ -43,5 +45,29 @@ class Plot(models.Model):
     facing_direction = models.CharField(max_length=50, blank=True, null=True)
     block_name = models.CharField(max_length=50, blank=True, null=True)
 
+    class Meta:
+        # Serve the plot search API's `icontains`/`istartswith` lookups
+        indexes = [
+            GinIndex(OpClass(Upper("title"), name="gin_trgm_ops"), name="plot_title_trgm"),
+            GinIndex(
+                OpClass(Upper("block_name"), name="gin_trgm_ops"),
+                name="plot_block_trgm",
+            ),
+            # Plot list filters and the sold/available totals (covering)
+            models.Index(
+                fields=["status", "plot_type", "size_sqft"],
+                include=["price"],
+                name="plot_status_type_size_idx",
+            ),
+            # Plots still for sale, by type and price
+            models.Index(
+                fields=["plot_type", "price"],
+                condition=models.Q(status="available"),
+                name="plot_available_price_idx",
+            ),
+            # Exact block filter and the list of blocks on the aging report
+            models.Index(fields=["block_name"], name="plot_block_idx"),
+        ]
+
     def __str__(self):
         return f"{self.title} ({self.plot_type} - {self.size_sqft} sqft)"
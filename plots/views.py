@@ -1,12 +1,15 @@
+from django.core.paginator import Paginator
 from django.shortcuts import render
 from django.db.models import Sum
 from .models import Plot
 from django.contrib.auth.decorators import login_required
 
+PLOTS_PER_PAGE = 48
+
 
 @login_required
 def plot_list(request):
-    plots = Plot.objects.all()
+    plots = Plot.objects.order_by("id")
 
     # Filters
     status = request.GET.get("status")
@@ -41,8 +44,11 @@ def plot_list(request):
     available_sqft = Plot.objects.filter(status="available").aggregate(total=Sum("size_sqft"))["total"] or 0
     sold_sqft = Plot.objects.filter(status="sold").aggregate(total=Sum("size_sqft"))["total"] or 0
 
+    page_obj = Paginator(plots, PLOTS_PER_PAGE).get_page(request.GET.get("page"))
+
     context = {
-        "plots": plots,
+        "plots": page_obj.object_list,
+        "page_obj": page_obj,
         "selected_status": status,
         "selected_plot_type": plot_type,
         "min_size": min_size,
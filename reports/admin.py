@@ -1,7 +1,52 @@
 from django.contrib import admin
-from .models import Transaction
+from .models import ClosedPeriod, DailySourceSummary, PeriodExpenseTotal, PeriodTotal, Transaction
 
 
 @admin.register(Transaction)
 class TransactionAdmin(admin.ModelAdmin):
     list_display = ("type", "amount", "related_payment", "created_at")
+
+
+@admin.register(DailySourceSummary)
+class DailySourceSummaryAdmin(admin.ModelAdmin):
+    list_display = ("date", "source", "type", "total", "count")
+    list_filter = ("type", "source")
+    date_hierarchy = "date"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class PeriodTotalInline(admin.TabularInline):
+    model = PeriodTotal
+    fields = ("source", "type", "total", "count")
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+
+class PeriodExpenseTotalInline(admin.TabularInline):
+    model = PeriodExpenseTotal
+    fields = ("category", "source", "type", "total", "count")
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+
+@admin.register(ClosedPeriod)
+class ClosedPeriodAdmin(admin.ModelAdmin):
+    # Closed and reopened with `manage.py close_period`
+    list_display = ("__str__", "start_date", "end_date", "closed_at", "closed_by")
+    inlines = [PeriodTotalInline, PeriodExpenseTotalInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
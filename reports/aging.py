@@ -0,0 +1,147 @@
+from django.db import connection
+
+from accounts.models import Buyer
+from bookings.models import Booking, Payment
+from plots.models import Plot
+
+# (column, label) for each bucket of installments that are due: in the
+# present period (the next 30 days), then by days past due. The forecast's
+# roll-rate model ages an installment through these in order.
+DUE_BUCKETS = [
+    ("current", "Current"),
+    ("days_1_30", "1–30 days"),
+    ("days_31_60", "31–60 days"),
+    ("days_61_90", "61–90 days"),
+    ("days_over_90", "90+ days"),
+]
+# The report's columns: the rest of the schedule comes first
+AGING_BUCKETS = [("not_due", "Not Yet Due"), *DUE_BUCKETS]
+
+_BUCKET_CONDITIONS = {
+    "not_due": "due_date >= %(as_of)s::date + 30",
+    "current": "due_date >= %(as_of)s AND due_date < %(as_of)s::date + 30",
+    "days_1_30": "due_date < %(as_of)s AND due_date >= %(as_of)s::date - 30",
+    "days_31_60": "due_date < %(as_of)s::date - 30 AND due_date >= %(as_of)s::date - 60",
+    "days_61_90": "due_date < %(as_of)s::date - 60 AND due_date >= %(as_of)s::date - 90",
+    "days_over_90": "due_date < %(as_of)s::date - 90",
+}
+
+# group_by -> (title, key, label, detail, joins for the labels). Rows are
+# rolled up on the key alone and the labels looked up afterwards, for the
+# returned rows only.
+AGING_GROUPINGS = {
+    "booking": (
+        "Booking",
+        "a.booking_id",
+        "plot.title",
+        "buyer.name",
+        "LEFT JOIN {booking} lb ON lb.id = g.key "
+        "LEFT JOIN {plot} plot ON plot.id = lb.plot_id "
+        "LEFT JOIN {buyer} buyer ON buyer.id = lb.buyer_id",
+    ),
+    "buyer": (
+        "Buyer",
+        "b.buyer_id",
+        "buyer.name",
+        "buyer.cnic",
+        "LEFT JOIN {buyer} buyer ON buyer.id = g.key",
+    ),
+    "block": ("Block", "plot.block_name", "COALESCE(g.key, '—')", "NULL", ""),
+    "plot_type": ("Plot Type", "plot.plot_type", "INITCAP(g.key)", "NULL", ""),
+}
+
+# Unpaid payments are bucketed per booking straight off the
+# `payment_unpaid_due_idx` partial index, rolled up to the requested
+# grouping (ROLLUP adds the grand total as one more row), and only then
+# labelled, so the whole report is a single statement.
+AGING_SQL = """
+    WITH per_booking AS (
+        SELECT booking_id, {bucket_sums},
+               SUM(amount) AS total,
+               MIN(due_date) FILTER (WHERE due_date < %(as_of)s) AS oldest_due,
+               COUNT(*) AS payments
+        FROM {payment}
+        WHERE NOT is_paid
+        GROUP BY booking_id
+    ),
+    grouped AS (
+        SELECT GROUPING({key}) <> 0 AS is_total, {key} AS key,
+               {bucket_totals},
+               COALESCE(SUM({overdue}), 0) AS overdue,
+               COALESCE(SUM(a.total), 0) AS total,
+               MIN(a.oldest_due) AS oldest_due,
+               COALESCE(SUM(a.payments), 0)::integer AS payments
+        FROM per_booking a
+        {joins}
+        WHERE {where}
+        GROUP BY ROLLUP ({key})
+        ORDER BY is_total DESC, overdue DESC, total DESC, key
+        {limit}
+    )
+    SELECT g.*, {label} AS label, {detail} AS detail
+    FROM grouped g
+    {label_joins}
+    ORDER BY g.is_total DESC, g.overdue DESC, g.total DESC, g.key
+"""
+
+
+def aging_sql(group_by, block=None, plot_type=None, limit=None):
+    _, key, label, detail, label_joins = AGING_GROUPINGS[group_by]
+    tables = {
+        "booking": Booking._meta.db_table,
+        "plot": Plot._meta.db_table,
+        "buyer": Buyer._meta.db_table,
+    }
+    # Join bookings and plots only when grouping or filtering needs them
+    joins = []
+    if group_by != "booking" or block or plot_type:
+        joins.append("JOIN {booking} b ON b.id = a.booking_id")
+    if group_by in ("block", "plot_type") or block or plot_type:
+        joins.append("JOIN {plot} plot ON plot.id = b.plot_id")
+    where = ["TRUE"]
+    if block:
+        where.append("plot.block_name = %(block)s")
+    if plot_type:
+        where.append("plot.plot_type = %(plot_type)s")
+    return AGING_SQL.format(
+        bucket_sums=", ".join(
+            f"COALESCE(SUM(amount) FILTER (WHERE {_BUCKET_CONDITIONS[column]}), 0) AS {column}"
+            for column, _ in AGING_BUCKETS
+        ),
+        bucket_totals=", ".join(
+            f"COALESCE(SUM(a.{column}), 0) AS {column}" for column, _ in AGING_BUCKETS
+        ),
+        overdue=" + ".join(f"a.{column}" for column, _ in DUE_BUCKETS[1:]),
+        payment=Payment._meta.db_table,
+        key=key,
+        joins=" ".join(joins).format(**tables),
+        where=" AND ".join(where),
+        # One more for the grand total row
+        limit="LIMIT %(limit)s + 1" if limit is not None else "",
+        label=label,
+        detail=detail,
+        label_joins=label_joins.format(**tables),
+    )
+
+
+def aging_report(as_of, group_by="booking", block=None, plot_type=None, limit=None):
+    """Unpaid installments bucketed by due date as of `as_of`, one
+    row per booking, buyer, block or plot type (`group_by`), largest
+    overdue amount first. Returns `(totals, rows)`; with `limit`, at most
+    that many rows are returned but `totals` still covers every group.
+
+    Each row has the bucket amounts by column name and, in bucket order, as
+    `buckets`, plus `overdue`, `total`, `payments`, `oldest_due` and
+    `days_overdue`; `key` is the booking or buyer id, block or plot type.
+    """
+    params = {"as_of": as_of, "block": block, "plot_type": plot_type, "limit": limit}
+    with connection.cursor() as cursor:
+        cursor.execute(aging_sql(group_by, block, plot_type, limit), params)
+        columns = [column.name for column in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    for row in rows:
+        row["buckets"] = [row[column] for column, _ in AGING_BUCKETS]
+        row["days_overdue"] = (as_of - row["oldest_due"]).days if row["oldest_due"] else 0
+    # The grand total sorts first, and is there even with no unpaid rows
+    totals, rows = rows[0], rows[1:]
+    return totals, rows
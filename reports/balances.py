@@ -0,0 +1,162 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import Case, DecimalField, F, Q, Sum, When
+
+from bookings.models import PaymentSource
+from .models import DailySourceSummary, SourceBalanceSnapshot
+from .summary import SNAPSHOT_TABLE, SUMMARY_TABLE
+
+# Closing balance of every source (and "no source") at every month end
+# from the first transaction up to the last complete month, as a running
+# sum of monthly net movements taken from the daily summary
+MONTH_END_BALANCES_SQL = f"""
+    WITH monthly AS (
+        SELECT source_id,
+               (date_trunc('month', date) + interval '1 month - 1 day')::date AS month_end,
+               SUM(CASE WHEN type = 'credit' THEN total ELSE -total END) AS net
+        FROM {SUMMARY_TABLE}
+        WHERE date <= %(last_month_end)s
+        GROUP BY 1, 2
+    ),
+    months AS (
+        SELECT (m + interval '1 month - 1 day')::date AS month_end
+        FROM generate_series(
+            (SELECT date_trunc('month', MIN(month_end)) FROM monthly),
+            %(last_month_end)s::date,
+            interval '1 month'
+        ) AS m
+    ),
+    sources AS (
+        SELECT id AS source_id FROM {PaymentSource._meta.db_table}
+        UNION SELECT source_id FROM monthly
+        UNION SELECT NULL
+    )
+    SELECT s.source_id, m.month_end,
+           SUM(COALESCE(monthly.net, 0)) OVER (
+               PARTITION BY s.source_id ORDER BY m.month_end
+           ) AS balance
+    FROM sources s
+    CROSS JOIN months m
+    LEFT JOIN monthly
+      ON monthly.source_id IS NOT DISTINCT FROM s.source_id
+     AND monthly.month_end = m.month_end
+"""
+
+INSERT_MISSING_SQL = f"""
+    INSERT INTO {SNAPSHOT_TABLE} (source_id, month_end, balance)
+    SELECT source_id, month_end, balance FROM ({MONTH_END_BALANCES_SQL}) computed
+    ON CONFLICT (source_id, month_end) DO NOTHING
+"""
+
+SNAPSHOT_DRIFT_SQL = f"""
+    SELECT computed.source_id, computed.month_end, stored.balance, computed.balance
+    FROM ({MONTH_END_BALANCES_SQL}) computed
+    LEFT JOIN {SNAPSHOT_TABLE} stored
+      ON stored.source_id IS NOT DISTINCT FROM computed.source_id
+     AND stored.month_end = computed.month_end
+    WHERE stored.balance IS NOT NULL AND stored.balance <> computed.balance
+    ORDER BY 2, 1
+"""
+
+SIGNED_TOTAL = Case(
+    When(type="credit", then=F("total")),
+    default=-F("total"),
+    output_field=DecimalField(max_digits=14, decimal_places=2),
+)
+
+
+def last_month_end(today):
+    return today.replace(day=1) - timedelta(days=1)
+
+
+def create_snapshots(today):
+    """Add snapshots for month ends (before `today`'s month) that don't
+    have one yet. Existing rows are already kept current by the summary
+    deltas, so they are left alone. Returns the number of rows added."""
+    with connection.cursor() as cursor:
+        cursor.execute(INSERT_MISSING_SQL, {"last_month_end": last_month_end(today)})
+        return cursor.rowcount
+
+
+def find_snapshot_drift(today):
+    """`(source_id, month_end, stored, computed)` for snapshots that
+    disagree with the daily summary."""
+    with connection.cursor() as cursor:
+        cursor.execute(SNAPSHOT_DRIFT_SQL, {"last_month_end": last_month_end(today)})
+        return cursor.fetchall()
+
+
+def balances_as_of(day):
+    """Closing balance of each source at the end of `day`, as
+    `{source_id: balance}` (`None` for transactions without a source).
+
+    Reads the latest month-end snapshot on or before `day` for each source
+    and adds the summary rows after it: two small queries, whatever the
+    size of the transaction history.
+    """
+    snapshots = {
+        snapshot.source_id: snapshot
+        for snapshot in SourceBalanceSnapshot.objects.filter(month_end__lte=day)
+        .order_by("source_id", "-month_end")
+        .distinct("source_id")
+    }
+    balances = {
+        source_id: snapshot.balance for source_id, snapshot in snapshots.items()
+    }
+
+    # Movements after each source's snapshot (all of them if it has none)
+    after_snapshot = ~Q(source_id__in=[pk for pk in snapshots if pk is not None])
+    if None in snapshots:
+        after_snapshot &= ~Q(source__isnull=True)
+    for source_id, snapshot in snapshots.items():
+        source = Q(source__isnull=True) if source_id is None else Q(source_id=source_id)
+        after_snapshot |= source & Q(date__gt=snapshot.month_end)
+
+    movements = (
+        DailySourceSummary.objects.filter(after_snapshot, date__lte=day)
+        .values("source_id")
+        .annotate(net=Sum(SIGNED_TOTAL))
+        .order_by()
+    )
+    for row in movements:
+        balances[row["source_id"]] = (
+            balances.get(row["source_id"], Decimal("0")) + row["net"]
+        )
+    return balances
+
+
+def source_balance_rows(opening, movements):
+    """Rows for an opening/closing balance table.
+
+    `opening` is a `balances_as_of` result for the day before the period
+    and `movements` the `DailySourceSummaryQuerySet.by_source()` rows for
+    the period. Sources with no balance and no movement are left out.
+    """
+    names = dict(PaymentSource.objects.values_list("pk", "name"))
+    names[None] = None
+    period = {row["source_id"]: row for row in movements}
+    rows = []
+    for source_id in sorted(
+        set(opening) | set(period),
+        key=lambda pk: (names.get(pk) is None, names.get(pk) or ""),
+    ):
+        credit = (period.get(source_id) or {}).get("credit_total") or 0
+        debit = (period.get(source_id) or {}).get("debit_total") or 0
+        opening_balance = opening.get(source_id, Decimal("0"))
+        closing_balance = opening_balance + credit - debit
+        if not (opening_balance or credit or debit or closing_balance):
+            continue
+        rows.append(
+            {
+                "source_id": source_id,
+                "source__name": names.get(source_id),
+                "opening": opening_balance,
+                "credit_total": credit,
+                "debit_total": debit,
+                "net": credit - debit,
+                "closing": closing_balance,
+            }
+        )
+    return rows
@@ -0,0 +1,258 @@
+"""Set-based verification and repair of `Transaction` against the rows it
+is derived from.
+
+The signals in `reports.signals` keep one ledger row per paid installment
+(`related_payment`), per booking down payment (`related_booking`, no
+payment) and per expense (`related_expense`). Bulk writes, `update()` and
+raw SQL skip them. Here the rows the signals would have written are
+computed for the whole database with one query and compared to the ledger
+with a full outer join, so checking millions of rows takes a few seconds.
+
+Problems found, per derived row (`kind`, `key`):
+
+- `missing`: no ledger row, inserted by `repair_ledger()`
+- `changed`: the ledger row differs (date, amount, source, description
+  or links), updated
+- `unexpected`: a credit for an installment that is no longer paid,
+  deleted
+- `duplicate`: a second ledger row for the same installment or expense,
+  deleted
+
+Rows linked only to a booking beyond its down payment are left alone:
+they are the credits of deleted installments. Unlinked rows (manual
+entries) are never touched.
+
+`sync_ledger()` runs the same repair for a few payments, bookings and
+expenses only; the outbox consumer (`jobs.outbox`) uses it to apply
+deferred changes.
+"""
+
+from django.db import connection, transaction
+
+from accounts.models import Buyer
+from bookings.models import Booking, Payment
+from expenses.models import Expense, ExpenseCategory
+from plots.models import Plot
+from .models import ClosedPeriod
+from .summary import SUMMARY_TABLE, TRANSACTION_TABLE, UPSERT_SQL
+
+LEDGER_COLUMNS = [
+    "date",
+    "type",
+    "amount",
+    "description",
+    "source_id",
+    "related_payment_id",
+    "related_booking_id",
+    "related_expense_id",
+]
+
+# What the signals write for each payment, booking and expense
+EXPECTED_SQL = f"""
+    SELECT 'payment' AS kind, p.id AS key, COALESCE(p.paid_date, p.due_date) AS date,
+        'credit' AS type, p.amount, 'Installment from ' || buyer.name AS description,
+        p.source_id, p.id AS related_payment_id, p.booking_id AS related_booking_id,
+        NULL::bigint AS related_expense_id
+    FROM {Payment._meta.db_table} p
+    JOIN {Booking._meta.db_table} b ON b.id = p.booking_id
+    JOIN {Buyer._meta.db_table} buyer ON buyer.id = b.buyer_id
+    WHERE p.is_paid
+      AND (%(all)s OR p.id = ANY(%(payments)s) OR p.booking_id = ANY(%(bookings)s))
+    UNION ALL
+    SELECT 'down_payment', b.id, b.start_date, 'credit', b.down_payment_amount,
+        'Down Payment from ' || buyer.name || ' (' || plot.title || ')',
+        b.source_id, NULL, b.id, NULL
+    FROM {Booking._meta.db_table} b
+    JOIN {Buyer._meta.db_table} buyer ON buyer.id = b.buyer_id
+    JOIN {Plot._meta.db_table} plot ON plot.id = b.plot_id
+    WHERE b.down_payment_amount > 0 AND (%(all)s OR b.id = ANY(%(bookings)s))
+    UNION ALL
+    SELECT 'expense', e.id, e.date, CASE WHEN e.type = 'credit' THEN 'credit' ELSE 'debit' END,
+        e.amount, e.title || ' (' || c.name || ')', e.source_id, NULL, NULL, e.id
+    FROM {Expense._meta.db_table} e
+    JOIN {ExpenseCategory._meta.db_table} c ON c.id = e.category_id
+    WHERE %(all)s OR e.id = ANY(%(expenses)s)
+"""
+
+# Linked ledger rows under the same keys; the first row per key is the one
+# compared, later ones are duplicates
+ACTUAL_SQL = f"""
+    SELECT *, row_number() OVER (PARTITION BY kind, key ORDER BY id) AS rank
+    FROM (
+        SELECT t.*,
+            CASE WHEN t.related_payment_id IS NOT NULL THEN 'payment'
+                 WHEN t.related_expense_id IS NOT NULL THEN 'expense'
+                 ELSE 'down_payment' END AS kind,
+            COALESCE(t.related_payment_id, t.related_expense_id, t.related_booking_id) AS key
+        FROM {TRANSACTION_TABLE} t
+        WHERE (t.related_payment_id IS NOT NULL
+               OR t.related_expense_id IS NOT NULL
+               OR t.related_booking_id IS NOT NULL)
+          AND (%(all)s
+               OR t.related_payment_id = ANY(%(payments)s)
+               OR t.related_payment_id = ANY(ARRAY(
+                   SELECT id FROM {Payment._meta.db_table} WHERE booking_id = ANY(%(bookings)s)
+               ))
+               OR (t.related_payment_id IS NULL AND t.related_expense_id = ANY(%(expenses)s))
+               OR (t.related_payment_id IS NULL AND t.related_expense_id IS NULL
+                   AND t.related_booking_id = ANY(%(bookings)s)))
+    ) linked
+"""
+
+_expected = ", ".join(f"e.{column}" for column in LEDGER_COLUMNS)
+_actual = ", ".join(f"a.{column}" for column in LEDGER_COLUMNS)
+
+CREATE_DRIFT_SQL = f"""
+    CREATE TEMP TABLE ledger_drift ON COMMIT DROP AS
+    SELECT COALESCE(e.kind, a.kind) AS kind, COALESCE(e.key, a.key) AS key,
+        a.id AS transaction_id,
+        CASE WHEN a.id IS NULL THEN 'missing'
+             WHEN e.key IS NULL AND a.rank > 1 THEN 'duplicate'
+             WHEN e.key IS NULL THEN 'unexpected'
+             ELSE 'changed' END AS problem,
+        a.date AS old_date, a.type AS old_type, a.amount AS old_amount,
+        a.source_id AS old_source_id, {_expected}
+    FROM ({EXPECTED_SQL}) e
+    FULL OUTER JOIN ({ACTUAL_SQL}) a ON a.kind = e.kind AND a.key = e.key AND a.rank = 1
+    WHERE (a.id IS NULL OR e.key IS NULL OR ({_actual}) IS DISTINCT FROM ({_expected}))
+      AND NOT (e.key IS NULL AND a.kind = 'down_payment')
+"""
+
+DRIFT_COUNTS_SQL = """
+    SELECT kind, problem, COUNT(*) FROM ledger_drift GROUP BY 1, 2 ORDER BY 1, 2
+"""
+
+DRIFT_SAMPLE_SQL = """
+    SELECT kind, key, transaction_id, problem, old_date, old_amount, date, amount
+    FROM ledger_drift ORDER BY kind, key, transaction_id LIMIT %s
+"""
+
+# Rows in closed months stay as they are
+SKIP_CLOSED_SQL = """
+    DELETE FROM ledger_drift WHERE LEAST(old_date, date) <= %s
+"""
+
+# Run after the ledger writes: recount every summary key a repaired row
+# was or is under, and change the summary by the difference. Summary rows
+# that had drifted along with the ledger are corrected too
+SUMMARY_CHANGES_SQL = f"""
+    WITH keys AS (
+        SELECT old_date AS date, old_source_id AS source_id, old_type AS type
+        FROM ledger_drift WHERE problem <> 'missing'
+        UNION
+        SELECT date, source_id, type FROM ledger_drift WHERE problem IN ('missing', 'changed')
+    ),
+    recounted AS (
+        SELECT k.date, k.source_id, k.type,
+            COALESCE(SUM(t.amount), 0) AS total, COUNT(t.id) AS count
+        FROM keys k
+        LEFT JOIN {TRANSACTION_TABLE} t
+          ON t.date = k.date AND t.type = k.type
+         AND t.source_id IS NOT DISTINCT FROM k.source_id
+        GROUP BY 1, 2, 3
+    )
+    SELECT r.date, r.source_id, r.type,
+        r.total - COALESCE(s.total, 0), (r.count - COALESCE(s.count, 0))::integer
+    FROM recounted r
+    LEFT JOIN {SUMMARY_TABLE} s
+      ON s.date = r.date AND s.type = r.type AND s.source_id IS NOT DISTINCT FROM r.source_id
+    ORDER BY 1, 2, 3
+"""
+
+REPAIR_SQL = [
+    f"""
+    UPDATE {TRANSACTION_TABLE} t
+    SET {", ".join(f"{column} = d.{column}" for column in LEDGER_COLUMNS)}
+    FROM ledger_drift d
+    WHERE t.id = d.transaction_id AND d.problem = 'changed'
+    """,
+    f"""
+    DELETE FROM {TRANSACTION_TABLE}
+    WHERE id IN (
+        SELECT transaction_id FROM ledger_drift WHERE problem IN ('unexpected', 'duplicate')
+    )
+    """,
+    f"""
+    INSERT INTO {TRANSACTION_TABLE} ({", ".join(LEDGER_COLUMNS)}, created_at)
+    SELECT {", ".join(LEDGER_COLUMNS)}, now()
+    FROM ledger_drift WHERE problem = 'missing'
+    ORDER BY date
+    """,
+    UPSERT_SQL.format(changes=SUMMARY_CHANGES_SQL),
+]
+
+
+def _scope(payments=None, bookings=None, expenses=None):
+    # Parameters of EXPECTED_SQL and ACTUAL_SQL: everything, or only the
+    # rows derived from the given ids
+    everything = payments is None and bookings is None and expenses is None
+    return {
+        "all": everything,
+        "payments": list(payments or ()),
+        "bookings": list(bookings or ()),
+        "expenses": list(expenses or ()),
+    }
+
+
+def _create_drift_table(cursor, scope=None):
+    # Dropped on commit; also dropped first for callers inside a longer
+    # transaction
+    cursor.execute("DROP TABLE IF EXISTS ledger_drift")
+    cursor.execute(CREATE_DRIFT_SQL, scope or _scope())
+
+
+def _drift_counts(cursor):
+    cursor.execute(DRIFT_COUNTS_SQL)
+    return {(kind, problem): count for kind, problem, count in cursor.fetchall()}
+
+
+def _repair(cursor, scope=None):
+    _create_drift_table(cursor, scope)
+    skipped = 0
+    through = ClosedPeriod.objects.closed_through()
+    if through:
+        cursor.execute(SKIP_CLOSED_SQL, [through])
+        skipped = cursor.rowcount
+    repaired = _drift_counts(cursor)
+    if repaired:
+        for statement in REPAIR_SQL:
+            cursor.execute(statement)
+    return repaired, skipped
+
+
+def find_ledger_drift(sample=20):
+    """Compare the ledger with the rows derived from payments, bookings and
+    expenses. Returns `(counts, rows)`: the number of problems per
+    `(kind, problem)` and up to `sample` of them as `(kind, key,
+    transaction_id, problem, ledger_date, ledger_amount, expected_date,
+    expected_amount)` tuples."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        _create_drift_table(cursor)
+        counts = _drift_counts(cursor)
+        cursor.execute(DRIFT_SAMPLE_SQL, [sample])
+        return counts, cursor.fetchall()
+
+
+def repair_ledger():
+    """Insert, update and delete ledger rows (and move the daily summary
+    and balance snapshots with them) until the ledger matches what the
+    signals would have written. Rows in closed months are left alone.
+    Returns `(repaired, skipped)`: counts per `(kind, problem)` and the
+    number of problems in closed months."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Writes to the ledger and its sources wait until the repair is done
+        cursor.execute(f"LOCK TABLE {TRANSACTION_TABLE} IN SHARE ROW EXCLUSIVE MODE")
+        cursor.execute(
+            f"LOCK TABLE {Payment._meta.db_table}, {Booking._meta.db_table}, "
+            f"{Expense._meta.db_table} IN SHARE MODE"
+        )
+        return _repair(cursor)
+
+
+def sync_ledger(payments=(), bookings=(), expenses=()):
+    """`repair_ledger()` for the ledger rows derived from the given
+    payment, booking and expense ids only (a booking's covers its down
+    payment and all its installments). Takes no table locks; callers run
+    it inside their own transaction."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        return _repair(cursor, _scope(payments, bookings, expenses))
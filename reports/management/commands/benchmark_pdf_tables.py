@@ -0,0 +1,97 @@
+import io
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.views import EXPENSE_COLUMNS
+from reports.pdf_report import PDFReport
+from reports.views import LEDGER_COLUMNS
+
+SOURCES = ["Cash", "Meezan Bank", "HBL Current Account", "Site Office Petty Cash"]
+DESCRIPTIONS = [
+    "Installment",
+    "Down payment — Plot A-12",
+    "Installment #14 for Booking #1042 — Muhammad Abdullah Khan, received at the site office",
+    "Diesel for generator",
+]
+
+
+def ledger_rows(count):
+    day = date(2025, 1, 1)
+    balance = Decimal("0")
+    for i in range(count):
+        amount = Decimal(1000 + i % 9000) + Decimal(i % 100) / 100
+        credit = amount if i % 3 else None
+        debit = None if i % 3 else amount
+        balance += amount if credit else -amount
+        yield (
+            (day + timedelta(days=i // 50)).strftime("%Y-%m-%d"),
+            SOURCES[i % len(SOURCES)],
+            DESCRIPTIONS[i % len(DESCRIPTIONS)],
+            credit,
+            debit,
+            balance,
+        )
+
+
+def expense_rows(count):
+    day = date(2025, 1, 1)
+    for i in range(count):
+        yield (
+            str(day + timedelta(days=i // 50)),
+            DESCRIPTIONS[i % len(DESCRIPTIONS)],
+            "Development Cost",
+            "Expense",
+            SOURCES[i % len(SOURCES)],
+            Decimal(1000 + i % 9000) + Decimal(i % 100) / 100,
+        )
+
+
+TABLES = {
+    "ledger": (LEDGER_COLUMNS, ledger_rows),
+    "expenses": (EXPENSE_COLUMNS, expense_rows),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Time rendering generated tables through the shared PDF report engine, "
+        "without touching the database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000, help="Rows per table.")
+        parser.add_argument("--repeat", type=int, default=5, help="Timed runs per table.")
+        parser.add_argument(
+            "--table",
+            action="append",
+            choices=sorted(TABLES),
+            help="Render only the named table layout (may be given more than once).",
+        )
+
+    def handle(self, *args, **options):
+        if options["rows"] < 1 or options["repeat"] < 1:
+            raise CommandError("--rows and --repeat must be at least 1.")
+
+        for name in options["table"] or sorted(TABLES):
+            columns, make_rows = TABLES[name]
+            rows = list(make_rows(options["rows"]))
+            timings = []
+            for _ in range(options["repeat"]):
+                fp = io.BytesIO()
+                start = time.perf_counter()
+                report = PDFReport(f"Benchmark {name}")
+                report.title("Abrar Green City — PDF Benchmark", f"{options['rows']} rows")
+                for chunk in report.table(columns, rows):
+                    fp.write(chunk)
+                fp.write(report.finish())
+                timings.append(time.perf_counter() - start)
+            median = statistics.median(timings)
+            self.stdout.write(
+                f"⏱️ {name:<10} {median * 1000:>9.1f} ms median ({min(timings) * 1000:.1f} min)  "
+                f"{options['rows'] / median:>9.0f} rows/s  {report.pages} pages  {len(fp.getvalue())} bytes"
+            )
+        self.stdout.write(self.style.SUCCESS("✅ Done."))
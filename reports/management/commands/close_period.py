@@ -0,0 +1,53 @@
+from argparse import ArgumentTypeError
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from reports.models import ClosedPeriod
+from reports.periods import close_through, month_end, reopen_from
+
+
+def month(value):
+    try:
+        return datetime.strptime(value, "%Y-%m").date()
+    except ValueError:
+        raise ArgumentTypeError(f"Expected a month as YYYY-MM, got {value!r}")
+
+
+class Command(BaseCommand):
+    help = "Close accounting months (locking their entries and storing their totals) or reopen them"
+
+    def add_arguments(self, parser):
+        action = parser.add_mutually_exclusive_group()
+        action.add_argument(
+            "--through",
+            type=month,
+            help="Close every open month up to and including this one (YYYY-MM).",
+        )
+        action.add_argument(
+            "--reopen",
+            type=month,
+            help="Reopen this month (YYYY-MM) and every later closed month.",
+        )
+
+    def handle(self, *args, **options):
+        if options["through"]:
+            try:
+                periods = close_through(month_end(options["through"]))
+            except ValidationError as e:
+                raise CommandError(" ".join(e.messages))
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"🔒 Closed {len(periods)} month(s): {periods[0]} – {periods[-1]}."
+                )
+            )
+        elif options["reopen"]:
+            reopened = reopen_from(options["reopen"])
+            self.stdout.write(self.style.SUCCESS(f"🔓 Reopened {reopened} month(s)."))
+
+        latest = ClosedPeriod.objects.first()
+        if latest is None:
+            self.stdout.write("No months are closed.")
+        else:
+            self.stdout.write(f"Books closed through {latest.end_date:%d %b %Y}.")
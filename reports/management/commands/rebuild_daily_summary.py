@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from reports.summary import find_drift, rebuild_summary
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily per-source transaction summary and verify it against transactions"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Only report summary rows that have drifted; do not write.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["verify"]:
+            with transaction.atomic():
+                written = rebuild_summary()
+            self.stdout.write(self.style.SUCCESS(f"✅ Rebuilt {written} daily summary rows."))
+
+        drifted = find_drift()
+        if drifted:
+            for date, source_id, type_, stored, actual, stored_n, actual_n in drifted[:20]:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"⚠️ {date} source={source_id or '-'} {type_}: "
+                        f"stored Rs {stored} ({stored_n}) actual Rs {actual} ({actual_n})"
+                    )
+                )
+            raise CommandError(f"{len(drifted)} daily summary row(s) out of sync.")
+
+        self.stdout.write(self.style.SUCCESS("✅ Daily summary matches transactions."))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from reports.ledger import find_ledger_drift, repair_ledger
+
+
+class Command(BaseCommand):
+    help = (
+        "Verify the transaction ledger against the payments, bookings and expenses it is "
+        "derived from, and repair it in bulk"
+    )
+
+    def add_arguments(self, parser):
+        mode = parser.add_mutually_exclusive_group(required=True)
+        mode.add_argument(
+            "--verify",
+            action="store_true",
+            help="Only report ledger rows that are missing, changed or unexpected; do not write.",
+        )
+        mode.add_argument(
+            "--fix",
+            action="store_true",
+            help="Insert, update and delete ledger rows to match; closed months are left alone.",
+        )
+
+    def handle(self, *args, **options):
+        if options["fix"]:
+            repaired, skipped = repair_ledger()
+            for (kind, problem), count in repaired.items():
+                self.stdout.write(f"🔧 {kind} {problem}: {count}")
+            self.stdout.write(
+                self.style.SUCCESS(f"✅ Repaired {sum(repaired.values())} ledger row(s).")
+            )
+            if skipped:
+                self.stdout.write(
+                    self.style.WARNING(f"🔒 Left {skipped} problem(s) in closed months.")
+                )
+
+        counts, sample = find_ledger_drift()
+        if counts:
+            for (kind, problem), count in counts.items():
+                self.stdout.write(self.style.WARNING(f"⚠️ {kind} {problem}: {count}"))
+            for kind, key, transaction_id, problem, old_date, old_amount, date, amount in sample:
+                self.stdout.write(
+                    f"   {kind} #{key} {problem}: ledger #{transaction_id or '-'} "
+                    f"{old_date or '-'} Rs {old_amount if old_amount is not None else '-'} → "
+                    f"{date or '-'} Rs {amount if amount is not None else '-'}"
+                )
+            raise CommandError(f"{sum(counts.values())} ledger row(s) out of sync.")
+
+        self.stdout.write(self.style.SUCCESS("✅ Ledger matches payments, bookings and expenses."))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from reports.balances import create_snapshots, find_snapshot_drift
+from reports.models import SourceBalanceSnapshot
+
+
+class Command(BaseCommand):
+    help = "Create month-end balance snapshots per payment source and verify them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Delete all snapshots and recompute them from the daily summary.",
+        )
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Only report snapshots that disagree with the daily summary; do not write.",
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.now().date()
+        if not options["verify"]:
+            with transaction.atomic():
+                if options["rebuild"]:
+                    SourceBalanceSnapshot.objects.all().delete()
+                created = create_snapshots(today)
+            self.stdout.write(self.style.SUCCESS(f"✅ Created {created} month-end snapshots."))
+
+        drifted = find_snapshot_drift(today)
+        if drifted:
+            for source_id, month_end, stored, computed in drifted[:20]:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"⚠️ {month_end} source={source_id or '-'}: "
+                        f"stored Rs {stored} computed Rs {computed}"
+                    )
+                )
+            raise CommandError(f"{len(drifted)} balance snapshot(s) out of sync.")
+
+        self.stdout.write(self.style.SUCCESS("✅ Balance snapshots match the daily summary."))
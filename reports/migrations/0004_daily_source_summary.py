@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+BACKFILL_SUMMARY_SQL = """
+INSERT INTO reports_dailysourcesummary (date, source_id, type, total, count)
+SELECT date, source_id, type, SUM(amount), COUNT(*)
+FROM reports_transaction
+GROUP BY date, source_id, type
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0010_booking_version'),
+        ('reports', '0003_alter_transaction_source_delete_paymentsource'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySourceSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('type', models.CharField(choices=[('credit', 'Credit'), ('debit', 'Debit')], max_length=6)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+                ('source', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_summaries', to='bookings.paymentsource')),
+            ],
+            options={
+                'verbose_name_plural': 'Daily source summaries',
+                'ordering': ['-date', 'source', 'type'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'source', 'type'), name='daily_summary_date_source_type', nulls_distinct=False)],
+            },
+        ),
+        migrations.RunSQL(BACKFILL_SUMMARY_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0010_booking_version'),
+        ('reports', '0004_daily_source_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SourceBalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month_end', models.DateField()),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('source', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to='bookings.paymentsource')),
+            ],
+            options={
+                'ordering': ['-month_end', 'source'],
+                'constraints': [models.UniqueConstraint(fields=('source', 'month_end'), name='balance_snapshot_source_month', nulls_distinct=False)],
+            },
+        ),
+    ]
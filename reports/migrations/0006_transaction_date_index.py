@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0012_hot_filter_indexes'),
+        ('expenses', '0005_expense_date_index'),
+        ('reports', '0005_source_balance_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['date', 'type', 'source'], include=('amount',), name='txn_date_type_source_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0012_hot_filter_indexes'),
+        ('expenses', '0005_expense_date_index'),
+        ('reports', '0007_dailysourcesummary_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClosedPeriod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateField(unique=True)),
+                ('end_date', models.DateField(unique=True)),
+                ('closed_at', models.DateTimeField(auto_now_add=True)),
+                ('closed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-start_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PeriodExpenseTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('expense', 'Expense'), ('debit', 'Debit'), ('credit', 'Credit')], max_length=10)),
+                ('total', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('count', models.IntegerField()),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='period_totals', to='expenses.expensecategory')),
+                ('period', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='expense_totals', to='reports.closedperiod')),
+                ('source', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='period_expense_totals', to='bookings.paymentsource')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('period', 'category', 'source', 'type'), name='period_expense_total_unique', nulls_distinct=False)],
+            },
+        ),
+        migrations.CreateModel(
+            name='PeriodTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('credit', 'Credit'), ('debit', 'Debit')], max_length=6)),
+                ('total', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('count', models.IntegerField()),
+                ('period', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='totals', to='reports.closedperiod')),
+                ('source', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='period_totals', to='bookings.paymentsource')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('period', 'source', 'type'), name='period_total_period_source_type', nulls_distinct=False)],
+            },
+        ),
+    ]
@@ -1,8 +1,10 @@
-from django.db import models
-from django.db.models import Sum
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Count, Max, Q, Sum
 from django.utils import timezone
 from bookings.models import Booking, Payment, PaymentSource
-from expenses.models import Expense
+from expenses.models import Expense, ExpenseCategory
 
 
 class Transaction(models.Model):
@@ -48,25 +50,281 @@ class Transaction(models.Model):
 
     class Meta:
         ordering = ["-date", "-id"]
+        indexes = [
+            # Date-range reports, optionally by source; `amount` makes it
+            # covering for the daily rollup rebuild
+            models.Index(
+                fields=["date", "type", "source"],
+                include=["amount"],
+                name="txn_date_type_source_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.date} — {self.type.upper()} — Rs {self.amount}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded = instance.summary_entry()
+        return instance
+
+    def summary_entry(self):
+        """`(date, source_id, type, amount)` as counted in the daily rollup."""
+        date = self._meta.get_field("date").to_python(self.date)
+        return (date, self.source_id, self.type, self.amount)
+
+    def save(self, *args, **kwargs):
+        # Checked first: failing inside the block below would break the
+        # caller's transaction
+        loaded = getattr(self, "_loaded", None)
+        ClosedPeriod.objects.check_open(self.date, loaded and loaded[0])
+        # The post_save handler updates DailySourceSummary in this transaction
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
     @classmethod
     def get_summary(cls, start_date=None, end_date=None):
-        qs = cls.objects.all()
+        summaries = DailySourceSummary.objects.all()
         if start_date and end_date:
-            qs = qs.filter(date__range=[start_date, end_date])
+            summaries = summaries.filter(date__range=[start_date, end_date])
+        totals = summaries.totals()
+        return {
+            "debit_total": totals["debit"],
+            "credit_total": totals["credit"],
+            "balance": totals["credit"] - totals["debit"],
+        }
 
-        debit_total = (
-            qs.filter(type="debit").aggregate(total=Sum("amount"))["total"] or 0
+
+class DailySourceSummaryQuerySet(models.QuerySet):
+    def in_range(self, start_date=None, end_date=None, source_id=None):
+        summaries = self
+        if start_date:
+            summaries = summaries.filter(date__gte=start_date)
+        if end_date:
+            summaries = summaries.filter(date__lte=end_date)
+        if source_id:
+            summaries = summaries.filter(source_id=source_id)
+        return summaries
+
+    def totals(self):
+        """Credit and debit totals and the transaction count, in one query."""
+        totals = self.aggregate(
+            credit=Sum("total", filter=Q(type="credit")),
+            debit=Sum("total", filter=Q(type="debit")),
+            count=Sum("count"),
         )
-        credit_total = (
-            qs.filter(type="credit").aggregate(total=Sum("amount"))["total"] or 0
+        return {key: value or 0 for key, value in totals.items()}
+
+    def by_source(self):
+        """Credit/debit totals per source, skipping empty sources."""
+        rows = (
+            self.values("source_id", "source__name")
+            .annotate(
+                credit_total=Sum("total", filter=Q(type="credit")),
+                debit_total=Sum("total", filter=Q(type="debit")),
+            )
+            .order_by("source__name")
         )
-        balance = credit_total - debit_total
-        return {
-            "debit_total": debit_total,
-            "credit_total": credit_total,
-            "balance": balance,
-        }
+        return [row for row in rows if row["credit_total"] or row["debit_total"]]
+
+    def fingerprint(self):
+        """Row count, totals and latest change of these rows, in one
+        query. Any transaction added, edited or deleted on their dates
+        changes it, so it can key conditional responses."""
+        return self.aggregate(
+            rows=Count("id"), count=Sum("count"), total=Sum("total"), changed=Max("updated_at")
+        )
+
+
+class DailySourceSummary(models.Model):
+    """Per day, payment source and type totals of `Transaction`.
+
+    Kept current by applying each transaction write as a delta (see
+    `reports.summary`), so reports over long ranges read a few hundred
+    rows instead of scanning every transaction. Rebuild or verify it with
+    `manage.py rebuild_daily_summary`.
+    """
+
+    date = models.DateField()
+    source = models.ForeignKey(
+        PaymentSource,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="daily_summaries",
+    )
+    type = models.CharField(max_length=6, choices=Transaction.TRANSACTION_TYPES)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+    # Set on every delta, including edits that leave the totals unchanged
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = DailySourceSummaryQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["-date", "source", "type"]
+        verbose_name_plural = "Daily source summaries"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "source", "type"],
+                nulls_distinct=False,
+                name="daily_summary_date_source_type",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.date} — {self.source or 'No source'} — {self.type} — Rs {self.total}"
+
+
+class SourceBalanceSnapshot(models.Model):
+    """Balance (all credits minus debits) of one payment source at the
+    close of a month.
+
+    Rows are created by `manage.py snapshot_balances` and then kept exact
+    by the same deltas that update `DailySourceSummary`, so a back-dated
+    transaction also moves every later snapshot. `source=None` holds the
+    transactions recorded without a source.
+    """
+
+    source = models.ForeignKey(
+        PaymentSource,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="balance_snapshots",
+    )
+    month_end = models.DateField()
+    balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ["-month_end", "source"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["source", "month_end"],
+                nulls_distinct=False,
+                name="balance_snapshot_source_month",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.source or 'No source'} — {self.month_end} — Rs {self.balance}"
+
+
+class PeriodClosed(ValidationError):
+    pass
+
+
+class ClosedPeriodQuerySet(models.QuerySet):
+    def closed_through(self):
+        """Last day of the latest closed month, or `None`."""
+        return self.aggregate(end=Max("end_date"))["end"]
+
+    def check_open(self, *dates, through=None):
+        """Raise `PeriodClosed` if any of `dates` (`None`s are ignored)
+        falls in a closed month. Pass `through` when it is already known."""
+        to_date = models.DateField().to_python
+        dates = [to_date(day) for day in dates if day]
+        if not dates:
+            return
+        through = through or self.closed_through()
+        if through and min(dates) <= through:
+            raise PeriodClosed(
+                f"The books are closed through {through:%d %b %Y}; "
+                f"entries dated on or before it can't be changed."
+            )
+
+
+class ClosedPeriod(models.Model):
+    """A closed calendar month.
+
+    Once a month is closed, transactions, paid installments and expenses
+    dated in it can no longer be added, changed or deleted, and its totals
+    are stored in `PeriodTotal` and `PeriodExpenseTotal` so reports read
+    them instead of aggregating the month again. Months are closed in
+    order, so everything on or before the latest `end_date` is locked.
+    Close and reopen months with `manage.py close_period`.
+    """
+
+    start_date = models.DateField(unique=True)
+    end_date = models.DateField(unique=True)
+    closed_at = models.DateTimeField(auto_now_add=True)
+    closed_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+
+    objects = ClosedPeriodQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["-start_date"]
+
+    def __str__(self):
+        return self.start_date.strftime("%B %Y")
+
+
+class PeriodTotal(models.Model):
+    """Transaction totals of a closed month per payment source and type."""
+
+    period = models.ForeignKey(ClosedPeriod, on_delete=models.CASCADE, related_name="totals")
+    # A source with closed history can't be deleted: that would move its
+    # locked transactions to "no source"
+    source = models.ForeignKey(
+        PaymentSource,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="period_totals",
+    )
+    type = models.CharField(max_length=6, choices=Transaction.TRANSACTION_TYPES)
+    total = models.DecimalField(max_digits=14, decimal_places=2)
+    count = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["period", "source", "type"],
+                nulls_distinct=False,
+                name="period_total_period_source_type",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.period} — {self.source or 'No source'} — {self.type} — Rs {self.total}"
+
+
+class PeriodExpenseTotal(models.Model):
+    """Expense totals of a closed month per category, payment source and
+    expense type."""
+
+    period = models.ForeignKey(
+        ClosedPeriod, on_delete=models.CASCADE, related_name="expense_totals"
+    )
+    category = models.ForeignKey(
+        ExpenseCategory, on_delete=models.PROTECT, related_name="period_totals"
+    )
+    source = models.ForeignKey(
+        PaymentSource,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="period_expense_totals",
+    )
+    type = models.CharField(max_length=10, choices=Expense.TYPE_CHOICES)
+    total = models.DecimalField(max_digits=14, decimal_places=2)
+    count = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["period", "category", "source", "type"],
+                nulls_distinct=False,
+                name="period_expense_total_unique",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.period} — {self.category} — {self.type} — Rs {self.total}"
@@ -0,0 +1,251 @@
+"""Report layout shared by every PDF the app renders.
+
+A `PDFReport` draws titles, lines of text and tables top to bottom on
+`StreamingPDF` pages, starting a new page when one is full and numbering
+them in the footer. Tables are declared as `Column`s: cell text is cut to
+the column's width using the font metrics (ending in an ellipsis), the
+header row is repeated on every page and a totals row can close the
+table.
+
+Reports are written as generators of PDF bytes. Text and headings are
+buffered; `table()` yields pages as they fill, so a table of any length
+renders with flat memory, and `finish()` returns the rest:
+
+    def chunks():
+        report = PDFReport("Ledger")
+        report.title("Abrar Green City — Ledger", "From: ...")
+        yield from report.table(columns, rows)
+        yield report.finish()
+
+Send them as a streaming response, or write them to a file-like object
+with `write_pdf()`.
+"""
+
+from decimal import Decimal
+
+from reportlab.lib.pagesizes import A4
+
+from .pdf_stream import StreamingPDF, glyph_widths, text_width
+
+ELLIPSIS = "…"
+REGULAR = "Helvetica"
+BOLD = "Helvetica-Bold"
+CELL_PADDING = 3
+
+
+def fit(text, font, size, width):
+    """`text` cut to fit in `width` points, ending in an ellipsis if cut."""
+    if text_width(text, font, size) <= width:
+        return text
+    widths = glyph_widths(font)
+    room = width * 1000 / size - widths[ELLIPSIS]
+    for end, char in enumerate(text):
+        room -= widths[char]
+        if room < 0:
+            break
+    return text[:end].rstrip() + ELLIPSIS
+
+
+def money(value):
+    return f"Rs {value}"
+
+
+def amount(value):
+    return f"{value:,.2f}"
+
+
+def write_pdf(chunks, fp):
+    """Write the PDF `chunks` to the file-like object `fp`."""
+    for chunk in chunks:
+        fp.write(chunk)
+
+
+class Column:
+    """One table column: its header `label`, `width` in points (`None`
+    shares the width left over by the other columns equally), alignment,
+    and `format` turning a cell value into text (`None` is left blank).
+    With `total`, the column's values are summed into the totals row."""
+
+    def __init__(self, label, width=None, align="left", format=str, total=False):
+        self.label = label
+        self.width = width
+        self.align = align
+        self.format = format
+        self.total = total
+
+    def text(self, value):
+        if value is None:
+            return ""
+        if isinstance(value, str):
+            return value
+        return self.format(value)
+
+
+class PDFReport:
+    def __init__(self, name, pagesize=A4, margin=50):
+        self.pdf = StreamingPDF(pagesize, title=name)
+        self.width = self.pdf.width
+        self.left = margin
+        self.right = self.pdf.width - margin
+        self.top = self.pdf.height - margin
+        self.bottom = margin
+        self.pages = 0
+        self.page = None
+        self._pending = [self.pdf.start()]
+        self.new_page()
+
+    # -------- pages --------
+    def new_page(self):
+        if self.page is not None:
+            self._pending.append(self.pdf.add_page(self.page))
+        self.page = self.pdf.new_page()
+        self.pages += 1
+        self._font = None
+        self.set_font(REGULAR, 8)
+        self.page.text_right(self.right, self.bottom - 20, f"Page {self.pages}")
+        self.y = self.top
+
+    def page_break(self):
+        """Continue on a new page unless nothing is drawn on this one."""
+        if self.y < self.top:
+            self.new_page()
+
+    def room(self, height):
+        """Start a new page unless `height` points are left on this one.
+        Returns whether it did."""
+        if self.y - height < self.bottom:
+            self.new_page()
+            return True
+        return False
+
+    def set_font(self, font, size):
+        if (font, size) != self._font:
+            self.page.set_font(font, size)
+            self._font = (font, size)
+
+    def take(self):
+        """PDF bytes of the pages finished since the last call."""
+        pending, self._pending = self._pending, []
+        return b"".join(pending)
+
+    def finish(self):
+        """Bytes of the remaining pages and the end of the document."""
+        self._pending.append(self.pdf.add_page(self.page))
+        self._pending.append(self.pdf.finish())
+        self.page = None
+        return self.take()
+
+    # -------- text --------
+    def title(self, text, subtitle=""):
+        self.room(60)
+        self.set_font(BOLD, 16)
+        self.page.text_centred(self.width / 2, self.y, fit(text, BOLD, 16, self.right - self.left))
+        self.y -= 20
+        if subtitle:
+            self.set_font(REGULAR, 10)
+            self.page.text_centred(
+                self.width / 2, self.y, fit(subtitle, REGULAR, 10, self.right - self.left)
+            )
+        self.y -= 30
+
+    def heading(self, text, size=13):
+        self.room(size + 40)  # keep a heading with what follows
+        self.line(text, font=BOLD, size=size, indent=0, space=size + 8)
+
+    def line(self, text, font=REGULAR, size=10, indent=10, space=None, align="left"):
+        space = space or size + 5
+        self.room(size)
+        self.set_font(font, size)
+        width = self.right - self.left - indent
+        text = fit(str(text), font, size, width)
+        if align == "right":
+            self.page.text_right(self.right, self.y, text)
+        else:
+            self.page.text(self.left + indent, self.y, text)
+        self.y -= space
+
+    def fields(self, pairs, **kwargs):
+        """One `Label: value` line per pair."""
+        for label, value in pairs:
+            self.line(f"{label}: {value}", **kwargs)
+
+    def space(self, height):
+        self.y -= height
+
+    # -------- tables --------
+    def _layout(self, columns):
+        fixed = sum(column.width or 0 for column in columns)
+        shared = [column for column in columns if column.width is None]
+        rest = (self.right - self.left - fixed) / len(shared) if shared else 0
+        x = self.left
+        layout = []
+        for column in columns:
+            width = column.width or rest
+            layout.append((column, x, width))
+            x += width
+        return layout
+
+    def _cells(self, layout, values, font, size):
+        self.set_font(font, size)
+        for (column, x, width), value in zip(layout, values):
+            text = column.text(value)
+            if not text:
+                continue
+            # Measured once for both fitting and right alignment
+            text_size = text_width(text, font, size)
+            if text_size > width - 2 * CELL_PADDING:
+                text = fit(text, font, size, width - 2 * CELL_PADDING)
+                text_size = text_width(text, font, size)
+            if column.align == "right":
+                self.page.text(x + width - CELL_PADDING - text_size, self.y, text)
+            else:
+                self.page.text(x + CELL_PADDING, self.y, text)
+
+    def _header(self, layout, size):
+        self._cells(layout, [column.label for column, _, _ in layout], BOLD, size)
+        self.y -= 5
+        self.page.line(self.left, self.y, self.right, self.y)
+        self.y -= size + 4
+
+    def table(self, columns, rows, size=8, footer=None, total_label="Total"):
+        """Draw `rows` (sequences of cell values, one per column) as a
+        table, yielding PDF bytes whenever a page fills. The header row is
+        repeated at the top of every page.
+
+        The totals row shows `footer` (cell values, or a function called
+        after the last row that returns them); by default, if any column
+        has `total`, its sums with `total_label` in the first column.
+        Returns the sums of the `total` columns."""
+        layout = self._layout(columns)
+        leading = size + 4
+        self.room(3 * leading)
+        self._header(layout, size)
+        sums = [Decimal("0") if column.total else None for column in columns]
+        totalled = [i for i, column in enumerate(columns) if column.total]
+        for row in rows:
+            if self.y < self.bottom:
+                self.new_page()
+                self._header(layout, size)
+                yield self.take()
+            self._cells(layout, row, REGULAR, size)
+            for i in totalled:
+                if row[i] is not None:
+                    sums[i] += row[i]
+            self.y -= leading
+
+        if callable(footer):
+            footer = footer()
+        elif footer is None and any(column.total for column in columns):
+            footer = list(sums)
+            if footer[0] is None:
+                footer[0] = total_label
+        if footer:
+            if self.room(leading + 6):
+                self._header(layout, size)
+            self.page.line(self.left, self.y + size + 2, self.right, self.y + size + 2)
+            self.y -= 2
+            self._cells(layout, footer, BOLD, size)
+            self.y -= leading
+        self.y -= 10
+        yield self.take()
+        return sums
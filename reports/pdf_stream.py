@@ -0,0 +1,170 @@
+"""A minimal PDF writer that emits the document page by page.
+
+ReportLab's canvas keeps every finished page in memory until `save()`,
+which is fine for a statement but not for a ledger with a million rows.
+`StreamingPDF` instead hands back the bytes of each page as soon as it is
+finished, remembering only the byte offset of every object for the
+cross-reference table at the end. Text uses the standard Helvetica fonts
+(so nothing is embedded) and ReportLab's font metrics for alignment.
+"""
+
+import zlib
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+FONTS = {"Helvetica": b"F1", "Helvetica-Bold": b"F2"}
+
+# Object numbers fixed up front so pages can point at them before the
+# page tree itself is written at the end of the file
+_FONT_OBJECTS = {b"F1": 1, b"F2": 2}
+_PAGES_OBJECT = 3
+_FIRST_FREE_OBJECT = 4
+
+
+class _GlyphWidths(dict):
+    """Width of each character of `font` at size 1000, measured once."""
+
+    def __init__(self, font):
+        self.font = font
+
+    def __missing__(self, char):
+        width = self[char] = stringWidth(char, self.font, 1000)
+        return width
+
+
+_GLYPH_WIDTHS = {font: _GlyphWidths(font) for font in FONTS}
+
+
+def glyph_widths(font):
+    """Mapping of each character to its width in `font` at size 1000."""
+    return _GLYPH_WIDTHS[font]
+
+
+def text_width(text, font, size):
+    """`stringWidth()` for the standard fonts, with glyph widths cached
+    (ReportLab measures every string from scratch)."""
+    return sum(map(_GLYPH_WIDTHS[font].__getitem__, text)) * size / 1000
+
+
+def _escape(text):
+    text = str(text).encode("cp1252", "replace")
+    return text.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+class Page:
+    """Drawing operations for one page, in PDF user space (points)."""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self._ops = []
+        self._font = None
+
+    def set_font(self, name, size):
+        self._font = (name, size)
+        self._ops.append(b"/%s %g Tf" % (FONTS[name], size))
+
+    def text(self, x, y, text):
+        self._ops.append(b"BT %.2f %.2f Td (%s) Tj ET" % (x, y, _escape(text)))
+
+    def text_right(self, x, y, text):
+        self.text(x - text_width(str(text), *self._font), y, text)
+
+    def text_centred(self, x, y, text):
+        self.text(x - text_width(str(text), *self._font) / 2, y, text)
+
+    def line(self, x1, y1, x2, y2):
+        self._ops.append(b"%.2f %.2f m %.2f %.2f l S" % (x1, y1, x2, y2))
+
+    def content(self):
+        return b"\n".join(self._ops)
+
+
+class StreamingPDF:
+    """Write a PDF as a sequence of byte chunks.
+
+    Call `start()` once, `add_page(page)` for each finished `Page`, then
+    `finish()`; each returns the bytes to send next.
+    """
+
+    def __init__(self, pagesize=A4, title=""):
+        self.width, self.height = pagesize
+        self.title = title
+        self._offset = 0
+        self._offsets = {}
+        self._page_objects = []
+        self._next_object = _FIRST_FREE_OBJECT
+
+    def new_page(self):
+        return Page(self.width, self.height)
+
+    def _object(self, number, body):
+        self._offsets[number] = self._offset
+        chunk = b"%d 0 obj\n%s\nendobj\n" % (number, body)
+        self._offset += len(chunk)
+        return chunk
+
+    def _allocate(self):
+        number = self._next_object
+        self._next_object += 1
+        return number
+
+    def start(self):
+        chunks = [b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"]
+        self._offset = len(chunks[0])
+        for name, tag in FONTS.items():
+            chunks.append(
+                self._object(
+                    _FONT_OBJECTS[tag],
+                    b"<< /Type /Font /Subtype /Type1 /BaseFont /%s "
+                    b"/Encoding /WinAnsiEncoding >>" % name.encode(),
+                )
+            )
+        return b"".join(chunks)
+
+    def add_page(self, page):
+        data = zlib.compress(page.content())
+        content_object = self._allocate()
+        page_object = self._allocate()
+        self._page_objects.append(page_object)
+        fonts = b" ".join(b"/%s %d 0 R" % (tag, n) for tag, n in _FONT_OBJECTS.items())
+        return self._object(
+            content_object,
+            b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream"
+            % (len(data), data),
+        ) + self._object(
+            page_object,
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.2f %.2f] "
+            b"/Contents %d 0 R /Resources << /Font << %s >> >> >>"
+            % (_PAGES_OBJECT, self.width, self.height, content_object, fonts),
+        )
+
+    def finish(self):
+        kids = b" ".join(b"%d 0 R" % n for n in self._page_objects)
+        chunks = [
+            self._object(
+                _PAGES_OBJECT,
+                b"<< /Type /Pages /Kids [%s] /Count %d >>"
+                % (kids, len(self._page_objects)),
+            )
+        ]
+        info_object = self._allocate()
+        chunks.append(self._object(info_object, b"<< /Title (%s) >>" % _escape(self.title)))
+        catalog_object = self._allocate()
+        chunks.append(
+            self._object(
+                catalog_object, b"<< /Type /Catalog /Pages %d 0 R >>" % _PAGES_OBJECT
+            )
+        )
+
+        xref = [b"xref\n0 %d\n" % self._next_object, b"0000000000 65535 f \n"]
+        xref.extend(
+            b"%010d 00000 n \n" % self._offsets[n] for n in range(1, self._next_object)
+        )
+        chunks.append(b"".join(xref))
+        chunks.append(
+            b"trailer\n<< /Size %d /Root %d 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+            % (self._next_object, catalog_object, info_object, self._offset)
+        )
+        return b"".join(chunks)
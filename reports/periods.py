@@ -0,0 +1,209 @@
+"""Closed accounting periods.
+
+`close_through()` closes every calendar month up to a month end: it
+stores the month's totals (`PeriodTotal`, `PeriodExpenseTotal`) and from
+then on writes dated on or before the latest closed day are rejected
+(`ClosedPeriodQuerySet.check_open()`). The checks run from
+`Transaction.save()`, the model signals in `reports.signals` and the
+bulk posting service, the same paths that keep the daily rollup current.
+
+`LedgerRange` and `expense_totals()` answer report totals from the
+stored months that lie wholly inside the requested range and aggregate
+only the days outside them.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import Max, Min, Q, Sum
+from django.utils import timezone
+
+from expenses.models import Expense
+from jobs.models import OutboxEvent
+from jobs.outbox import apply_batch
+from .models import ClosedPeriod, DailySourceSummary, PeriodExpenseTotal, PeriodTotal, Transaction
+
+PERIOD_TABLE = ClosedPeriod._meta.db_table
+
+# Totals of the given periods, straight from the source rows
+PERIOD_TOTALS_SQL = f"""
+    INSERT INTO {PeriodTotal._meta.db_table} (period_id, source_id, type, total, count)
+    SELECT p.id, t.source_id, t.type, SUM(t.amount), COUNT(*)
+    FROM {PERIOD_TABLE} p
+    JOIN {Transaction._meta.db_table} t ON t.date BETWEEN p.start_date AND p.end_date
+    WHERE p.id = ANY(%(periods)s)
+    GROUP BY p.id, t.source_id, t.type
+"""
+
+PERIOD_EXPENSE_TOTALS_SQL = f"""
+    INSERT INTO {PeriodExpenseTotal._meta.db_table}
+        (period_id, category_id, source_id, type, total, count)
+    SELECT p.id, e.category_id, e.source_id, e.type, SUM(e.amount), COUNT(*)
+    FROM {PERIOD_TABLE} p
+    JOIN {Expense._meta.db_table} e ON e.date BETWEEN p.start_date AND p.end_date
+    WHERE p.id = ANY(%(periods)s)
+    GROUP BY p.id, e.category_id, e.source_id, e.type
+"""
+
+
+def month_end(day):
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+
+
+def closing_state():
+    """Latest closed day and the time of the latest close; changes when
+    months are closed or reopened."""
+    return ClosedPeriod.objects.aggregate(through=Max("end_date"), closed_at=Max("closed_at"))
+
+
+def close_through(end_date, user=None):
+    """Close every month up to the one ending on `end_date`, starting
+    after the latest closed month (or at the first month with data).
+    Returns the new `ClosedPeriod`s."""
+    if end_date != month_end(end_date):
+        raise ValidationError(f"{end_date} is not the last day of a month.")
+    if end_date >= timezone.now().date():
+        raise ValidationError("Only months that have ended can be closed.")
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            # One close at a time, and no writes to the months being
+            # totalled until they are locked
+            cursor.execute(f"LOCK TABLE {PERIOD_TABLE} IN EXCLUSIVE MODE")
+            # Before the ledger, so a running process_outbox batch can finish
+            cursor.execute(f"LOCK TABLE {OutboxEvent._meta.db_table} IN SHARE MODE")
+            cursor.execute(
+                f"LOCK TABLE {Transaction._meta.db_table}, {Expense._meta.db_table} IN SHARE MODE"
+            )
+        # Changes still queued for the ledger belong in the totals
+        while apply_batch():
+            pass
+
+        through = ClosedPeriod.objects.closed_through()
+        if through:
+            start = through + timedelta(days=1)
+        else:
+            first = [
+                Transaction.objects.aggregate(first=Min("date"))["first"],
+                Expense.objects.aggregate(first=Min("date"))["first"],
+            ]
+            start = min([day for day in first if day] or [end_date]).replace(day=1)
+        if start > end_date:
+            raise ValidationError(f"The books are already closed through {through}.")
+
+        periods = []
+        while start <= end_date:
+            periods.append(ClosedPeriod(start_date=start, end_date=month_end(start), closed_by=user))
+            start = periods[-1].end_date + timedelta(days=1)
+        ClosedPeriod.objects.bulk_create(periods)
+
+        with connection.cursor() as cursor:
+            params = {"periods": [period.pk for period in periods]}
+            cursor.execute(PERIOD_TOTALS_SQL, params)
+            cursor.execute(PERIOD_EXPENSE_TOTALS_SQL, params)
+    return periods
+
+
+def reopen_from(start_date):
+    """Reopen the month starting `start_date` and every later closed month
+    (their stored totals are dropped). Returns the number reopened."""
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {PERIOD_TABLE} IN EXCLUSIVE MODE")
+        periods = ClosedPeriod.objects.filter(start_date__gte=start_date.replace(day=1))
+        count = periods.count()
+        periods.delete()
+    return count
+
+
+def _stored_range(start_date, end_date):
+    """Closed months lying wholly inside `start_date`..`end_date` (either
+    may be `None`), as `(periods, open_days)`: a `ClosedPeriod` queryset
+    and a `Q` for the dates outside them. Closed months are contiguous, so
+    the days they cover form one span."""
+    periods = ClosedPeriod.objects.all()
+    if start_date:
+        periods = periods.filter(start_date__gte=start_date)
+    if end_date:
+        periods = periods.filter(end_date__lte=end_date)
+    span = periods.aggregate(first=Min("start_date"), last=Max("end_date"))
+    if span["first"] is None:
+        return periods.none(), Q()
+    return periods, Q(date__lt=span["first"]) | Q(date__gt=span["last"])
+
+
+class LedgerRange:
+    """Transaction totals between two dates (either may be `None`),
+    optionally for one source.
+
+    Offers the `totals()` and `by_source()` of `DailySourceSummaryQuerySet`;
+    closed months in the range are read from `PeriodTotal`, the days
+    outside them from the daily summary.
+    """
+
+    def __init__(self, start_date=None, end_date=None, source_id=None):
+        periods, open_days = _stored_range(start_date, end_date)
+        self.stored = PeriodTotal.objects.filter(period__in=periods)
+        if source_id:
+            self.stored = self.stored.filter(source_id=source_id)
+        self.summaries = DailySourceSummary.objects.in_range(start_date, end_date, source_id).filter(
+            open_days
+        )
+
+    def totals(self):
+        stored = self.stored.aggregate(
+            credit=Sum("total", filter=Q(type="credit")),
+            debit=Sum("total", filter=Q(type="debit")),
+            count=Sum("count"),
+        )
+        return {
+            key: (stored[key] or 0) + value for key, value in self.summaries.totals().items()
+        }
+
+    def by_source(self):
+        rows = {}
+        stored = self.stored.values("source_id", "source__name").annotate(
+            credit_total=Sum("total", filter=Q(type="credit")),
+            debit_total=Sum("total", filter=Q(type="debit")),
+        )
+        for row in list(stored.order_by()) + self.summaries.by_source():
+            merged = rows.setdefault(
+                row["source_id"],
+                {
+                    "source_id": row["source_id"],
+                    "source__name": row["source__name"],
+                    "credit_total": None,
+                    "debit_total": None,
+                },
+            )
+            for key in ("credit_total", "debit_total"):
+                if row[key] is not None:
+                    merged[key] = (merged[key] or 0) + row[key]
+        return sorted(
+            (row for row in rows.values() if row["credit_total"] or row["debit_total"]),
+            key=lambda row: (row["source__name"] is None, row["source__name"] or ""),
+        )
+
+
+def expense_totals(start_date=None, end_date=None, **filters):
+    """Amount per expense type of the expenses between two dates matching
+    `filters` (`category_id`, `source_id`), as `{type: total}`; closed
+    months are read from `PeriodExpenseTotal`."""
+    periods, open_days = _stored_range(start_date, end_date)
+    filters = {key: value for key, value in filters.items() if value}
+    expenses = Expense.objects.filter(open_days, **filters)
+    if start_date:
+        expenses = expenses.filter(date__gte=start_date)
+    if end_date:
+        expenses = expenses.filter(date__lte=end_date)
+
+    totals = defaultdict(Decimal)
+    stored = PeriodExpenseTotal.objects.filter(period__in=periods, **filters)
+    for row in stored.values("type").annotate(subtotal=Sum("total")).order_by():
+        totals[row["type"]] += row["subtotal"]
+    for row in expenses.values("type").annotate(subtotal=Sum("amount")).order_by():
+        totals[row["type"]] += row["subtotal"]
+    return totals
@@ -1,13 +1,16 @@
-from django.db.models.signals import post_save
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
-from bookings.models import Payment, Booking
+from bookings.models import Payment, Booking, PaymentSource
 from expenses.models import Expense
-from .models import Transaction
+from .models import ClosedPeriod, Transaction
+from .summary import SummaryDelta
 
 
 @receiver(post_save, sender=Payment)
 def create_credit_transaction(sender, instance, created, **kwargs):
-    if instance.is_paid:
+    # With OUTBOX_ENABLED the ledger rows are written by process_outbox
+    if instance.is_paid and not settings.OUTBOX_ENABLED:
         Transaction.objects.update_or_create(
             related_payment=instance,
             defaults={
@@ -23,6 +26,8 @@ def create_credit_transaction(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=Expense)
 def create_debit_transaction(sender, instance, created, **kwargs):
+    if settings.OUTBOX_ENABLED:
+        return
     # Map Expense.type to Transaction.type: 'credit' -> 'credit', others -> 'debit'
     tx_type = "credit" if getattr(instance, "type", None) == "credit" else "debit"
 
@@ -40,7 +45,7 @@ def create_debit_transaction(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=Booking)
 def create_booking_downpayment_transaction(sender, instance, created, **kwargs):
-    if created and instance.down_payment_amount > 0:
+    if created and instance.down_payment_amount > 0 and not settings.OUTBOX_ENABLED:
         Transaction.objects.create(
             date=instance.start_date,
             type="credit",
@@ -49,3 +54,73 @@ def create_booking_downpayment_transaction(sender, instance, created, **kwargs):
             related_booking=instance,
             source=instance.source,
         )
+
+
+# Transaction writes are checked in Transaction.save(); these cover the
+# rows mirrored into the ledger before they are written
+
+@receiver(pre_save, sender=Payment)
+def lock_closed_payment(sender, instance, **kwargs):
+    dates = [instance.paid_date or instance.due_date] if instance.is_paid else []
+    if instance.pk:
+        old = (
+            Payment.objects.filter(pk=instance.pk, is_paid=True)
+            .values("paid_date", "due_date")
+            .first()
+        )
+        if old:
+            dates.append(old["paid_date"] or old["due_date"])
+    ClosedPeriod.objects.check_open(*dates)
+
+
+@receiver(pre_save, sender=Expense)
+def lock_closed_expense(sender, instance, **kwargs):
+    old = instance.pk and (
+        Expense.objects.filter(pk=instance.pk).values_list("date", flat=True).first()
+    )
+    ClosedPeriod.objects.check_open(instance.date, old)
+
+
+@receiver(pre_delete, sender=Transaction)
+def lock_closed_transaction_delete(sender, instance, **kwargs):
+    ClosedPeriod.objects.check_open(instance.date)
+
+
+@receiver(pre_delete, sender=Payment)
+def lock_closed_payment_delete(sender, instance, **kwargs):
+    if instance.is_paid:
+        ClosedPeriod.objects.check_open(instance.paid_date or instance.due_date)
+
+
+@receiver(pre_delete, sender=Expense)
+def lock_closed_expense_delete(sender, instance, **kwargs):
+    ClosedPeriod.objects.check_open(instance.date)
+
+
+@receiver(post_save, sender=Transaction)
+def update_daily_summary(sender, instance, **kwargs):
+    # Runs inside Transaction.save()'s atomic block
+    entry = instance.summary_entry()
+    delta = SummaryDelta()
+    delta.replace(getattr(instance, "_loaded", None), entry)
+    delta.apply()
+    instance._loaded = entry
+
+
+@receiver(post_delete, sender=Transaction)
+def remove_from_daily_summary(sender, instance, **kwargs):
+    delta = SummaryDelta()
+    delta.remove(getattr(instance, "_loaded", None) or instance.summary_entry())
+    delta.apply()
+
+
+@receiver(pre_delete, sender=PaymentSource)
+def fold_source_into_unassigned(sender, instance, **kwargs):
+    # The source's transactions are kept without a source (SET_NULL), so
+    # move its summary totals to the no-source rows before they cascade
+    delta = SummaryDelta()
+    for date, type_, total, count in instance.daily_summaries.values_list(
+        "date", "type", "total", "count"
+    ):
+        delta.change(date, None, type_, total, count)
+    delta.apply()
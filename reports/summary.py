@@ -0,0 +1,144 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection
+
+from .models import DailySourceSummary, SourceBalanceSnapshot, Transaction
+
+SUMMARY_TABLE = DailySourceSummary._meta.db_table
+SNAPSHOT_TABLE = SourceBalanceSnapshot._meta.db_table
+TRANSACTION_TABLE = Transaction._meta.db_table
+
+CHANGE_ROW = "(%s::date, %s::bigint, %s::varchar, %s::numeric, %s::integer)"
+
+# One statement: upsert the summary rows and shift every month-end balance
+# snapshot on or after each changed date. `{changes}` is a VALUES list or a
+# query of (date, source_id, type, total, count) rows
+UPSERT_SQL = f"""
+    WITH changes (date, source_id, type, total, count) AS ({{changes}}),
+    summary AS (
+        INSERT INTO {SUMMARY_TABLE} (date, source_id, type, total, count, updated_at)
+        SELECT date, source_id, type, total, count, clock_timestamp() FROM changes
+        ON CONFLICT (date, source_id, type) DO UPDATE
+        SET total = {SUMMARY_TABLE}.total + EXCLUDED.total,
+            count = {SUMMARY_TABLE}.count + EXCLUDED.count,
+            updated_at = EXCLUDED.updated_at
+    )
+    UPDATE {SNAPSHOT_TABLE} AS snapshot
+    SET balance = snapshot.balance + shift.net
+    FROM (
+        SELECT s.id,
+               SUM(CASE WHEN c.type = 'credit' THEN c.total ELSE -c.total END) AS net
+        FROM {SNAPSHOT_TABLE} s
+        JOIN changes c
+          ON s.source_id IS NOT DISTINCT FROM c.source_id AND s.month_end >= c.date
+        GROUP BY s.id
+    ) AS shift
+    WHERE snapshot.id = shift.id
+"""
+
+# Per-key totals straight from the transactions, shared by rebuild and verify
+AGGREGATE_SQL = f"""
+    SELECT date, source_id, type, SUM(amount) AS total, COUNT(*) AS count
+    FROM {TRANSACTION_TABLE}
+    GROUP BY date, source_id, type
+"""
+
+REBUILD_SQL = [
+    # Block transaction writes (but not reads) while the table is replaced
+    f"LOCK TABLE {TRANSACTION_TABLE} IN SHARE MODE",
+    f"DELETE FROM {SUMMARY_TABLE}",
+    f"""
+    INSERT INTO {SUMMARY_TABLE} (date, source_id, type, total, count, updated_at)
+    SELECT *, clock_timestamp() FROM ({AGGREGATE_SQL}) totals
+    """,
+]
+
+DRIFT_SQL = f"""
+    SELECT COALESCE(s.date, t.date), COALESCE(s.source_id, t.source_id),
+           COALESCE(s.type, t.type), COALESCE(s.total, 0), COALESCE(t.total, 0),
+           COALESCE(s.count, 0), COALESCE(t.count, 0)
+    FROM (SELECT * FROM {SUMMARY_TABLE} WHERE count <> 0 OR total <> 0) s
+    FULL OUTER JOIN ({AGGREGATE_SQL}) t
+      ON s.date = t.date
+     AND s.source_id IS NOT DISTINCT FROM t.source_id
+     AND s.type = t.type
+    WHERE s.total IS DISTINCT FROM t.total OR s.count IS DISTINCT FROM t.count
+    ORDER BY 1, 2, 3
+"""
+
+
+class SummaryDelta:
+    """Collects changes to `DailySourceSummary` (and so to the balance
+    snapshots) and writes them with one statement, however many
+    transactions were touched."""
+
+    def __init__(self):
+        self._changes = defaultdict(lambda: [Decimal("0"), 0])
+
+    def change(self, date, source_id, type_, total, count):
+        change = self._changes[date, source_id, type_]
+        change[0] += Decimal(str(total))
+        change[1] += count
+
+    def add(self, entry, sign=1):
+        """Count `entry` — a `(date, source_id, type, amount)` tuple as
+        returned by `Transaction.summary_entry()` — once more (or once
+        less, with `sign=-1`)."""
+        date, source_id, type_, amount = entry
+        self.change(date, source_id, type_, sign * Decimal(str(amount)), sign)
+
+    def remove(self, entry):
+        self.add(entry, sign=-1)
+
+    def touch(self, entry):
+        """Mark `entry`'s summary row as changed without changing it (a
+        transaction edit that leaves the totals alone)."""
+        date, source_id, type_, _ = entry
+        self.change(date, source_id, type_, 0, 0)
+
+    def replace(self, old_entry, new_entry):
+        if old_entry == new_entry:
+            self.touch(new_entry)
+            return
+        if old_entry is not None:
+            self.remove(old_entry)
+        self.add(new_entry)
+
+    def apply(self):
+        # Fixed key order so concurrent writers lock summary rows in the
+        # same sequence and can't deadlock
+        rows = sorted(
+            (
+                (date, source_id, type_, total, count)
+                for (date, source_id, type_), (total, count) in self._changes.items()
+            ),
+            key=lambda row: (row[0], row[1] or 0, row[2]),
+        )
+        self._changes.clear()
+        if not rows:
+            return
+        values = ", ".join([CHANGE_ROW] * len(rows))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                UPSERT_SQL.format(changes=f"VALUES {values}"),
+                [value for row in rows for value in row],
+            )
+
+
+def rebuild_summary():
+    """Recompute the whole rollup from `Transaction` (call inside a
+    transaction). Returns the number of summary rows written."""
+    with connection.cursor() as cursor:
+        for statement in REBUILD_SQL:
+            cursor.execute(statement)
+        return cursor.rowcount
+
+
+def find_drift():
+    """Rows where the rollup disagrees with the transactions, as
+    `(date, source_id, type, stored_total, actual_total, stored_count,
+    actual_count)` tuples."""
+    with connection.cursor() as cursor:
+        cursor.execute(DRIFT_SQL)
+        return cursor.fetchall()
@@ -1,3 +1,765 @@
-from django.test import TestCase
+import csv
+from datetime import date
+from decimal import Decimal
+import zipfile
+import re
+import zlib
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from django.conf import settings
+from django.forms import inlineformset_factory, model_to_dict
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import Buyer, User
+from bookings.admin import PaymentAdminForm, PaymentInlineFormSet
+from bookings.forms import BuyerForm, PlotForm
+from bookings.models import Booking, Payment, PaymentSource
+from bookings.services import post_payment, post_payments
+from bookings.tests import make_booking
+from expenses.models import Expense, ExpenseCategory
+from plots.models import Plot
+from .aging import aging_report
+from .balances import balances_as_of, create_snapshots, find_snapshot_drift
+from .forecast import ForecastInputs, cash_flow_forecast, collection_rates
+from .models import (
+    ClosedPeriod,
+    DailySourceSummary,
+    PeriodClosed,
+    PeriodTotal,
+    SourceBalanceSnapshot,
+    Transaction,
+)
+from .ledger import find_ledger_drift, repair_ledger
+from .pdf_report import Column, PDFReport, fit, money, write_pdf
+from .pdf_stream import text_width
+from .periods import LedgerRange, close_through, expense_totals, reopen_from
+from .summary import find_drift, rebuild_summary
+from .views import daily_range_transactions
+
+
+class DailySourceSummaryTests(TestCase):
+    def setUp(self):
+        self.cash = PaymentSource.objects.create(name="Cash")
+        self.bank = PaymentSource.objects.create(name="Bank")
+        self.category = ExpenseCategory.objects.create(name="Fuel")
+
+    def test_summary_follows_transaction_writes(self):
+        booking = make_booking(months=4, down_payment="10000.00")
+        payments = list(booking.payments.order_by("due_date"))
+        post_payment(payments[0].pk, source_id=self.cash.pk, paid_date="2025-01-10")
+        post_payments(
+            [
+                {"payment_id": payments[1].pk, "source_id": self.bank.pk},
+                {"payment_id": payments[2].pk, "paid_date": "2025-01-10"},
+            ]
+        )
+
+        expense = Expense.objects.create(
+            title="Diesel",
+            category=self.category,
+            amount=Decimal("1500.00"),
+            source=self.cash,
+            date=date(2025, 1, 10),
+        )
+        expense.amount = Decimal("1750.00")
+        expense.source = self.bank
+        expense.date = date(2025, 1, 11)
+        expense.save()
+
+        Transaction.objects.filter(related_payment=payments[2]).delete()
+        self.assertEqual(find_drift(), [])
+
+        totals = DailySourceSummary.objects.in_range(
+            date(2025, 1, 10), date(2025, 1, 10), self.cash.pk
+        ).totals()
+        self.assertEqual(totals["credit"], payments[0].amount)
+        self.assertEqual(totals["count"], 1)
+
+    def test_deleting_a_source_keeps_its_totals_unassigned(self):
+        Expense.objects.create(
+            title="Rent", category=self.category, amount=Decimal("900.00"), source=self.cash
+        )
+        self.cash.delete()
+        self.assertEqual(find_drift(), [])
+        self.assertEqual(
+            DailySourceSummary.objects.get(source=None, type="debit").total,
+            Decimal("900.00"),
+        )
+
+    def test_rebuild_matches_incremental_rows(self):
+        make_booking(months=2, down_payment="5000.00")
+        fields = ("date", "source", "type", "total", "count")
+        before = set(DailySourceSummary.objects.values_list(*fields))
+        rebuild_summary()
+        self.assertEqual(set(DailySourceSummary.objects.values_list(*fields)), before)
+
+
+class BalanceSnapshotTests(TestCase):
+    def setUp(self):
+        self.cash = PaymentSource.objects.create(name="Cash")
+        self.bank = PaymentSource.objects.create(name="Bank")
+        for day, type_, amount, source in [
+            (date(2025, 1, 5), "credit", "1000.00", self.cash),
+            (date(2025, 1, 20), "debit", "300.00", self.cash),
+            (date(2025, 2, 10), "credit", "500.00", self.bank),
+            (date(2025, 3, 1), "credit", "200.00", None),
+            (date(2025, 3, 15), "debit", "50.00", self.cash),
+        ]:
+            Transaction.objects.create(date=day, type=type_, amount=Decimal(amount), source=source)
+        create_snapshots(date(2025, 4, 2))
+
+    def brute_force(self, day):
+        balances = {}
+        for t in Transaction.objects.filter(date__lte=day):
+            signed = t.amount if t.type == "credit" else -t.amount
+            balances[t.source_id] = balances.get(t.source_id, 0) + signed
+        return balances
+
+    def assertBalancesMatch(self, day):
+        computed = {k: v for k, v in balances_as_of(day).items() if v}
+        expected = {k: v for k, v in self.brute_force(day).items() if v}
+        self.assertEqual(computed, expected)
+
+    def test_month_end_snapshots(self):
+        self.assertEqual(
+            SourceBalanceSnapshot.objects.get(source=self.cash, month_end=date(2025, 2, 28)).balance,
+            Decimal("700.00"),
+        )
+        # Jan, Feb, Mar for Cash, Bank and "no source"
+        self.assertEqual(SourceBalanceSnapshot.objects.count(), 9)
+
+    def test_as_of_balances(self):
+        for day in [date(2024, 12, 31), date(2025, 1, 31), date(2025, 2, 15), date(2025, 4, 30)]:
+            self.assertBalancesMatch(day)
+        with self.assertNumQueries(2):
+            balances_as_of(date(2025, 3, 20))
+
+    def test_backdated_change_moves_later_snapshots(self):
+        backdated = Transaction.objects.create(
+            date=date(2025, 1, 7), type="debit", amount=Decimal("100.00"), source=self.cash
+        )
+        self.assertEqual(
+            SourceBalanceSnapshot.objects.get(source=self.cash, month_end=date(2025, 3, 31)).balance,
+            Decimal("550.00"),
+        )
+        backdated.source = self.bank
+        backdated.save()
+        Transaction.objects.filter(amount=Decimal("1000.00")).delete()
+
+        self.assertEqual(find_snapshot_drift(date(2025, 4, 2)), [])
+        self.assertBalancesMatch(date(2025, 3, 31))
+
+
+class AgingReportTests(TestCase):
+    as_of = date(2025, 6, 30)
+
+    def setUp(self):
+        self.first = make_booking(months=3, suffix="1")
+        self.second = make_booking(months=3, suffix="2")
+        self.second.plot.block_name = "B"
+        self.second.plot.plot_type = "commercial"
+        self.second.plot.save()
+        for booking, due_dates in [
+            # current, 29 days (1-30), 121 days (90+)
+            (self.first, [date(2025, 6, 30), date(2025, 6, 1), date(2025, 3, 1)]),
+            # 60 days (31-60), 90 days (61-90), paid
+            (self.second, [date(2025, 5, 1), date(2025, 4, 1), date(2025, 1, 1)]),
+        ]:
+            for payment, due_date in zip(booking.payments.order_by("id"), due_dates):
+                payment.due_date = due_date
+                payment.save()
+        post_payment(self.second.payments.get(due_date=date(2025, 1, 1)).pk)
+
+    def test_buckets_per_booking(self):
+        with self.assertNumQueries(1):
+            totals, rows = aging_report(self.as_of)
+        by_booking = {row["key"]: row for row in rows}
+        self.assertEqual(
+            by_booking[self.first.pk]["buckets"],
+            [0, Decimal("30000.00"), Decimal("30000.00"), 0, 0, Decimal("30000.00")],
+        )
+        self.assertEqual(by_booking[self.first.pk]["days_overdue"], 121)
+        self.assertEqual(
+            by_booking[self.second.pk]["buckets"],
+            [0, 0, 0, Decimal("30000.00"), Decimal("30000.00"), 0],
+        )
+        self.assertEqual(totals["overdue"], Decimal("120000.00"))
+        self.assertEqual(totals["total"], Decimal("150000.00"))
+        self.assertEqual(totals["payments"], 5)
+
+    def test_only_the_next_30_days_are_current(self):
+        booking = make_booking(months=2, suffix="3")
+        for payment, due_date in zip(
+            booking.payments.order_by("id"), [date(2025, 7, 29), date(2025, 7, 30)]
+        ):
+            payment.due_date = due_date
+            payment.save()
+        totals, rows = aging_report(self.as_of)
+        row = next(row for row in rows if row["key"] == booking.pk)
+        self.assertEqual(row["buckets"], [Decimal("45000.00"), Decimal("45000.00"), 0, 0, 0, 0])
+        self.assertEqual(row["overdue"], 0)
+        self.assertEqual(row["total"], Decimal("90000.00"))
+        self.assertEqual(totals["not_due"], Decimal("45000.00"))
+        self.assertEqual(totals["current"], Decimal("75000.00"))
+
+    def test_groupings_and_filters(self):
+        totals, rows = aging_report(self.as_of, "block")
+        self.assertEqual(
+            {row["label"]: row["overdue"] for row in rows},
+            {"—": Decimal("60000.00"), "B": Decimal("60000.00")},
+        )
+        totals, rows = aging_report(self.as_of, "buyer", plot_type="commercial")
+        self.assertEqual([row["label"] for row in rows], ["Buyer 2"])
+        self.assertEqual(totals["total"], Decimal("60000.00"))
+
+        totals, rows = aging_report(self.as_of, "plot_type", limit=1)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(totals["total"], Decimal("150000.00"))
+
+    def test_outputs(self):
+        params = {"as_of": "2025-06-30", "group_by": "block"}
+        names = ["receivables_aging", "export_aging_csv", "download_aging_pdf"]
+        # Buyers' names, CNICs and balances are for signed-in users only
+        for name in names:
+            response = self.client.get(reverse(name), {**params, "group_by": "buyer"})
+            self.assertEqual(response.status_code, 302)
+        self.client.force_login(User.objects.create(username="clerk"))
+        for name in names:
+            response = self.client.get(reverse(name), params)
+            self.assertEqual(response.status_code, 200)
+        csv_lines = self.client.get(reverse("export_aging_csv"), params).content.decode().splitlines()
+        self.assertEqual(csv_lines[-1].split(",")[:2], ["Total", ""])
+
+
+class CashFlowForecastTests(TestCase):
+    as_of = date(2025, 6, 15)
+
+    def setUp(self):
+        booking = make_booking(months=3)
+        for payment, due_date in zip(
+            booking.payments.order_by("id"),
+            # 45 days overdue (31-60), due next month, beyond 12 months
+            [date(2025, 5, 1), date(2025, 7, 10), date(2026, 8, 1)],
+        ):
+            payment.due_date = due_date
+            payment.save()
+
+    def test_roll_rate_projection(self):
+        rates = collection_rates(
+            {
+                "current": 0.5,
+                "days_1_30": 0.5,
+                "days_31_60": 0.2,
+                "days_61_90": 0.1,
+                "days_over_90": 0,
+            }
+        )
+        forecast = cash_flow_forecast(ForecastInputs.load(self.as_of), rates)
+        expected = forecast["expected"]
+        self.assertEqual(forecast["months"][1], date(2025, 7, 1))
+        self.assertEqual(forecast["scheduled"][:2], [30000, 30000])
+        # Overdue: 20% in June, then 10% of the rest, then nothing
+        self.assertAlmostEqual(expected[0], 6000)
+        # July: 10% of what is left of the overdue one plus 50% of July's
+        self.assertAlmostEqual(expected[1], 2400 + 15000)
+        # Then July's remainder at 50%, 20% and 10%
+        self.assertAlmostEqual(expected[2], 7500)
+        self.assertAlmostEqual(expected[3], 1500)
+        self.assertAlmostEqual(expected[4], 600)
+        self.assertAlmostEqual(forecast["expected_total"], 33000)
+        self.assertAlmostEqual(forecast["outstanding"], 60000)
+        self.assertAlmostEqual(
+            sum(row["total"] for row in forecast["by_plot_type"]), forecast["expected_total"]
+        )
+
+    def test_full_collection_matches_schedule(self):
+        rates = collection_rates({bucket: 1 for bucket in settings.FORECAST_COLLECTION_RATES})
+        forecast = cash_flow_forecast(ForecastInputs.load(self.as_of), rates)
+        self.assertEqual(forecast["expected"], forecast["scheduled"])
+        self.assertEqual([row["label"] for row in forecast["by_source"]], [None])
+
+    def test_page_accepts_what_if_rates(self):
+        response = self.client.get(
+            reverse("cash_flow_forecast"), {"rate_current": "95", "rate_days_1_30": "x"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["forecast"]["rates"]["current"], 0.95)
+
+
+class ConditionalReportTests(TestCase):
+    def setUp(self):
+        self.cash = PaymentSource.objects.create(name="Cash")
+        self.credit = Transaction.objects.create(
+            date=date(2025, 1, 10), type="credit", amount=Decimal("1000.00"), source=self.cash
+        )
+        self.url = reverse("daily_report") + "?date=2025-01-10"
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+
+    def test_unchanged_daily_report_is_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("no-cache", response["Cache-Control"])
+        self.assertIn("Last-Modified", response)
+
+        # Only the fingerprint queries run
+        with self.assertNumQueries(3):
+            again = self.revalidate(self.url, response)
+        self.assertEqual(again.status_code, 304)
+
+        # Later transactions don't touch a past day's report
+        Transaction.objects.create(date=date(2025, 2, 1), type="debit", amount=Decimal("5.00"))
+        self.assertEqual(self.revalidate(self.url, response).status_code, 304)
+
+    def test_changes_up_to_the_day_invalidate(self):
+        response = self.client.get(self.url)
+
+        # An edit that leaves the totals alone still counts
+        self.credit.description = "Corrected"
+        self.credit.save()
+        response = self.revalidate(self.url, response)
+        self.assertEqual(response.status_code, 200)
+
+        # Back-dated entries move the opening balance
+        Transaction.objects.create(date=date(2025, 1, 2), type="debit", amount=Decimal("5.00"))
+        response = self.revalidate(self.url, response)
+        self.assertEqual(response.status_code, 200)
+
+        Transaction.objects.filter(date=date(2025, 1, 2)).delete()
+        self.assertEqual(self.revalidate(self.url, response).status_code, 200)
+
+    def test_pdfs_and_earnings(self):
+        pdf_url = reverse("download_daily_report_pdf") + "?date=2025-01-10"
+        response = self.client.get(pdf_url)
+        self.assertEqual(self.revalidate(pdf_url, response).status_code, 304)
+
+        earnings_url = reverse("earnings_page") + "?start_date=2025-01-01&end_date=2025-01-31"
+        response = self.client.get(earnings_url)
+        self.assertEqual(self.revalidate(earnings_url, response).status_code, 304)
+        # Pending installments are on the page too
+        booking = make_booking(months=2, down_payment="0.00")
+        self.assertEqual(self.revalidate(earnings_url, response).status_code, 200)
+
+        booking_url = reverse("download_booking_pdf", args=[booking.pk])
+        response = self.client.get(booking_url)
+        self.assertEqual(self.revalidate(booking_url, response).status_code, 304)
+        post_payment(booking.payments.first().pk, source_id=self.cash.pk)
+        self.assertEqual(self.revalidate(booking_url, response).status_code, 200)
+
+    def test_earnings_etags_skip_the_portfolio_totals(self):
+        booking = make_booking(months=2, down_payment="0.00")
+        for url in (
+            reverse("earnings_page") + "?start_date=2025-01-01&end_date=2025-01-31",
+            reverse("download_earnings_pdf") + "?start_date=2025-01-01&end_date=2025-01-31",
+        ):
+            response = self.client.get(url)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.revalidate(url, response).status_code, 304)
+            sql = " ".join(query["sql"] for query in queries)
+            self.assertNotIn(f'"{Payment._meta.db_table}"', sql)
+
+            # Paying an installment changes the pending total
+            payment = booking.payments.filter(is_paid=False).first()
+            post_payment(payment.pk, source_id=self.cash.pk)
+            self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+
+class ClosedPeriodTests(TestCase):
+    def setUp(self):
+        self.cash = PaymentSource.objects.create(name="Cash")
+        self.category = ExpenseCategory.objects.create(name="Fuel")
+        self.booking = make_booking(months=3)
+        self.payments = list(self.booking.payments.order_by("due_date"))
+        post_payment(self.payments[0].pk, source_id=self.cash.pk, paid_date="2025-01-10")
+        self.expense = Expense.objects.create(
+            title="Diesel", category=self.category, amount=Decimal("700.00"), date=date(2025, 1, 20)
+        )
+        Expense.objects.create(
+            title="Refund", category=self.category, type="credit", amount=Decimal("50.00"),
+            source=self.cash, date=date(2025, 2, 3),
+        )
+        Transaction.objects.create(date=date(2025, 3, 5), type="debit", amount=Decimal("10.00"))
+        call_command("close_period", "--through", "2025-01", stdout=StringIO())
+
+    def test_closing_stores_totals(self):
+        period = ClosedPeriod.objects.get()
+        self.assertEqual((period.start_date, period.end_date), (date(2025, 1, 1), date(2025, 1, 31)))
+        self.assertEqual(
+            set(period.totals.values_list("source_id", "type", "total", "count")),
+            {
+                (self.cash.pk, "credit", self.payments[0].amount, 1),
+                (None, "debit", Decimal("700.00"), 1),
+            },
+        )
+        self.assertEqual(
+            list(period.expense_totals.values_list("category_id", "type", "total")),
+            [(self.category.pk, "expense", Decimal("700.00"))],
+        )
+
+        with self.assertRaises(ValidationError):
+            close_through(date(2025, 1, 31))
+        with self.assertRaises(ValidationError):
+            close_through(date(2025, 2, 27))
+        self.assertEqual(len(close_through(date(2025, 2, 28))), 1)
+
+    def test_closed_entries_are_locked(self):
+        with self.assertRaises(PeriodClosed):
+            Transaction.objects.create(date=date(2025, 1, 31), type="debit", amount=Decimal("1.00"))
+        self.expense.amount = Decimal("800.00")
+        with self.assertRaises(PeriodClosed):
+            self.expense.save()
+        # Deletes fail inside the collector's transaction
+        with self.assertRaises(PeriodClosed), transaction.atomic():
+            self.expense.delete()
+        self.payments[0].refresh_from_db()
+        with self.assertRaises(PeriodClosed), transaction.atomic():
+            self.payments[0].delete()
+        # Moving an open entry into a closed month is an edit of it too
+        credit = Transaction.objects.get(date=date(2025, 3, 5))
+        credit.date = date(2025, 1, 5)
+        with self.assertRaises(PeriodClosed):
+            credit.save()
+        with self.assertRaises(ValidationError):
+            post_payment(self.payments[1].pk, paid_date="2025-01-15")
+        posted, results = post_payments([{"payment_id": self.payments[1].pk, "paid_date": "2025-01-15"}])
+        self.assertEqual((posted, results[0]["status"]), (0, "error"))
+
+        # Open months are unaffected, and reopening unlocks
+        post_payment(self.payments[1].pk, paid_date="2025-02-01")
+        self.assertEqual(reopen_from(date(2025, 1, 1)), 1)
+        self.expense.save()
+        self.assertEqual(find_drift(), [])
+
+    def test_back_dated_booking_is_a_form_error(self):
+        self.client.force_login(User.objects.create(username="manager", is_staff=True))
+        buyer = Buyer.objects.get()
+        plot = Plot.objects.create(title="Plot 2", location="Block A", price=Decimal("50000.00"))
+        data = {"buyer_select": buyer.pk, "plot_select": plot.pk}
+        for prefix, form, instance in [("buyer", BuyerForm, buyer), ("plot", PlotForm, plot)]:
+            for name, value in model_to_dict(instance, fields=form._meta.fields).items():
+                if value is not None:
+                    data[f"{prefix}-{name}"] = value
+        data.update(
+            {
+                "booking-start_date": "2025-01-15",
+                "booking-installment_months": 5,
+                "booking-down_payment_amount": "10000.00",
+                "booking-monthly_installment": "8000.00",
+                "booking-source": self.cash.pk,
+            }
+        )
+        response = self.client.post(reverse("create_booking_combined"), data)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("closed", str(response.context["booking_form"].errors["start_date"]))
+        self.assertEqual(Booking.objects.count(), 1)
+
+        # Without a down payment nothing is entered in the ledger
+        data["booking-down_payment_amount"] = "0"
+        response = self.client.post(reverse("create_booking_combined"), data)
+        self.assertEqual(response.status_code, 302)
+
+    def test_admin_shows_closed_months_as_form_errors(self):
+        self.client.force_login(
+            User.objects.create(username="admin", is_staff=True, is_superuser=True)
+        )
+        url = reverse("admin:expenses_expense_change", args=[self.expense.pk])
+        data = model_to_dict(self.expense, exclude=["id"])
+        data.update(amount="800.00", source="", description="")
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("closed", str(response.context["adminform"].form.errors["date"]))
+        delete_url = reverse("admin:expenses_expense_delete", args=[self.expense.pk])
+        self.assertEqual(self.client.get(delete_url).status_code, 403)
+
+        # Un-posting or deleting a closed installment
+        booking_url = reverse("admin:bookings_booking_change", args=[self.booking.pk])
+        self.assertEqual(self.client.get(booking_url).status_code, 200)
+        payment = self.payments[0]
+        payment.refresh_from_db()
+        form = PaymentAdminForm(
+            {**model_to_dict(payment), "is_paid": False, "source": self.cash.pk}, instance=payment
+        )
+        self.assertIn("closed", str(form.errors))
+        formset_class = inlineformset_factory(
+            Booking, Payment, form=PaymentAdminForm, formset=PaymentInlineFormSet, extra=0
+        )
+        data = {"payments-TOTAL_FORMS": 1, "payments-INITIAL_FORMS": 1}
+        payment.refresh_from_db()
+        for name, value in model_to_dict(payment).items():
+            if value is not None:
+                data[f"payments-0-{name}"] = value
+        data["payments-0-DELETE"] = "on"
+        formset = formset_class(
+            data, instance=self.booking, queryset=Payment.objects.filter(pk=payment.pk)
+        )
+        self.assertFalse(formset.is_valid())
+        self.assertIn("closed", str(formset.non_form_errors()))
+
+    def test_reports_read_stored_totals(self):
+        for start, end, source in [
+            (None, None, None),
+            (date(2025, 1, 1), date(2025, 2, 28), None),
+            (date(2025, 1, 15), date(2025, 3, 31), None),
+            (None, date(2025, 1, 31), self.cash.pk),
+        ]:
+            ledger = LedgerRange(start, end, source)
+            summaries = DailySourceSummary.objects.in_range(start, end, source)
+            self.assertEqual(ledger.totals(), summaries.totals())
+            self.assertEqual(ledger.by_source(), summaries.by_source())
+        self.assertEqual(
+            expense_totals(date(2025, 1, 1), None, category_id=self.category.pk),
+            {"expense": Decimal("700.00"), "credit": Decimal("50.00")},
+        )
+
+        # Only the stored row is read for the closed month
+        PeriodTotal.objects.filter(type="debit").update(total=Decimal("1.00"))
+        self.assertEqual(LedgerRange(date(2025, 1, 1), date(2025, 1, 31)).totals()["debit"], 1)
+
+
+class LedgerRepairTests(TestCase):
+    def setUp(self):
+        self.cash = PaymentSource.objects.create(name="Cash")
+        self.booking = make_booking(months=4, down_payment="10000.00")
+        self.payments = list(self.booking.payments.order_by("due_date"))
+        for payment in self.payments[:2]:
+            post_payment(payment.pk, source_id=self.cash.pk, paid_date="2025-02-10")
+        category = ExpenseCategory.objects.create(name="Fuel")
+        self.expense = Expense.objects.create(
+            title="Diesel", category=category, amount=Decimal("700.00"), date=date(2025, 1, 20)
+        )
+        # A manual entry: not derived, so never touched
+        Transaction.objects.create(date=date(2025, 2, 1), type="debit", amount=Decimal("5.00"))
+
+    def corrupt(self):
+        """Writes that skip the signals."""
+        Payment.objects.filter(pk=self.payments[0].pk).update(amount=Decimal("1.00"))
+        Payment.objects.filter(pk=self.payments[1].pk).update(is_paid=False)
+        Payment.objects.filter(pk=self.payments[2].pk).update(
+            is_paid=True, paid_date=date(2025, 3, 1)
+        )
+        Expense.objects.filter(pk=self.expense.pk).update(title="Petrol")
+        copy = Transaction.objects.get(related_expense=self.expense)
+        copy.pk = None
+        Transaction.objects.bulk_create([copy])
+
+    def test_verify_and_fix(self):
+        self.assertEqual(find_ledger_drift(), ({}, []))
+        self.corrupt()
+        counts, sample = find_ledger_drift()
+        self.assertEqual(
+            counts,
+            {
+                ("expense", "changed"): 1,
+                ("expense", "duplicate"): 1,
+                ("payment", "changed"): 1,
+                ("payment", "missing"): 1,
+                ("payment", "unexpected"): 1,
+            },
+        )
+        self.assertEqual(len(sample), 5)
+
+        repaired, skipped = repair_ledger()
+        self.assertEqual((repaired, skipped), (counts, 0))
+        self.assertEqual(find_ledger_drift(), ({}, []))
+        self.assertEqual(find_drift(), [])
+        self.assertEqual(Transaction.objects.get(related_payment=self.payments[0]).amount, 1)
+        self.assertEqual(Transaction.objects.filter(related_expense=self.expense).count(), 1)
+        self.assertTrue(Transaction.objects.filter(amount=Decimal("5.00")).exists())
+
+    def test_fix_leaves_closed_months(self):
+        close_through(date(2025, 1, 31))
+        self.corrupt()
+        repaired, skipped = repair_ledger()
+        self.assertEqual(skipped, 2)
+        self.assertEqual(
+            find_ledger_drift()[0], {("expense", "changed"): 1, ("expense", "duplicate"): 1}
+        )
+        self.assertEqual(Transaction.objects.filter(date=date(2025, 1, 20)).count(), 2)
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_ledger", "--verify", stdout=StringIO())
+
+
+class EarningsExportTests(TestCase):
+    def setUp(self):
+        self.cash = PaymentSource.objects.create(name="Cash")
+        self.url = "?start_date=2025-01-01&end_date=2025-01-31"
+        self.client.force_login(User.objects.create(username="accountant"))
+
+    def add(self, count):
+        # One by one, so the daily summary the totals read is kept in step
+        for i in range(count):
+            Transaction.objects.create(
+                date=date(2025, 1, 1 + i % 28),
+                type="debit" if i % 4 == 0 else "credit",
+                amount=Decimal("10.00") + i,
+                source=self.cash,
+                description=f"Entry {i}",
+            )
+        # Outside the range
+        Transaction.objects.create(date=date(2025, 2, 1), type="credit", amount=Decimal("1.00"))
+
+    def export(self, name):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(name) + self.url)
+            self.assertTrue(response.streaming)
+            content = b"".join(response.streaming_content)
+        return content, len(queries)
+
+    def test_exports_require_login(self):
+        self.client.logout()
+        for name in ["export_earnings_csv", "export_earnings_pdf"]:
+            response = self.client.get(reverse(name) + self.url)
+            self.assertEqual(response.status_code, 302)
+            self.assertFalse(response.streaming)
+
+    def test_csv_rows_and_running_balance(self):
+        self.add(3)
+        _, small = self.export("export_earnings_csv")
+        Transaction.objects.all().delete()
+        self.add(40)
+        content, queries = self.export("export_earnings_csv")
+        self.assertEqual(queries, small)
+
+        header, *rows = csv.reader(content.decode().splitlines())
+        self.assertEqual(header[0], "Date")
+        self.assertEqual(len(rows), 40)
+        credit = sum(Decimal(row[4]) for row in rows if row[4])
+        debit = sum(Decimal(row[5]) for row in rows if row[5])
+        totals = LedgerRange(date(2025, 1, 1), date(2025, 1, 31)).totals()
+        self.assertEqual((credit, debit), (totals["credit"], totals["debit"]))
+        self.assertEqual(Decimal(rows[-1][6]), credit - debit)
+        self.assertEqual([row[0] for row in rows], sorted(row[0] for row in rows))
+
+    def test_pdf_rows_and_totals(self):
+        self.add(3)
+        _, small = self.export("export_earnings_pdf")
+        Transaction.objects.all().delete()
+        self.add(200)
+        content, queries = self.export("export_earnings_pdf")
+        self.assertEqual(queries, small)
+
+        texts = [text for page in pdf_page_texts(content) for text in page]
+        self.assertEqual(sum(text.startswith("Entry ") for text in texts), 200)
+        totals = LedgerRange(date(2025, 1, 1), date(2025, 1, 31)).totals()
+        self.assertIn("Transactions: 200", texts)
+        self.assertIn(f"Total Credit (Income): Rs {totals['credit']}", texts)
+        self.assertIn(f"Net Balance: Rs {totals['credit'] - totals['debit']}", texts)
+
+
+class DailyRangeReportTests(TestCase):
+    def setUp(self):
+        self.cash = PaymentSource.objects.create(name="Cash")
+        for day, type_, amount in [
+            (date(2025, 1, 1), "debit", "5.00"),
+            (date(2025, 1, 1), "credit", "100.00"),
+            (date(2025, 1, 3), "credit", "40.00"),
+        ]:
+            Transaction.objects.create(
+                date=day, type=type_, amount=Decimal(amount), source=self.cash
+            )
+        self.url = reverse("download_daily_report_pdf") + "?start_date=2025-01-01&end_date=2025-01-03"
+
+    def test_days_from_one_cursor(self):
+        with self.assertNumQueries(1):
+            days = [
+                (day, [(type_, amount) for type_, _, _, _, amount in rows])
+                for day, rows in daily_range_transactions(date(2025, 1, 1), date(2025, 1, 3))
+            ]
+        self.assertEqual(
+            days,
+            [
+                (date(2025, 1, 1), [("credit", Decimal("100.00")), ("debit", Decimal("5.00"))]),
+                (date(2025, 1, 2), []),
+                (date(2025, 1, 3), [("credit", Decimal("40.00"))]),
+            ],
+        )
+
+    def test_combined_pdf_and_zip(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        content = b"".join(response.streaming_content)
+        self.assertTrue(content.startswith(b"%PDF"))
+        # A page per day and one for the range summary
+        self.assertEqual(content.count(b"/Type /Page "), 4)
+
+        response = self.client.get(self.url + "&format=zip")
+        self.assertEqual(response["Content-Type"], "application/zip")
+        with zipfile.ZipFile(BytesIO(response.content)) as archive:
+            self.assertEqual(
+                archive.namelist(),
+                [
+                    "Daily_Report_2025-01-01.pdf",
+                    "Daily_Report_2025-01-02.pdf",
+                    "Daily_Report_2025-01-03.pdf",
+                    "Daily_Reports_Summary_2025-01-01_2025-01-03.pdf",
+                ],
+            )
+
+
+def pdf_page_texts(content):
+    """The strings drawn on each page of a `StreamingPDF` document."""
+    pages = []
+    for match in re.finditer(rb"/Length (\d+) /Filter /FlateDecode >>\nstream\n", content):
+        data = content[match.end() : match.end() + int(match.group(1))]
+        pages.append(
+            [
+                re.sub(rb"\\(.)", rb"\1", text).decode("cp1252")
+                for text in re.findall(rb"\((.*?)(?<!\\)\) Tj", zlib.decompress(data))
+            ]
+        )
+    return pages
+
+
+class PDFReportTests(SimpleTestCase):
+    columns = [
+        Column("Description"),
+        Column("Source", 60),
+        Column("Amount", 80, align="right", format=money, total=True),
+    ]
+
+    def render(self, rows, **kwargs):
+        report = PDFReport("Test")
+        report.title("Test Report", "Subtitle")
+        fp = BytesIO()
+        write_pdf([*report.table(self.columns, rows, **kwargs), report.finish()], fp)
+        return pdf_page_texts(fp.getvalue())
+
+    def test_header_on_every_page_and_totals(self):
+        rows = [(f"Row {i}", "Cash", Decimal("1.50")) for i in range(150)]
+        pages = self.render(rows)
+        self.assertGreater(len(pages), 1)
+        self.assertEqual(
+            pages[0][:6], ["Page 1", "Test Report", "Subtitle", "Description", "Source", "Amount"]
+        )
+        for number, texts in enumerate(pages[1:], 2):
+            self.assertEqual(texts[:4], [f"Page {number}", "Description", "Source", "Amount"])
+        drawn = [text for texts in pages for text in texts if text.startswith("Row ")]
+        self.assertEqual(drawn, [f"Row {i}" for i in range(150)])
+        self.assertEqual(pages[-1][-2:], ["Total", "Rs 225.00"])
+
+    def test_cells_are_cut_to_their_column(self):
+        text = fit("Installment from Muhammad Abdullah Khan", "Helvetica", 8, 54)
+        self.assertTrue(text.endswith("…"))
+        self.assertLessEqual(text_width(text, "Helvetica", 8), 54)
+        self.assertEqual(fit("Cash", "Helvetica", 8, 54), "Cash")
+
+        pages = self.render([("Plot sale", "Installment from Muhammad Abdullah Khan", None)])
+        self.assertEqual(pages[0][-4:], ["Plot sale", text, "Total", "Rs 0"])
+
+    def test_footer_function(self):
+        net = [Decimal("0")]
+
+        def rows():
+            for title, amount in [("Diesel", Decimal("700.00")), ("Refund", Decimal("200.00"))]:
+                net[0] += amount if title == "Diesel" else -amount
+                yield title, "Cash", amount
+
+        pages = self.render(rows(), footer=lambda: ["Net", None, money(net[0])])
+        self.assertEqual(pages[0][-2:], ["Net", "Rs 500.00"])
@@ -4,7 +4,13 @@ from . import views
 urlpatterns = [
     path("earnings/", views.earnings_page, name="earnings_page"),
     path("earnings/download-pdf/", views.download_earnings_pdf, name="download_earnings_pdf"),
+    path("earnings/export/csv/", views.export_earnings_csv, name="export_earnings_csv"),
+    path("earnings/export/pdf/", views.export_earnings_pdf, name="export_earnings_pdf"),
     path("daily/", views.daily_report, name="daily_report"),
         path("daily/pdf/", views.download_daily_report_pdf, name="download_daily_report_pdf"),
+    path("aging/", views.receivables_aging, name="receivables_aging"),
+    path("aging/export/csv/", views.export_aging_csv, name="export_aging_csv"),
+    path("aging/pdf/", views.download_aging_pdf, name="download_aging_pdf"),
+    path("forecast/", views.forecast_page, name="cash_flow_forecast"),
 
 ]
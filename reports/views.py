@@ -1,16 +1,31 @@
+import csv
+import hashlib
+import zipfile
+from decimal import Decimal
+from itertools import groupby
+from operator import itemgetter
+
+from django.contrib.auth.decorators import login_required
+from django.middleware.csrf import get_token
 from django.shortcuts import render
-from django.http import HttpResponse
-from django.db.models import Sum, Q
+from django.http import HttpResponse, StreamingHttpResponse
+from django.db.models import Count, Sum
 from django.utils import timezone
-from datetime import datetime
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.units import inch
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from datetime import datetime, timedelta
+from reportlab.lib.pagesizes import A4, landscape
 
 from bookings.models import Booking, Payment, PaymentSource
+from installments.metrics import pdf_render_timer
 from plots.models import Plot
 from expenses.models import Expense
-from .models import Transaction  # ✅ NEW
+from .models import DailySourceSummary, Transaction
+from .aging import AGING_BUCKETS, AGING_GROUPINGS, DUE_BUCKETS, aging_report
+from .balances import balances_as_of, source_balance_rows
+from .forecast import ForecastInputs, cash_flow_forecast, collection_rates
+from .pdf_report import BOLD, Column, PDFReport, amount, money, write_pdf
+from .periods import LedgerRange, closing_state
 
 
 # ------------------------------------------------
@@ -30,9 +45,112 @@ def parse_flexible_date(date_str):
     return timezone.now().date()
 
 
+# ------------------------------------------------
+# Conditional GET
+# ------------------------------------------------
+# Reports are keyed on cheap fingerprints of the data they show, so an
+# unchanged report is answered with 304 Not Modified before any of its
+# aggregates run. Browsers must revalidate every time (no-cache).
+revalidate = cache_control(private=True, no_cache=True)
+
+
+def _etag(*parts):
+    return hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+
+
+def _page_parts(request):
+    # HTML pages embed the user's menu and a CSRF token. get_token() makes
+    # sure the secret exists now, so the first response's ETag stays valid
+    get_token(request)
+    return request.user.pk, request.META["CSRF_COOKIE"]
+
+
+def ledger_fingerprint(request, end_date, source_id=None):
+    """Fingerprint of every transaction dated up to `end_date` (what a
+    report's totals and opening balances are built from): the state of the
+    closed months plus the daily rollup rows after them. Cached on the
+    request for the ETag and Last-Modified checks."""
+    cache = request.__dict__.setdefault("_ledger_fingerprints", {})
+    if (end_date, source_id) not in cache:
+        closing = closing_state()
+        open_rows = DailySourceSummary.objects.in_range(
+            closing["through"] and closing["through"] + timedelta(days=1), end_date, source_id
+        ).fingerprint()
+        changed = [day for day in (closing["closed_at"], open_rows["changed"]) if day]
+        cache[end_date, source_id] = {
+            **open_rows,
+            "closed_through": closing["through"],
+            "changed": max(changed, default=None),
+        }
+    return cache[end_date, source_id]
+
+
+def portfolio_totals():
+    """Sold plot value and pending installments, as shown on the earnings
+    page."""
+    return (
+        Plot.objects.filter(status="sold").aggregate(total=Sum("price"))["total"] or 0,
+        Payment.objects.filter(is_paid=False).aggregate(total=Sum("amount"))["total"] or 0,
+    )
+
+
+def _bookings_probe():
+    # Stands in for the portfolio totals (sold plot value, pending
+    # installments) in the earnings ETags: posting a payment bumps its
+    # booking's version and a booking made or removed changes the count.
+    # The sum moves on every bump, where the max would not.
+    return Booking.objects.aggregate(count=Count("*"), versions=Sum("version"))
+
+
+def _source_names():
+    return list(PaymentSource.objects.order_by("pk").values_list("pk", "name", "is_active"))
+
+
+def _earnings_fingerprint(request):
+    params = request.GET
+    source_id = params.get("source")
+    source_id = int(source_id) if source_id and source_id.isdigit() else None
+    return (
+        ledger_fingerprint(request, parse_flexible_date(params.get("end_date")), source_id),
+        _bookings_probe(),
+        _source_names(),
+    )
+
+
+def earnings_page_etag(request):
+    return _etag(*_page_parts(request), _earnings_fingerprint(request))
+
+
+def earnings_pdf_etag(request):
+    return _etag(_earnings_fingerprint(request))
+
+
+def _daily_last_day(params):
+    days = daily_report_range(params)
+    return days[1] if days else parse_flexible_date(params.get("date"))
+
+
+def _daily_fingerprint(request):
+    return ledger_fingerprint(request, _daily_last_day(request.GET)), _source_names()
+
+
+def daily_report_etag(request):
+    return _etag(*_page_parts(request), _daily_fingerprint(request))
+
+
+def daily_report_pdf_etag(request):
+    return _etag(_daily_fingerprint(request))
+
+
+def daily_report_last_modified(request):
+    return ledger_fingerprint(request, _daily_last_day(request.GET))["changed"]
+
+
 # ------------------------------------------------
 # Earnings Overview (Using Transactions)
 # ------------------------------------------------
+@revalidate
+@condition(etag_func=earnings_page_etag)
 def earnings_page(request):
     # ✅ Parse start/end date & source filters
     start_date = parse_flexible_date(request.GET.get("start_date"))
@@ -50,25 +168,23 @@ def earnings_page(request):
     if source_id and source_id.isdigit():
         transactions_qs = transactions_qs.filter(source_id=int(source_id))
 
-    # ✅ Calculate debit, credit and balance
-    debit_total = (
-        transactions_qs.filter(type="debit").aggregate(total=Sum("amount"))["total"]
-        or 0
-    )
-    credit_total = (
-        transactions_qs.filter(type="credit").aggregate(total=Sum("amount"))["total"]
-        or 0
-    )
+    # ✅ Calculate debit, credit and balance (from the daily rollup)
+    selected_source = int(source_id) if source_id and source_id.isdigit() else None
+    summaries = LedgerRange(start_date, end_date, selected_source)
+    totals = summaries.totals()
+    debit_total = totals["debit"]
+    credit_total = totals["credit"]
     balance = credit_total - debit_total
 
+    # ✅ Opening/closing balance per source over the period
+    opening = balances_as_of(start_date - timedelta(days=1))
+    if selected_source:
+        opening = {selected_source: opening.get(selected_source, 0)}
+    source_balances = source_balance_rows(opening, summaries.by_source())
+    opening_balance = sum(opening.values())
+
     # ✅ Context metrics
-    total_plot_value = (
-        Plot.objects.filter(status="sold").aggregate(total=Sum("price"))["total"] or 0
-    )
-    total_pending = (
-        Payment.objects.filter(is_paid=False).aggregate(total=Sum("amount"))["total"]
-        or 0
-    )
+    total_plot_value, total_pending = portfolio_totals()
 
     # ✅ Recent transactions
     transactions = transactions_qs.order_by("-date")[:50]
@@ -76,29 +192,29 @@ def earnings_page(request):
     context = {
         "start_date": start_date,
         "end_date": end_date,
-        "selected_source": (
-            int(source_id) if source_id and source_id.isdigit() else None
-        ),
+        "selected_source": selected_source,
         "sources": PaymentSource.objects.filter(is_active=True).order_by("name"),
         "total_plot_value": total_plot_value,
         "total_received": credit_total,
         "total_expenses": debit_total,
         "net_profit": balance,
         "total_pending": total_pending,
+        "opening_balance": opening_balance,
+        "closing_balance": opening_balance + balance,
+        "source_balances": source_balances,
         "transactions": transactions,
     }
 
     return render(request, "reports/earnings_page.html", context)
 
 
-# ------------------------------------------------
-# Download Earnings PDF
-# ------------------------------------------------
-def download_earnings_pdf(request):
+def filtered_transactions(params):
+    """Apply the earnings filters (start_date, end_date, source) from
+    GET-style `params`. Returns `(start_date, end_date, source_id, qs)`."""
     # ✅ Parse filters safely
-    start_date = parse_flexible_date(request.GET.get("start_date"))
-    end_date = parse_flexible_date(request.GET.get("end_date"))
-    source_id = request.GET.get("source")
+    start_date = parse_flexible_date(params.get("start_date"))
+    end_date = parse_flexible_date(params.get("end_date"))
+    source_id = params.get("source")
 
     transactions_qs = Transaction.objects.select_related("source").all()
 
@@ -111,102 +227,226 @@ def download_earnings_pdf(request):
     # ✅ Apply source filter
     if source_id and source_id.isdigit():
         transactions_qs = transactions_qs.filter(source_id=int(source_id))
+    else:
+        source_id = None
+
+    return start_date, end_date, source_id, transactions_qs
+
+
+# ------------------------------------------------
+# Download Earnings PDF
+# ------------------------------------------------
+@revalidate
+@condition(etag_func=earnings_pdf_etag)
+def download_earnings_pdf(request):
+    response = HttpResponse(content_type="application/pdf")
+    filename = render_earnings_pdf(request.GET, response)
+    response["Content-Disposition"] = f"attachment; filename={filename}"
+    return response
+
+
+@pdf_render_timer("earnings_pdf")
+def render_earnings_pdf(params, fp):
+    """Draw the earnings report for the GET-style `params` into `fp`.
+    Returns the suggested filename."""
+    write_pdf(_earnings_report_pages(params), fp)
+    return f"Earnings_Report_{timezone.now().strftime('%Y%m%d_%H%M')}.pdf"
+
+
+EARNINGS_COLUMNS = [
+    Column("Date", 60),
+    Column("Type", 50),
+    Column("Amount", 85, align="right", format=money),
+    Column("Source", 95),
+    Column("Description"),
+]
+
+
+def _earnings_report_pages(params):
+    start_date, end_date, source_id, transactions_qs = filtered_transactions(params)
 
     # ✅ Totals
-    debit_total = (
-        transactions_qs.filter(type="debit").aggregate(total=Sum("amount"))["total"]
-        or 0
-    )
-    credit_total = (
-        transactions_qs.filter(type="credit").aggregate(total=Sum("amount"))["total"]
-        or 0
-    )
+    totals = LedgerRange(start_date, end_date, source_id).totals()
+    debit_total = totals["debit"]
+    credit_total = totals["credit"]
     balance = credit_total - debit_total
 
     total_plot_value = (
         Plot.objects.filter(status="sold").aggregate(total=Sum("price"))["total"] or 0
     )
 
-    # ✅ Setup PDF
-    response = HttpResponse(content_type="application/pdf")
-    filename = f"Earnings_Report_{timezone.now().strftime('%Y%m%d_%H%M')}.pdf"
-    response["Content-Disposition"] = f"attachment; filename={filename}"
-
-    p = canvas.Canvas(response, pagesize=A4)
-    width, height = A4
-    y = height - inch
-
     # --- HEADER ---
-    p.setFont("Helvetica-Bold", 16)
-    p.drawCentredString(width / 2, y, "Abrar Green City — Earnings Report")
-    y -= 20
-
-    p.setFont("Helvetica", 10)
     filter_text = f"Generated: {timezone.now().strftime('%b %d, %Y, %I:%M %p')}"
     if start_date:
         filter_text += f" | From: {start_date}"
     if end_date:
         filter_text += f" | To: {end_date}"
-    if source_id and source_id.isdigit():
+    if source_id:
         src = PaymentSource.objects.filter(id=source_id).first()
         if src:
             filter_text += f" | Source: {src.name}"
-    p.drawCentredString(width / 2, y, filter_text)
-    y -= 40
+    report = PDFReport("Earnings Report")
+    report.title("Abrar Green City — Earnings Report", filter_text)
 
     # --- SUMMARY ---
-    p.setFont("Helvetica-Bold", 12)
-    p.drawString(50, y, "📊 Summary")
-    y -= 20
-    p.setFont("Helvetica", 10)
-    for label, value in [
-        ("Total Plot Sales Value", total_plot_value),
-        ("Total Credit (Income)", credit_total),
-        ("Total Debit (Expenses)", debit_total),
-        ("Net Balance", balance),
-    ]:
-        p.drawString(60, y, f"{label}: Rs {value}")
-        y -= 15
-
-    y -= 25
-    p.setFont("Helvetica-Bold", 12)
-    p.drawString(50, y, "🧾 Filtered Transactions")
-    y -= 20
-
-    # --- TABLE HEADERS ---
-    p.setFont("Helvetica-Bold", 9)
-    p.drawString(50, y, "Date")
-    p.drawString(110, y, "Type")
-    p.drawString(160, y, "Amount")
-    p.drawString(230, y, "Source")
-    p.drawString(320, y, "Description")
-    y -= 10
-    p.line(50, y, 550, y)
-    y -= 10
-
-    # --- TRANSACTION ROWS ---
-    p.setFont("Helvetica", 8)
-    for t in transactions_qs.order_by("-date")[:100]:
-        if y < 60:
-            p.showPage()
-            y = height - inch
-            p.setFont("Helvetica", 8)
-
-        p.drawString(50, y, t.date.strftime("%Y-%m-%d"))
-        p.drawString(110, y, t.type.upper())
-        p.drawString(160, y, f"Rs {t.amount}")
-        p.drawString(230, y, t.source.name if t.source else "—")
-        p.drawString(320, y, (t.description or "-")[:45])
-        y -= 12
-
-    p.showPage()
-    p.save()
+    report.heading("Summary", size=12)
+    report.fields(
+        [
+            ("Total Plot Sales Value", money(total_plot_value)),
+            ("Total Credit (Income)", money(credit_total)),
+            ("Total Debit (Expenses)", money(debit_total)),
+            ("Net Balance", money(balance)),
+        ]
+    )
+    report.space(20)
+
+    # --- LATEST TRANSACTIONS ---
+    report.heading("Filtered Transactions", size=12)
+    rows = (
+        (
+            t.date.strftime("%Y-%m-%d"),
+            t.type.upper(),
+            t.amount,
+            t.source.name if t.source else "—",
+            t.description or "-",
+        )
+        for t in transactions_qs.order_by("-date")[:100]
+    )
+    yield from report.table(EARNINGS_COLUMNS, rows)
+    yield report.finish()
+
+
+# ------------------------------------------------
+# Streaming Earnings Export (full ledger, flat memory)
+# ------------------------------------------------
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_COLUMNS = ["Date", "Type", "Source", "Description", "Credit", "Debit", "Balance"]
+
+
+class Echo:
+    """File-like object whose `write` just returns the value, so
+    `csv.writer` can format rows for a streaming response."""
+
+    def write(self, value):
+        return value
+
+
+def ledger_rows(transactions_qs):
+    """Yield `(date, type, source, description, credit, debit, balance)`
+    in date order with a running balance, fetching rows in chunks through
+    a server-side cursor."""
+    balance = Decimal("0")
+    rows = (
+        transactions_qs.order_by("date", "id")
+        .values_list("date", "type", "source__name", "description", "amount")
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    for date, type_, source, description, value in rows:
+        credit = value if type_ == "credit" else None
+        debit = value if type_ == "debit" else None
+        balance += value if type_ == "credit" else -value
+        yield date, type_, source, description, credit, debit, balance
+
+
+def _export_filename(start_date, end_date, extension):
+    return f"Earnings_Ledger_{start_date}_{end_date}.{extension}"
+
+
+@login_required
+def export_earnings_csv(request):
+    start_date, end_date, _, transactions_qs = filtered_transactions(request.GET)
+    writer = csv.writer(Echo())
+
+    def rows():
+        yield writer.writerow(EXPORT_COLUMNS)
+        for date, type_, source, description, credit, debit, balance in ledger_rows(
+            transactions_qs
+        ):
+            yield writer.writerow(
+                [
+                    date.isoformat(),
+                    type_,
+                    source or "",
+                    description or "",
+                    credit if credit is not None else "",
+                    debit if debit is not None else "",
+                    balance,
+                ]
+            )
+
+    response = StreamingHttpResponse(rows(), content_type="text/csv")
+    filename = _export_filename(start_date, end_date, "csv")
+    response["Content-Disposition"] = f"attachment; filename={filename}"
+    return response
+
+
+def stream_earnings_pdf(params):
+    """Yield the full earnings ledger for `params` as PDF chunks, one
+    page at a time."""
+    with pdf_render_timer("earnings_ledger_pdf"):
+        yield from _earnings_ledger_pages(params)
+
+
+LEDGER_COLUMNS = [
+    Column("Date", 55),
+    Column("Source", 80),
+    Column("Description"),
+    Column("Credit", 70, align="right", format=amount),
+    Column("Debit", 70, align="right", format=amount),
+    Column("Balance", 75, align="right", format=amount),
+]
+
+
+def _earnings_ledger_pages(params):
+    start_date, end_date, source_id, transactions_qs = filtered_transactions(params)
+    totals = LedgerRange(start_date, end_date, source_id).totals()
+    credit_total = totals["credit"]
+    debit_total = totals["debit"]
+    source = PaymentSource.objects.filter(id=source_id).first() if source_id else None
+
+    filter_text = f"From: {start_date} | To: {end_date}"
+    if source:
+        filter_text += f" | Source: {source.name}"
+    filter_text += f" | Generated: {timezone.now().strftime('%b %d, %Y, %I:%M %p')}"
+    report = PDFReport("Earnings Ledger")
+    report.title("Abrar Green City — Earnings Ledger", filter_text)
+    report.fields(
+        [
+            ("Transactions", totals["count"]),
+            ("Total Credit (Income)", money(credit_total)),
+            ("Total Debit (Expenses)", money(debit_total)),
+            ("Net Balance", money(credit_total - debit_total)),
+        ]
+    )
+    report.space(15)
+
+    rows = (
+        (date.strftime("%Y-%m-%d"), source_name or "—", description or "-", *amounts)
+        for date, _, source_name, description, *amounts in ledger_rows(transactions_qs)
+    )
+    yield from report.table(LEDGER_COLUMNS, rows)
+    yield report.finish()
+
+
+@login_required
+@revalidate
+@condition(etag_func=earnings_pdf_etag)
+def export_earnings_pdf(request):
+    start_date = parse_flexible_date(request.GET.get("start_date"))
+    end_date = parse_flexible_date(request.GET.get("end_date"))
+    response = StreamingHttpResponse(
+        stream_earnings_pdf(request.GET), content_type="application/pdf"
+    )
+    filename = _export_filename(start_date, end_date, "pdf")
+    response["Content-Disposition"] = f"attachment; filename={filename}"
     return response
 
 
 # ------------------------------------------------
 # Daily Report (Debit/Credit Version)
 # ------------------------------------------------
+@revalidate
+@condition(etag_func=daily_report_etag, last_modified_func=daily_report_last_modified)
 def daily_report(request):
     # ✅ Selected date (default = today)
     selected_date = parse_flexible_date(request.GET.get("date"))
@@ -218,35 +458,26 @@ def daily_report(request):
         .order_by("id")
     )
 
-    # ✅ Overall totals
-    total_credit = (
-        transactions.filter(type="credit").aggregate(total=Sum("amount"))["total"] or 0
-    )
-    total_debit = (
-        transactions.filter(type="debit").aggregate(total=Sum("amount"))["total"] or 0
-    )
-    closing_balance = total_credit - total_debit
-
-    # ✅ Group summary by payment source
-    source_summaries = (
-        transactions.values("source__name")
-        .annotate(
-            credit_total=Sum("amount", filter=Q(type="credit")),
-            debit_total=Sum("amount", filter=Q(type="debit")),
-        )
-        .order_by("source__name")
-    )
+    # ✅ Overall totals (from the daily rollup)
+    day_summaries = DailySourceSummary.objects.filter(date=selected_date)
+    totals = day_summaries.totals()
+    total_credit = totals["credit"]
+    total_debit = totals["debit"]
+    net_balance = total_credit - total_debit
 
-    # Remove any sources where both credit and debit are None (no transactions)
-    source_summaries = [
-        s for s in source_summaries if (s["credit_total"] or s["debit_total"])
-    ]
+    # ✅ Opening/closing balance per payment source (month-end snapshots)
+    opening = balances_as_of(selected_date - timedelta(days=1))
+    source_summaries = source_balance_rows(opening, day_summaries.by_source())
+    opening_balance = sum(opening.values())
+    closing_balance = opening_balance + net_balance
 
     context = {
         "selected_date": selected_date,
         "transactions": transactions,
         "total_credit": total_credit,
         "total_debit": total_debit,
+        "net_balance": net_balance,
+        "opening_balance": opening_balance,
         "closing_balance": closing_balance,
         "source_summaries": source_summaries,
     }
@@ -257,127 +488,398 @@ def daily_report(request):
 # ------------------------------------------------
 # Download Daily Report PDF
 # ------------------------------------------------
+@revalidate
+@condition(etag_func=daily_report_pdf_etag, last_modified_func=daily_report_last_modified)
 def download_daily_report_pdf(request):
-    selected_date = parse_flexible_date(request.GET.get("date"))
+    days = daily_report_range(request.GET)
+    if days and request.GET.get("format") != "zip":
+        # One PDF for the whole range, sent page by page
+        response = StreamingHttpResponse(
+            stream_daily_range_pdf(*days), content_type="application/pdf"
+        )
+        filename = _daily_range_filename(*days, "pdf")
+    else:
+        response = HttpResponse(content_type="application/pdf")
+        filename = render_daily_report_pdf(request.GET, response)
+        if days:
+            response["Content-Type"] = "application/zip"
+    response["Content-Disposition"] = f"attachment; filename={filename}"
+    return response
 
-    transactions = (
-        Transaction.objects.filter(date=selected_date)
-        .select_related("source")
-        .order_by("type", "id")
+
+@pdf_render_timer("daily_report_pdf")
+def render_daily_report_pdf(params, fp):
+    """Draw the daily report for `params["date"]` into `fp`, or for every
+    day from `start_date` to `end_date` (see `daily_report_range()`).
+    Returns the suggested filename."""
+    days = daily_report_range(params)
+    if days:
+        if params.get("format") == "zip":
+            write_daily_range_zip(*days, fp)
+            return _daily_range_filename(*days, "zip")
+        write_pdf(_daily_range_chunks(*days), fp)
+        return _daily_range_filename(*days, "pdf")
+
+    day = parse_flexible_date(params.get("date"))
+    for report_day, rows in daily_range_transactions(day, day):
+        write_pdf(_daily_report_document(report_day, rows, _generated()), fp)
+    return f"Daily_Report_{day}.pdf"
+
+
+# ------------------------------------------------
+# Daily Report for a range of days
+# ------------------------------------------------
+DAILY_RANGE_MAX_DAYS = 366
+
+
+def daily_report_range(params):
+    """`(start, end)` when `params` ask for the daily reports of a range
+    of days (`start_date` and `end_date`, at most DAILY_RANGE_MAX_DAYS),
+    otherwise `None`."""
+    if not (params.get("start_date") and params.get("end_date")):
+        return None
+    start = parse_flexible_date(params.get("start_date"))
+    end = parse_flexible_date(params.get("end_date"))
+    if end < start:
+        start, end = end, start
+    return start, min(end, start + timedelta(days=DAILY_RANGE_MAX_DAYS - 1))
+
+
+def _daily_range_filename(start, end, extension):
+    return f"Daily_Reports_{start}_{end}.{extension}"
+
+
+def daily_range_transactions(start, end):
+    """Yield `(day, rows)` for every day from `start` to `end`, `rows`
+    being that day's `(type, source_id, source_name, description,
+    amount)`, credits first. All days come from one server-side cursor
+    ordered by date; consume each day's rows before the next day."""
+    rows = (
+        Transaction.objects.filter(date__range=(start, end))
+        .order_by("date", "type", "id")
+        .values_list("date", "type", "source_id", "source__name", "description", "amount")
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
     )
+    days = groupby(rows, key=itemgetter(0))
+    next_day = next(days, None)
+    day = start
+    while day <= end:
+        if next_day is not None and next_day[0] == day:
+            yield day, (row[1:] for row in next_day[1])
+            next_day = next(days, None)
+        else:
+            yield day, iter(())
+        day += timedelta(days=1)
+
+
+class SourceTotals:
+    """Credit and debit per payment source, added up row by row."""
+
+    def __init__(self):
+        self.sources = {}
+
+    def add(self, type_, source_id, source_name, value):
+        totals = self.sources.setdefault(source_id, [source_name, Decimal("0"), Decimal("0")])
+        totals[1 if type_ == "credit" else 2] += value
+
+    def merge(self, other):
+        for source_id, (name, credit, debit) in other.sources.items():
+            totals = self.sources.setdefault(source_id, [name, Decimal("0"), Decimal("0")])
+            totals[1] += credit
+            totals[2] += debit
+
+    def rows(self):
+        """`(name, credit, debit, net)` by source name, no source last."""
+        return [
+            (name or "—", credit, debit, credit - debit)
+            for name, credit, debit in sorted(
+                self.sources.values(), key=lambda row: (row[0] is None, row[0] or "")
+            )
+        ]
+
+    def totals(self):
+        return (
+            sum((credit for _, credit, _ in self.sources.values()), Decimal("0")),
+            sum((debit for _, _, debit in self.sources.values()), Decimal("0")),
+        )
 
-    # ✅ Separate credits and debits
-    daily_credits = transactions.filter(type="credit")
-    daily_debits = transactions.filter(type="debit")
 
-    total_credit = daily_credits.aggregate(total=Sum("amount"))["total"] or 0
-    total_debit = daily_debits.aggregate(total=Sum("amount"))["total"] or 0
-    net_balance = total_credit - total_debit
+DAILY_COLUMNS = [
+    Column("Description"),
+    Column("Source", 120),
+    Column("Amount", 95, align="right", format=money, total=True),
+]
+SOURCE_SUMMARY_COLUMNS = [
+    Column("Source"),
+    Column("Credit", 110, align="right", format=money, total=True),
+    Column("Debit", 110, align="right", format=money, total=True),
+    Column("Net", 110, align="right", format=money, total=True),
+]
 
-    # ✅ Source Summary
-    source_summary = (
-        transactions.values("source__name")
-        .annotate(
-            credit_total=Sum("amount", filter=Q(type="credit")),
-            debit_total=Sum("amount", filter=Q(type="debit")),
+
+def _generated():
+    return timezone.now().strftime("%b %d, %Y, %I:%M %p")
+
+
+def _source_summary(report, totals):
+    credit, debit = totals.totals()
+    if totals.sources:
+        report.heading("Source Summary")
+        yield from report.table(SOURCE_SUMMARY_COLUMNS, totals.rows(), size=9)
+    label = "Profit" if credit >= debit else "Loss"
+    report.line(f"Net {label}: Rs {credit - debit}", font=BOLD, size=13, indent=0)
+
+
+def _daily_section(report, type_, rows, totals):
+    def section_rows():
+        for _, source_id, source_name, description, value in rows:
+            totals.add(type_, source_id, source_name, value)
+            yield description or type_.title(), source_name or "—", value
+
+    report.heading("Credits (Income)" if type_ == "credit" else "Debits (Expenses)")
+    yield from report.table(
+        DAILY_COLUMNS, section_rows(), size=9, total_label=f"Total {type_.title()}"
+    )
+
+
+def _daily_report(report, day, rows, generated, range_totals=None):
+    """Draw one day's report from its `daily_range_transactions()` rows,
+    yielding PDF bytes; the day's totals are added to `range_totals`."""
+    report.title("Abrar Green City — Daily Report", f"Date: {day} | Generated: {generated}")
+    totals = SourceTotals()
+    drawn = set()
+    for type_, typed_rows in groupby(rows, key=itemgetter(0)):
+        # Credits come first and both sections are shown even when empty
+        if type_ == "debit" and "credit" not in drawn:
+            yield from _daily_section(report, "credit", (), totals)
+            drawn.add("credit")
+        yield from _daily_section(report, type_, typed_rows, totals)
+        drawn.add(type_)
+    for type_ in ("credit", "debit"):
+        if type_ not in drawn:
+            yield from _daily_section(report, type_, (), totals)
+    yield from _source_summary(report, totals)
+    if range_totals is not None:
+        range_totals.merge(totals)
+
+
+def _daily_report_document(day, rows, generated, range_totals=None):
+    report = PDFReport(f"Daily Report {day}")
+    yield from _daily_report(report, day, rows, generated, range_totals)
+    yield report.finish()
+
+
+def _range_summary_document(start, end, totals, generated, report=None):
+    report = report or PDFReport(f"Daily Reports {start} to {end}")
+    report.title(
+        "Abrar Green City — Daily Reports Summary",
+        f"From: {start} | To: {end} | Generated: {generated}",
+    )
+    credit, debit = totals.totals()
+    report.fields(
+        [("Total Credit", money(credit)), ("Total Debit", money(debit))], font=BOLD, size=11
+    )
+    report.space(15)
+    yield from _source_summary(report, totals)
+    yield report.finish()
+
+
+def stream_daily_range_pdf(start, end):
+    """Yield one PDF with the daily report of every day from `start` to
+    `end` and a summary of the range, a page or so at a time."""
+    with pdf_render_timer("daily_report_pdf"):
+        yield from _daily_range_chunks(start, end)
+
+
+def _daily_range_chunks(start, end):
+    report = PDFReport(f"Daily Reports {start} to {end}")
+    generated = _generated()
+    range_totals = SourceTotals()
+    for day, rows in daily_range_transactions(start, end):
+        report.page_break()
+        yield from _daily_report(report, day, rows, generated, range_totals)
+    report.page_break()
+    yield from _range_summary_document(start, end, range_totals, generated, report)
+
+
+def write_daily_range_zip(start, end, fp):
+    """Write a zip of one daily report PDF per day from `start` to `end`,
+    plus a summary PDF of the range, into `fp`."""
+    generated = _generated()
+    range_totals = SourceTotals()
+    with zipfile.ZipFile(fp, "w", zipfile.ZIP_DEFLATED) as archive:
+        for day, rows in daily_range_transactions(start, end):
+            archive.writestr(
+                f"Daily_Report_{day}.pdf",
+                b"".join(_daily_report_document(day, rows, generated, range_totals)),
+            )
+        archive.writestr(
+            f"Daily_Reports_Summary_{start}_{end}.pdf",
+            b"".join(_range_summary_document(start, end, range_totals, generated)),
         )
-        .order_by("source__name")
+
+
+# ------------------------------------------------
+# Receivables Aging (unpaid installments by days past due)
+# ------------------------------------------------
+AGING_PAGE_ROWS = 500
+
+
+def aging_filters(params):
+    """Parse the aging report filters from GET-style `params`."""
+    group_by = params.get("group_by")
+    return {
+        "as_of": parse_flexible_date(params.get("as_of")),
+        "group_by": group_by if group_by in AGING_GROUPINGS else "booking",
+        "block": params.get("block") or None,
+        "plot_type": params.get("plot_type") or None,
+    }
+
+
+@login_required
+def receivables_aging(request):
+    filters = aging_filters(request.GET)
+    # ✅ One extra row tells us whether the table was cut short
+    totals, rows = aging_report(**filters, limit=AGING_PAGE_ROWS + 1)
+
+    context = {
+        **filters,
+        "grouping_label": AGING_GROUPINGS[filters["group_by"]][0],
+        "groupings": [(key, value[0]) for key, value in AGING_GROUPINGS.items()],
+        "buckets": [label for _, label in AGING_BUCKETS],
+        "blocks": Plot.objects.exclude(block_name__isnull=True)
+        .exclude(block_name="")
+        .order_by("block_name")
+        .values_list("block_name", flat=True)
+        .distinct(),
+        "plot_types": Plot.PLOT_TYPE,
+        "totals": totals,
+        "bucket_totals": zip([label for _, label in AGING_BUCKETS], totals["buckets"]),
+        "rows": rows[:AGING_PAGE_ROWS],
+        "truncated": len(rows) > AGING_PAGE_ROWS,
+        "page_rows": AGING_PAGE_ROWS,
+    }
+    return render(request, "reports/aging_report.html", context)
+
+
+@login_required
+def export_aging_csv(request):
+    filters = aging_filters(request.GET)
+    totals, rows = aging_report(**filters)
+    grouping_label = AGING_GROUPINGS[filters["group_by"]][0]
+
+    response = HttpResponse(content_type="text/csv")
+    response["Content-Disposition"] = (
+        f"attachment; filename=Receivables_Aging_{filters['group_by']}_{filters['as_of']}.csv"
+    )
+    writer = csv.writer(response)
+    writer.writerow(
+        [
+            grouping_label,
+            "Detail",
+            *(label for _, label in AGING_BUCKETS),
+            "Overdue",
+            "Total",
+            "Unpaid Installments",
+            "Oldest Due",
+            "Days Overdue",
+        ]
     )
+    for row in [*rows, totals]:
+        writer.writerow(
+            [
+                "Total" if row["is_total"] else row["label"],
+                row["detail"] or "",
+                *row["buckets"],
+                row["overdue"],
+                row["total"],
+                row["payments"],
+                row["oldest_due"] or "",
+                row["days_overdue"],
+            ]
+        )
+    return response
+
 
+@login_required
+def download_aging_pdf(request):
     response = HttpResponse(content_type="application/pdf")
-    filename = f"Daily_Report_{selected_date}.pdf"
+    filename = render_aging_pdf(request.GET, response)
     response["Content-Disposition"] = f"attachment; filename={filename}"
+    return response
 
-    p = canvas.Canvas(response, pagesize=A4)
-    width, height = A4
-    y = height - inch
 
-    # --- HEADER ---
-    p.setFont("Helvetica-Bold", 16)
-    p.drawCentredString(width / 2, y, "Abrar Green City — Daily Report")
-    y -= 25
-    p.setFont("Helvetica", 11)
-    p.drawCentredString(
-        width / 2,
-        y,
-        f"Date: {selected_date} | Generated: {timezone.now().strftime('%b %d, %Y, %I:%M %p')}",
-    )
-    y -= 40
-
-    # --- CREDITS (INCOME) ---
-    p.setFont("Helvetica-Bold", 13)
-    p.drawString(50, y, "💰 Credits (Income)")
-    y -= 20
-    p.setFont("Helvetica", 10)
-    for t in daily_credits:
-        src = t.source.name if t.source else "—"
-        desc = t.description or "Credit"
-        p.drawString(60, y, f"{desc} — {src} — Rs {t.amount}")
-        y -= 15
-        if y < 60:
-            p.showPage()
-            y = height - inch
-            p.setFont("Helvetica", 10)
-    y -= 10
-    p.setFont("Helvetica-Bold", 11)
-    p.drawString(60, y, f"Total Credit: Rs {total_credit}")
-    y -= 30
-
-    # --- DEBITS (EXPENSES) ---
-    p.setFont("Helvetica-Bold", 13)
-    p.drawString(50, y, "💸 Debits (Expenses)")
-    y -= 20
-    p.setFont("Helvetica", 10)
-    for t in daily_debits:
-        src = t.source.name if t.source else "—"
-        desc = t.description or "Debit"
-        p.drawString(60, y, f"{desc} — {src} — Rs {t.amount}")
-        y -= 15
-        if y < 60:
-            p.showPage()
-            y = height - inch
-            p.setFont("Helvetica", 10)
-    y -= 10
-    p.setFont("Helvetica-Bold", 11)
-    p.drawString(60, y, f"Total Debit: Rs {total_debit}")
-    y -= 40
-
-    # --- SOURCE SUMMARY ---
-    if source_summary:
-        p.setFont("Helvetica-Bold", 13)
-        p.drawString(50, y, "🏦 Source Summary")
-        y -= 20
-        p.setFont("Helvetica-Bold", 10)
-        p.drawString(60, y, "Source")
-        p.drawString(220, y, "Credit")
-        p.drawString(320, y, "Debit")
-        p.drawString(420, y, "Net")
-        y -= 10
-        p.line(50, y, 550, y)
-        y -= 10
-        p.setFont("Helvetica", 9)
-        for s in source_summary:
-            src_name = s["source__name"] or "—"
-            credit = s["credit_total"] or 0
-            debit = s["debit_total"] or 0
-            net = credit - debit
-            p.drawString(60, y, src_name[:25])
-            p.drawString(220, y, f"Rs {credit}")
-            p.drawString(320, y, f"Rs {debit}")
-            color = "green" if net >= 0 else "red"
-            p.drawString(420, y, f"Rs {net}")
-            y -= 15
-            if y < 60:
-                p.showPage()
-                y = height - inch
-                p.setFont("Helvetica", 9)
-        y -= 30
+@pdf_render_timer("aging_pdf")
+def render_aging_pdf(params, fp):
+    """Draw the receivables aging report for `params` into `fp`. Returns
+    the suggested filename."""
+    filters = aging_filters(params)
+    totals, rows = aging_report(**filters)
+    grouping_label = AGING_GROUPINGS[filters["group_by"]][0]
 
-    # --- SUMMARY ---
-    p.setFont("Helvetica-Bold", 13)
-    label = "Profit" if net_balance >= 0 else "Loss"
-    p.drawString(50, y, f"Net {label}: Rs {net_balance}")
+    filename = f"Receivables_Aging_{filters['group_by']}_{filters['as_of']}.pdf"
 
-    p.showPage()
-    p.save()
-    return response
+    columns = [
+        Column(grouping_label),
+        *(Column(label, 72, align="right", format=amount) for _, label in AGING_BUCKETS),
+        Column("Overdue", 72, align="right", format=amount),
+        Column("Total", 72, align="right", format=amount),
+    ]
+
+    def table_rows():
+        for row in rows:
+            label = row["label"] or "—"
+            if row["detail"]:
+                label = f"{label} — {row['detail']}"
+            yield label, *row["buckets"], row["overdue"], row["total"]
+
+    filter_text = f"As of: {filters['as_of']} | By: {grouping_label}"
+    if filters["block"]:
+        filter_text += f" | Block: {filters['block']}"
+    if filters["plot_type"]:
+        filter_text += f" | Plot Type: {filters['plot_type'].title()}"
+    filter_text += f" | Generated: {_generated()}"
+
+    report = PDFReport("Receivables Aging", pagesize=landscape(A4), margin=40)
+    report.title("Abrar Green City — Receivables Aging", filter_text)
+    footer = [
+        f"Total ({totals['payments']} unpaid installments)",
+        *totals["buckets"],
+        totals["overdue"],
+        totals["total"],
+    ]
+    write_pdf([*report.table(columns, table_rows(), footer=footer), report.finish()], fp)
+    return filename
+
+
+# ------------------------------------------------
+# Cash-Flow Forecast (expected receipts, next 12 months)
+# ------------------------------------------------
+def forecast_page(request):
+    as_of = parse_flexible_date(request.GET.get("as_of"))
+
+    # ✅ What-if collection rates, entered as percentages
+    overrides = {}
+    for bucket, _ in DUE_BUCKETS:
+        try:
+            rate = float(request.GET.get(f"rate_{bucket}", ""))
+        except ValueError:
+            continue
+        overrides[bucket] = min(max(rate, 0), 100) / 100
+    rates = collection_rates(overrides)
+
+    forecast = cash_flow_forecast(ForecastInputs.load(as_of), rates)
+
+    context = {
+        "as_of": as_of,
+        "forecast": forecast,
+        "rate_fields": [
+            (bucket, label, round(rates[bucket] * 100, 1)) for bucket, label in DUE_BUCKETS
+        ],
+        "monthly": list(zip(forecast["months"], forecast["scheduled"], forecast["expected"])),
+        "breakdowns": [
+            ("Expected by Payment Source", forecast["by_source"]),
+            ("Expected by Plot Type", forecast["by_plot_type"]),
+        ],
+    }
+    return render(request, "reports/forecast.html", context)